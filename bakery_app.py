@@ -1,23 +1,112 @@
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd
-from datetime import datetime
+import os
+import tempfile
+import time
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import plotly.express as px
 
-# Set page config
-st.set_page_config(
-    page_title="SJC Bakery Analytics Suite",
-    page_icon="🍞",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+from bakery_sim import (GBMModel, MertonModel, OUModel, ResultCache, RunStore,
+                        adaptive_demand_bands, adaptive_price_bands, adaptive_staffing,
+                        analyze_staffing, band_polygon, equicorrelation, estimate_demand_bands,
+                        estimate_price_bands, fit_price_model, latin_hypercube, lttb,
+                        optimize_production, parameter_grid, path_overlay,
+                        simulate_demand_bands, simulate_demand_paths, simulate_network_demand,
+                        simulate_profit, tornado)
+from bakery_sim.history import SalesHistory
+from bakery_sim.jobs import CANCELLED, DONE, JobManager
+from bakery_sim.profiling import PROFILER, peak_rss_bytes, rss_bytes, span, trace
+from bakery_sim.profit import DEFAULT_HOURLY_WAGE
+from bakery_sim.sensitivity import SWEEPS
+
+# Chart payload limits: traces are decimated server-side to stay within these
+MAX_CHART_POINTS = 1000
+MAX_SAMPLE_PATHS = 200
+POINTS_PER_SAMPLE_PATH = 200
+MARKER_POINTS = 120
+# Variance reduction choices shown in the Monte Carlo tabs
+SAMPLING_METHODS = {"Standard Monte Carlo": 'mc', "Antithetic Variates": 'antithetic',
+                    "Sobol Sequence": 'sobol'}
+# Run-until-converged choices: target precision (± % at 95% confidence)
+PRECISION_TARGETS = [0.25, 0.5, 1.0, 2.0, 5.0]
+# How variance-reduced runs keep their paths (whole units only suit demand), and
+# the size beyond which paths spill from memory to a memory-mapped file
+PATH_STORAGE = {"Full Precision (float64)": 'float64', "Compact (float32)": 'float32',
+                "Whole Units (int32)": 'int32'}
+SPILL_BYTES = int(os.environ.get("BAKERY_SPILL_MB", 1024)) * 1024**2
+SPILL_DIR = os.environ.get("BAKERY_SPILL_DIR")
+
+# Background simulation jobs: worker threads, how long a run may take before
+# it moves to the background, and how often a running job's page refreshes
+JOB_WORKERS = int(os.environ.get("BAKERY_JOB_WORKERS", 2))
+JOB_INLINE_SECONDS = 0.5
+JOB_POLL_SECONDS = 1.0
+
+# Demand paths each production plan is optimised against
+OPTIMIZER_PATHS = 2000
+# Working memory for one multi-location simulation chunk
+NETWORK_MEMORY_MB = int(os.environ.get("BAKERY_NETWORK_MB", 256))
+
+# Timing output: a JSON-lines log of every page view and job, a Prometheus
+# textfile rewritten after each page view and a /metrics port (each off if unset)
+PROFILE_LOG = os.environ.get("BAKERY_PROFILE_LOG")
+METRICS_FILE = os.environ.get("BAKERY_METRICS_FILE")
+METRICS_PORT = os.environ.get("BAKERY_METRICS_PORT")
+
+# Sensitivity sweeps: each analysis's inputs as label -> (sweep argument, slider
+# min, max, default, slider units per argument unit) and outputs as label -> (metric, format)
+SENSITIVITY_ANALYSES = {"📈 Demand": 'demand', "💰 Cost": 'cost', "👥 Staffing": 'staffing'}
+SENSITIVITY_INPUTS = {
+    'demand': {"Average Daily Demand (units)": ('avg_demand', 50, 300, 150, 1),
+               "Demand Variability (%)": ('demand_var', 10, 80, 30, 100)},
+    'cost': {"Current Price (₹/kg)": ('current_price', 50, 500, 150, 1),
+             "Price Volatility (%)": ('volatility', 5, 50, 15, 100),
+             "Annual Price Drift (%)": ('drift', -10, 20, 3, 100)},
+    'staffing': {"Daily Customers": ('avg_customers', 50, 300, 120, 1),
+                 "Customer Variability (%)": ('customer_var', 10, 50, 25, 100),
+                 "Service Rate (customers/hour/staff)": ('service_rate', 5, 15, 8, 1)},
+}
+SENSITIVITY_OUTPUTS = {
+    'demand': {"Mean Daily Demand (units)": ('mean_demand', ',.0f'),
+               "Peak Demand, 90th Percentile (units)": ('p90_demand', ',.0f'),
+               "Waste Risk (days below 70% of average)": ('waste_prob', '.1%')},
+    'cost': {"Expected Final Price (₹/kg)": ('mean_final', ',.2f'),
+             "Best Case, 10th Percentile (₹/kg)": ('p10_final', ',.2f'),
+             "Worst Case, 90th Percentile (₹/kg)": ('p90_final', ',.2f'),
+             "Chance of a Rise Above 10%": ('prob_rise', '.1%')},
+    'staffing': {"Staff-Hours per Day": ('staff_hours', ',.1f'),
+                 "Peak Hour Staff (average)": ('peak_staff', '.1f'),
+                 "Peak Hour Staff (90th percentile)": ('p90_peak_staff', '.1f')},
+}
+
+# Relative daily demand of each product at an average store
+PRODUCT_MIX = {"Croissants": 1.0, "Sourdough Bread": 0.6, "Cupcakes": 0.5,
+               "Cookies": 0.8, "Bagels": 0.7}
+
+# Selling price (₹/unit) and bill of materials (kg of each ingredient per unit)
+PRODUCT_CATALOG = {
+    "Croissants": {"price": 60, "recipe": {"Flour": 0.05, "Butter": 0.025, "Sugar": 0.005,
+                                           "Eggs": 0.005, "Yeast": 0.001}},
+    "Sourdough Bread": {"price": 150, "recipe": {"Flour": 0.4, "Yeast": 0.004}},
+    "Cupcakes": {"price": 50, "recipe": {"Flour": 0.04, "Sugar": 0.03, "Butter": 0.02,
+                                         "Eggs": 0.02, "Chocolate": 0.005}},
+    "Cookies": {"price": 20, "recipe": {"Flour": 0.015, "Sugar": 0.01, "Butter": 0.008,
+                                        "Eggs": 0.003, "Chocolate": 0.006}},
+    "Bagels": {"price": 40, "recipe": {"Flour": 0.09, "Sugar": 0.003, "Yeast": 0.002}},
+}
+# Current ingredient prices (₹/kg)
+INGREDIENT_PRICES = {"Flour": 40, "Sugar": 45, "Butter": 500, "Eggs": 150, "Yeast": 300,
+                     "Chocolate": 400}
+# Price models in Cost Analysis (None is the original floored GBM step) and the
+# model suggested for each ingredient's fitted history
+PRICE_MODEL_CHOICES = {"Classic (GBM with 50% floor)": None, "Geometric Brownian Motion": 'gbm',
+                       "Jump Diffusion (Merton)": 'merton', "Mean Reversion (Ornstein-Uhlenbeck)": 'ou'}
+INGREDIENT_PRICE_MODELS = {"Flour": 'ou', "Sugar": 'ou', "Butter": 'merton', "Eggs": 'gbm',
+                           "Yeast": 'gbm', "Chocolate": 'merton'}
 
 # Custom CSS with bakery-themed color scheme and improved visibility
-st.markdown("""
+PAGE_CSS = """
 <style>
     .title-banner {
         background: linear-gradient(90deg, #FF8C42 0%, #FFB347 50%, #FFD700 100%);
@@ -82,33 +171,161 @@ st.markdown("""
         font-size: 0.8rem;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # Header with vibrant banner
-st.markdown("""
+HEADER_HTML = """
 <div class="title-banner">
     <div class="title-text">🍞 SJC Bakery Analytics Suite</div>
     <div class="subtitle-text">Monte Carlo Simulations for Strategic Decisions</div>
 </div>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'demand_data' not in st.session_state:
-    st.session_state.demand_data = None
-if 'cost_data' not in st.session_state:
-    st.session_state.cost_data = None
-if 'staff_data' not in st.session_state:
-    st.session_state.staff_data = None
-
-# Sidebar
-st.sidebar.title("🎛️ Control Panel")
-analysis_type = st.sidebar.radio(
-    "Select Analysis Type:",
-    ["📈 Demand Forecasting", "💰 Cost Analysis", "👥 Staff Planning", "📚 Help & Guide"]
-)
+"""
+
+# Footer
+FOOTER_HTML = """
+<div class="footer">
+    Web Application |  Developed with 🧡 by J. Inigo Papu Vinodhan, Asst. Prof., BBA Dept., St. Joseph's College, Trichy
+</div>
+"""
+
+
+# Persistent results and run history, shared by every session and kept across restarts
+@st.cache_resource
+def get_run_store():
+    return RunStore(os.environ.get("BAKERY_RUN_STORE", os.path.join("data", "runs.sqlite")))
+
+
+# Shared result cache for every session on this server
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(max_bytes=int(os.environ.get("BAKERY_CACHE_MB", 256)) * 1024**2,
+                       store=get_run_store())
+
+
+# Background simulation jobs shared by every session on this server
+@st.cache_resource
+def get_job_manager():
+    return JobManager(max_workers=JOB_WORKERS)
+
+
+# Process-wide timing spans, with the log and metrics endpoint configured once per server
+@st.cache_resource
+def get_profiler():
+    PROFILER.log_path = PROFILE_LOG
+    if METRICS_PORT:
+        PROFILER.serve(int(METRICS_PORT), host=os.environ.get("BAKERY_METRICS_HOST", "127.0.0.1"))
+    return PROFILER
+
+
+# Sales history store shared by every session on this server
+@st.cache_resource
+def get_sales_history():
+    return SalesHistory(os.environ.get("BAKERY_HISTORY_DIR", os.path.join("data", "sales_history")))
+
+
+def import_sales(history, upload):
+    # The store reads by path and picks the parser from the file extension
+    suffix = os.path.splitext(upload.name)[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(upload.getbuffer())
+    try:
+        return history.ingest(tmp.name)
+    finally:
+        os.remove(tmp.name)
+
+
+# (dates, prices) of one ingredient from an uploaded CSV with date and price columns
+# (and optionally an ingredient column covering several ingredients)
+def read_price_history(upload, ingredient):
+    prices = pd.read_csv(upload)
+    if 'ingredient' in prices.columns:
+        prices = prices[prices['ingredient'] == ingredient]
+    prices = prices.assign(date=pd.to_datetime(prices['date'])).dropna(subset=['date', 'price'])
+    prices = prices.sort_values('date').drop_duplicates('date', keep='last')
+    return prices['date'].to_numpy().astype('datetime64[D]'), prices['price'].to_numpy(dtype=float)
+
+
+# Ingredient cost of one unit at today's prices
+def recipe_cost(product):
+    recipe = PRODUCT_CATALOG[product]['recipe']
+    return sum(kg * INGREDIENT_PRICES[ingredient] for ingredient, kg in recipe.items())
+
+
+# Summary table for the download buttons
+def summary_csv(columns):
+    return pd.DataFrame(columns).to_csv(index=False).encode("utf-8")
+
+
+# Show a figure, timing its construction since chart_start ('chart') and the
+# hand-off to the browser ('render') separately
+def show_chart(fig, chart_start, tab):
+    PROFILER.record('chart', time.perf_counter() - chart_start, tab=tab)
+    with span('render', tab=tab):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+# Run compute(progress) as a background job feeding st.session_state[data_key];
+# cache hits and short runs finish before the page is drawn
+def start_job(data_key, label, compute):
+    job = get_job_manager().submit(compute, label=label)
+    st.session_state.jobs[data_key] = job.id
+    job.wait(JOB_INLINE_SECONDS)
+
+
+# Progress bar, cancel button and partial or final results of a tab's job
+def job_panel(data_key):
+    job_id = st.session_state.jobs.get(data_key)
+    job = get_job_manager().get(job_id) if job_id is not None else None
+    if job is None:
+        st.session_state.jobs.pop(data_key, None)
+        return
+    st.session_state.job_trace = job.trace
+    if not job.done:
+        st.progress(job.progress, text=f"⏳ Job {job.id}: {job.progress:.0%} after {job.elapsed:.0f}s")
+        if st.button("⏹️ Cancel", key=f"cancel_{data_key}"):
+            job.cancel()
+        if job.partial is not None:
+            st.session_state[data_key] = job.partial
+        return
+    del st.session_state.jobs[data_key]
+    if job.status == DONE:
+        st.session_state[data_key] = job.result
+        st.success("✅ Simulation completed!")
+    elif job.status == CANCELLED and job.partial is not None:
+        st.session_state[data_key] = job.partial
+        st.warning(f"⏹️ Cancelled at {job.progress:.0%} - showing partial results")
+    elif job.status == CANCELLED:
+        st.warning("⏹️ Simulation cancelled")
+    else:
+        st.error(f"❌ Simulation failed: {job.error}")
+
+
+# Run-until-converged settings: (tolerance, time budget) or None for a fixed run size
+def convergence_controls():
+    if not st.checkbox("Run Until Converged",
+                       help="Simulate in batches until the mean and percentiles are known to "
+                            "the target precision, or the time budget runs out"):
+        return None
+    tolerance = st.select_slider("Target Precision (± % at 95% confidence):", PRECISION_TARGETS,
+                                 value=1.0) / 100
+    time_budget = st.slider("Time Budget (seconds):", 1, 60, 10)
+    return tolerance, time_budget
+
+
+# Insight line describing how an adaptive run stopped
+def convergence_note(result, unit):
+    runs = f"{result['n_' + unit]:,} {unit} in {result['elapsed']:.1f}s"
+    if result['stop_reason'] is None:
+        return f"⏳ ±{result['precision']:.2%} so far after {runs}"
+    if result['converged']:
+        return f"✅ Converged to ±{result['precision']:.2%} after {runs}"
+    if result['stop_reason'] == 'time_budget':
+        return f"⏱️ Time budget reached at ±{result['precision']:.2%} after {runs}"
+    return f"⚠️ Run limit reached at ±{result['precision']:.2%} after {runs}"
+
 
 # Demand Forecasting
-if analysis_type == "📈 Demand Forecasting":
+def render_demand_forecasting(result_cache):
     st.header("📈 Demand Forecasting")
     
     col1, col2 = st.columns([1, 2])
@@ -116,69 +333,236 @@ if analysis_type == "📈 Demand Forecasting":
     with col1:
         st.subheader("🎯 Parameters")
         
-        product_type = st.selectbox(
-            "Product Type:",
-            ["Croissants", "Sourdough Bread", "Cupcakes", "Cookies", "Bagels"]
-        )
+        source = st.radio("Demand Source:", ["Manual", "Sales History"], horizontal=True)
+        fit = None
+        if source == "Sales History":
+            history = get_sales_history()
+            upload = st.file_uploader("Import POS Transactions (CSV/Parquet):", type=["csv", "parquet"],
+                                      help="Needs date, product and quantity columns. Days "
+                                           "already in the history are skipped.")
+            if upload is not None and st.button("📥 Import Sales"):
+                summary = import_sales(history, upload)
+                st.success(f"✅ Imported {summary['transactions']:,} transactions "
+                           f"({summary['days_added']} new days, {summary['skipped']:,} already stored)")
+            if not history.products:
+                st.info("No sales history yet - import a POS export to fit demand patterns.")
         
-        avg_demand = st.slider("Average Daily Demand (units):", 50, 300, 150)
-        demand_var = st.slider("Demand Variability (%):", 10, 80, 30) / 100
-        sim_days = st.slider("Simulation Days:", 7, 90, 30)
+        if source == "Sales History" and history.products:
+            product_type = st.selectbox("Product Type:", history.products)
+            fit = history.fit(product_type)
+            avg_demand = fit.level
+            demand_var = fit.cv
+            st.caption(f"Fitted from {fit.n_days} trading days up to "
+                       f"{np.datetime64(fit.last_day, 'D')}: {fit.level:.0f} units/day, "
+                       f"{fit.cv:.0%} variability, {fit.noise} noise")
+        else:
+            product_type = st.selectbox(
+                "Product Type:",
+                ["Croissants", "Sourdough Bread", "Cupcakes", "Cookies", "Bagels"]
+            )
+            
+            avg_demand = st.slider("Average Daily Demand (units):", 50, 300, 150)
+            demand_var = st.slider("Demand Variability (%):", 10, 80, 30) / 100
+        sim_days = st.slider("Simulation Days:", 7, 730, 30)
+        
+        with st.expander("💰 Unit Economics"):
+            catalog = PRODUCT_CATALOG.get(product_type)
+            sale_price = st.number_input("Selling Price (₹/unit):", 1.0, 5000.0,
+                                         float(catalog['price'] if catalog else 50))
+            unit_cost = st.number_input("Production Cost (₹/unit):", 0.0, 5000.0,
+                                        round(recipe_cost(product_type), 2) if catalog else 20.0)
+            salvage = st.number_input("Salvage Value (₹/unsold unit):", 0.0, 5000.0, 0.0,
+                                      help="e.g. day-old discount or staff meals")
+        
+        sim_mode = st.radio("Simulation Mode:", ["Monte Carlo", "Single Path"], horizontal=True)
+        n_overlay = 0
+        if sim_mode == "Monte Carlo":
+            sampling = st.selectbox("Variance Reduction:", list(SAMPLING_METHODS))
+            method = SAMPLING_METHODS[sampling]
+            convergence = convergence_controls()
+            control_variate = convergence is None and st.checkbox("Control Variate (analytic mean)")
+            # Plain Monte Carlo streams in chunks; variance reduction keeps its
+            # (far fewer) paths in memory and reports standard errors
+            streaming = method == 'mc' and not control_variate and convergence is None
+            # Run-until-converged picks its own path count; a fixed-size run asks for one
+            if convergence is None:
+                if streaming:
+                    n_paths = st.slider("Simulated Paths:", 1000, 100000, 10000, step=1000)
+                    chunk_size = st.select_slider("Chunk Size (paths per batch):",
+                                                  [1000, 2000, 5000, 10000, 20000, 50000],
+                                                  value=10000)
+                else:
+                    n_paths = st.slider("Simulated Paths:", 500, 20000, 2000, step=500)
+                    storage = st.selectbox("Path Storage:", list(PATH_STORAGE),
+                                           help="Compact storage halves memory; whole units "
+                                                "round demand to integers")
+            n_overlay = st.slider("Sample Paths to Overlay:", 0, MAX_SAMPLE_PATHS, 0, step=10)
         
         if st.button("🚀 Run Demand Simulation", type="primary"):
-            # Run simulation
-            np.random.seed(42)
-            base_demand = np.random.normal(avg_demand, avg_demand * demand_var, sim_days)
-            day_effects = 1 + 0.3 * np.sin(np.arange(sim_days) * 2 * np.pi / 7)
-            seasonal_trend = 1 + 0.1 * np.sin(np.arange(sim_days) * 2 * np.pi / 30)
-            demand = np.maximum(0, base_demand * day_effects * seasonal_trend)
-            
-            st.session_state.demand_data = {
-                'days': np.arange(1, sim_days + 1),
-                'demand': demand,
-                'avg_demand': avg_demand,
-                'product_type': product_type,
-                'demand_var': demand_var
-            }
-            st.success("✅ Simulation completed!")
+            # Run simulation (chunk size does not change results, so it is not part of the key)
+            params = {'product_type': product_type, 'avg_demand': avg_demand,
+                      'demand_var': demand_var, 'sim_days': sim_days,
+                      'fit': fit.key() if fit is not None else None}
+            # Fitted history replaces the built-in weekly/monthly sine effects; its
+            # forecast starts the day after the history ends (the run history's start day)
+            profile = fit.profile(sim_days) if fit is not None else None
+            start_day = fit.last_day + 1 if fit is not None else None
+            noise = fit.noise if fit is not None else 'normal'
+            if salvage >= sale_price:
+                st.warning("Salvage value must be below the selling price - production plan skipped.")
+            
+            def demand_data(bands, demand, plan):
+                return {
+                    'days': np.arange(1, sim_days + 1),
+                    'plan': plan,
+                    'demand': demand,
+                    'bands': bands,
+                    'avg_demand': avg_demand,
+                    'product_type': product_type,
+                    'demand_var': demand_var
+                }
+            
+            def simulate(progress):
+                # Partial bands are shown before the production plan is ready
+                def report(fraction, snapshot):
+                    def partial():
+                        bands = snapshot()
+                        return demand_data(bands, bands['sample_path'], None)
+                    progress(fraction, partial)
+                
+                if sim_mode == "Monte Carlo" and convergence is not None:
+                    tolerance, time_budget = convergence
+                    bands = result_cache.get_or_compute(
+                        'demand_bands', dict(params, method=method, tolerance=tolerance,
+                                             time_budget=time_budget),
+                        lambda: adaptive_demand_bands(avg_demand, demand_var, sim_days,
+                                                      tolerance=tolerance, time_budget=time_budget,
+                                                      method=method, waste_level=avg_demand * 0.7,
+                                                      n_samples=MAX_SAMPLE_PATHS, profile=profile,
+                                                      noise=noise, progress=report, seed=42),
+                        seed=42, start_day=start_day)
+                    demand = bands['sample_path']
+                elif sim_mode == "Monte Carlo" and streaming:
+                    bands = result_cache.get_or_compute(
+                        'demand_bands', dict(params, n_paths=n_paths),
+                        lambda: simulate_demand_bands(avg_demand, demand_var, sim_days,
+                                                      n_paths=n_paths, chunk_size=chunk_size,
+                                                      waste_level=avg_demand * 0.7,
+                                                      n_samples=MAX_SAMPLE_PATHS, profile=profile,
+                                                      noise=noise, progress=report, seed=42),
+                        seed=42, start_day=start_day)
+                    demand = bands['sample_path']
+                elif sim_mode == "Monte Carlo":
+                    bands = result_cache.get_or_compute(
+                        'demand_bands', dict(params, n_paths=n_paths, method=method,
+                                             control_variate=control_variate,
+                                             dtype=PATH_STORAGE[storage]),
+                        lambda: estimate_demand_bands(avg_demand, demand_var, sim_days,
+                                                      n_paths=n_paths, method=method,
+                                                      control_variate=control_variate,
+                                                      waste_level=avg_demand * 0.7,
+                                                      n_samples=MAX_SAMPLE_PATHS, profile=profile,
+                                                      noise=noise, dtype=PATH_STORAGE[storage],
+                                                      memory_limit=SPILL_BYTES, spill_dir=SPILL_DIR,
+                                                      progress=report, seed=42),
+                        seed=42, start_day=start_day)
+                    demand = bands['sample_path']
+                else:
+                    bands = None
+                    demand = result_cache.get_or_compute(
+                        'demand_path', params,
+                        lambda: simulate_demand_paths(avg_demand, demand_var, sim_days,
+                                                      profile=profile, noise=noise, seed=42)[0],
+                        seed=42, start_day=start_day)
+                
+                # Newsvendor plan scored against the first paths of the same seeded run
+                plan = None
+                if salvage < sale_price:
+                    plan = result_cache.get_or_compute(
+                        'production', dict(params, sale_price=sale_price, unit_cost=unit_cost,
+                                           salvage=salvage, n_paths=OPTIMIZER_PATHS),
+                        lambda: optimize_production(avg_demand, demand_var, sim_days, sale_price,
+                                                    unit_cost, salvage, n_paths=OPTIMIZER_PATHS,
+                                                    profile=profile, noise=noise, seed=42)[0],
+                        seed=42, start_day=start_day)
+                return demand_data(bands, demand, plan)
+            
+            start_job('demand_data', 'demand', simulate)
+        job_panel('demand_data')
     
     with col2:
         if st.session_state.demand_data is not None:
             data = st.session_state.demand_data
+            bands = data.get('bands')
             
+            chart_start = time.perf_counter()
             # Create interactive plot
             fig = go.Figure()
             
+            # Sample paths go underneath as one WebGL trace
+            if bands is not None and n_overlay > 0 and 'sample_paths' in bands:
+                overlay_x, overlay_y = path_overlay(data['days'], bands['sample_paths'][:n_overlay],
+                                                    POINTS_PER_SAMPLE_PATH)
+                fig.add_trace(go.Scattergl(
+                    x=overlay_x,
+                    y=overlay_y,
+                    mode='lines',
+                    name=f'{min(n_overlay, len(bands["sample_paths"]))} Sample Paths',
+                    line=dict(color='rgba(139, 69, 19, 0.15)', width=1),
+                    hoverinfo="skip"
+                ))
+            
+            if bands is not None:
+                # Per-day percentiles across all simulated paths
+                center = bands['p50']
+                upper_bound = bands['p90']
+                lower_bound = bands['p10']
+                line_name = f'{data["product_type"]} Median Demand'
+                band_name = f'P10-P90 Band ({bands["n_paths"]:,} paths)'
+            else:
+                center = data['demand']
+                upper_bound = data['demand'] + data['avg_demand'] * data['demand_var']
+                lower_bound = np.maximum(0, data['demand'] - data['avg_demand'] * data['demand_var'])
+                line_name = f'{data["product_type"]} Demand'
+                band_name = 'Confidence Band'
+            
+            line_x, line_y = lttb(data['days'], center, MAX_CHART_POINTS)
             fig.add_trace(go.Scatter(
-                x=data['days'],
-                y=data['demand'],
-                mode='lines+markers',
-                name=f'{data["product_type"]} Demand',
+                x=line_x,
+                y=line_y,
+                mode='lines+markers' if len(line_x) <= MARKER_POINTS else 'lines',
+                name=line_name,
                 line=dict(color='#D2691E', width=3),
                 marker=dict(size=6)
             ))
             
             # Add confidence bands
-            upper_bound = data['demand'] + data['avg_demand'] * data['demand_var']
-            lower_bound = np.maximum(0, data['demand'] - data['avg_demand'] * data['demand_var'])
-            
+            band_x, band_y = band_polygon(data['days'], lower_bound, upper_bound, MAX_CHART_POINTS)
             fig.add_trace(go.Scatter(
-                x=np.concatenate([data['days'], data['days'][::-1]]),
-                y=np.concatenate([upper_bound, lower_bound[::-1]]),
+                x=band_x,
+                y=band_y,
                 fill='toself',
                 fillcolor='rgba(210, 105, 30, 0.2)',
                 line=dict(color='rgba(255,255,255,0)'),
-                name='Confidence Band',
+                name=band_name,
                 hoverinfo="skip"
             ))
             
             # Add reference lines
             fig.add_hline(y=data['avg_demand'], line_dash="dash", line_color="#8B4513",
-                         annotation_text=f"Target: {data['avg_demand']}")
+                         annotation_text=f"Target: {data['avg_demand']:.0f}")
             
-            p90 = np.percentile(data['demand'], 90)
+            if bands is not None:
+                p90 = np.mean(bands['p90'])
+            else:
+                p90 = np.percentile(data['demand'], 90)
             fig.add_hline(y=p90, line_dash="dot", line_color="#CD853F",
                          annotation_text=f"90th %: {p90:.0f}")
+            plan = data.get('plan')
+            if plan is not None:
+                fig.add_hline(y=plan['quantity'], line_dash="dashdot", line_color="#556B2F",
+                             annotation_text=f"Optimal: {plan['quantity']:.0f}",
+                             annotation_position="bottom right")
             
             fig.update_layout(
                 title=f'{data["product_type"]} Demand Forecast - {len(data["days"])} Days',
@@ -188,18 +572,44 @@ if analysis_type == "📈 Demand Forecasting":
                 showlegend=True
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig, chart_start, 'demand')
             
             # Insights
-            cv = np.std(data['demand']) / np.mean(data['demand'])
-            trend = np.polyfit(data['days'], data['demand'], 1)[0]
-            waste_risk = np.mean(data['demand'] < data['avg_demand'] * 0.7) * 100
+            with span('insights', tab='demand'):
+                if bands is not None:
+                    mean_demand = np.mean(bands['mean'])
+                    cv = np.mean(bands['std']) / mean_demand
+                    trend = np.polyfit(data['days'], bands['mean'], 1)[0]
+                    waste_risk = np.mean(bands['waste_prob']) * 100
+                else:
+                    mean_demand = np.mean(data['demand'])
+                    cv = np.std(data['demand']) / np.mean(data['demand'])
+                    trend = np.polyfit(data['days'], data['demand'], 1)[0]
+                    waste_risk = np.mean(data['demand'] < data['avg_demand'] * 0.7) * 100
+            
+            if plan is not None:
+                # Chance of unsold units at the recommended production level
+                waste_risk = plan['waste_prob'] * 100
+                production = plan['quantity']
+                plan_items = f"""
+            <li><strong>Expected Daily Profit:</strong> ₹{plan['expected_profit']:,.0f}</li>
+            <li><strong>Stockout Risk:</strong> {plan['stockout_prob']:.1%} of days</li>
+            <li><strong>Expected Waste:</strong> {plan['expected_waste']:.1f} units/day</li>"""
+            else:
+                production = p90
+                plan_items = ""
+            if bands is not None and 'p90_se' in bands:
+                plan_items += f"""
+            <li><strong>Estimate Precision:</strong> ± {np.mean(bands['p90_se']):.2f} units on daily P90 (1 SE, {bands['n_paths']:,} paths)</li>"""
+            if bands is not None and 'stop_reason' in bands:
+                plan_items += f"""
+            <li>{convergence_note(bands, 'paths')}</li>"""
             
             st.markdown(f"""
             <div class="insight-box">
             <h4>💡 Key Insights</h4>
             <ul>
-            <li><strong>Average Daily Demand:</strong> {np.mean(data['demand']):.0f} units</li>
+            <li><strong>Average Daily Demand:</strong> {mean_demand:.0f} units</li>
             <li><strong>Peak Demand (90th %):</strong> {p90:.0f} units</li>
             <li><strong>Demand Variability:</strong> {cv:.2f}</li>
             <li><strong>Daily Trend:</strong> {trend:+.1f} units/day</li>
@@ -208,16 +618,73 @@ if analysis_type == "📈 Demand Forecasting":
             
             <h4>🎯 Recommendations</h4>
             <ul>
-            <li><strong>Optimal Production:</strong> {p90:.0f} units/day</li>
-            <li><strong>Safety Buffer:</strong> {(p90 - data['avg_demand']):.0f} units</li>
+            <li><strong>Optimal Production:</strong> {production:.0f} units/day</li>
+            <li><strong>Safety Buffer:</strong> {(production - data['avg_demand']):.0f} units</li>{plan_items}
             <li>{'⚠️ High variability - consider demand smoothing' if cv > 0.3 else '✅ Stable demand pattern'}</li>
             <li>{'📈 Increasing trend detected' if trend > 0.5 else '📉 Decreasing trend detected' if trend < -0.5 else '➡️ Stable trend'}</li>
             </ul>
             </div>
             """, unsafe_allow_html=True)
+            
+            # Download
+            summary = {'day': data['days'], 'demand': data['demand']}
+            if bands is not None:
+                summary.update({'mean': bands['mean'], 'p10': bands['p10'],
+                                'p50': bands['p50'], 'p90': bands['p90']})
+            file_stem = data['product_type'].lower().replace(' ', '_')
+            st.download_button("📥 Download Summary (CSV)", summary_csv(summary),
+                               file_name=f"{file_stem}_demand_forecast.csv", mime="text/csv")
+
+        
+        # Stored forecasts for this product that now have actual sales to compare against
+        if source == "Sales History" and history.products:
+            with st.expander("📜 Past Forecasts vs Actual Sales"):
+                past = get_run_store().runs(module='demand_bands', item=product_type,
+                                            start_to=history.last_day, limit=50)
+                if not past:
+                    st.info("No stored forecast for this product covers days in the sales history yet.")
+                else:
+                    choices = {f"Run {run['id']}: {run['params'].get('sim_days')} days from "
+                               f"{np.datetime64(run['start_day'], 'D')} (made "
+                               f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(run['created']))})": run
+                               for run in past}
+                    run = choices[st.selectbox("Forecast:", list(choices))]
+                    past_bands = get_run_store().load_run(run['id'])
+                    dates, units = history.daily(product_type)
+                    offset = dates.astype(np.int64) - run['start_day']
+                    window = (offset >= 0) & (offset < len(past_bands['p50']))
+                    offset, actual = offset[window], units[window]
+                    forecast_dates = np.datetime64(run['start_day'], 'D') + np.arange(len(past_bands['p50']))
+                    
+                    chart_start = time.perf_counter()
+                    fig = go.Figure()
+                    band_x, band_y = band_polygon(forecast_dates, past_bands['p10'], past_bands['p90'],
+                                                  MAX_CHART_POINTS)
+                    fig.add_trace(go.Scatter(x=band_x, y=band_y, fill='toself',
+                                             fillcolor='rgba(210, 105, 30, 0.2)',
+                                             line=dict(color='rgba(255,255,255,0)'),
+                                             name='Forecast 10th-90th Percentile', hoverinfo="skip"))
+                    fig.add_trace(go.Scatter(x=forecast_dates, y=past_bands['p50'], mode='lines',
+                                             name='Forecast Median', line=dict(color='#D2691E', width=2)))
+                    fig.add_trace(go.Scatter(x=dates[window], y=actual, mode='markers',
+                                             name='Actual Sales', marker=dict(color='#654321', size=6)))
+                    fig.update_layout(title=f'{product_type} - Forecast vs Actual', xaxis_title='Date',
+                                      yaxis_title='Units')
+                    show_chart(fig, chart_start, 'demand')
+                    
+                    if actual.size:
+                        median = past_bands['p50'][offset]
+                        inside = (actual >= past_bands['p10'][offset]) & (actual <= past_bands['p90'][offset])
+                        sold = actual > 0
+                        error = np.mean(np.abs(actual[sold] - median[sold]) / actual[sold]) if sold.any() else np.nan
+                        st.write(f"**Days Compared:** {actual.size} | **Within 10th-90th Band:** "
+                                 f"{inside.mean():.0%} (80% expected) | **Median Error:** {error:.1%} | "
+                                 f"**Bias:** {np.mean(actual - median):+.1f} units/day")
+                    else:
+                        st.info("No sales recorded yet in this forecast's window.")
 
 # Cost Analysis
-elif analysis_type == "💰 Cost Analysis":
+def render_cost_analysis(result_cache):
     st.header("💰 Cost Analysis")
     
     col1, col2 = st.columns([1, 2])
@@ -230,62 +697,166 @@ elif analysis_type == "💰 Cost Analysis":
             ["Flour", "Sugar", "Butter", "Eggs", "Yeast", "Chocolate"]
         )
         
-        current_price = st.slider("Current Price (₹/kg):", 50, 500, 150)
-        price_volatility = st.slider("Price Volatility (%):", 5, 50, 15) / 100
+        source = st.radio("Price Source:", ["Manual", "Price History"], horizontal=True)
+        history = None
+        if source == "Price History":
+            upload = st.file_uploader("Import Price History (CSV):", type=["csv"],
+                                      help="Needs date and price columns; an ingredient column "
+                                           "selects this ingredient's rows")
+            if upload is not None and st.button("📥 Import Prices"):
+                dates, prices = read_price_history(upload, ingredient)
+                if len(prices) < 3:
+                    st.warning(f"Need at least three {ingredient} prices to fit a model.")
+                else:
+                    st.session_state.price_history[ingredient] = (dates, prices)
+                    st.success(f"✅ Imported {len(prices):,} {ingredient} prices")
+            history = st.session_state.price_history.get(ingredient)
+            if history is None:
+                st.info(f"No {ingredient} price history yet - import a CSV to fit a price model.")
+        
+        price_model = None
+        if history is not None:
+            choices = [label for label, name in PRICE_MODEL_CHOICES.items() if name is not None]
+            suggested = INGREDIENT_PRICE_MODELS[ingredient]
+            model_label = st.selectbox("Price Model:", choices,
+                                       index=[PRICE_MODEL_CHOICES[c] for c in choices].index(suggested))
+            seasonal = st.checkbox("Monthly Seasonality", value=True)
+            dates, prices = history
+            fit_start = time.perf_counter()
+            price_model = fit_price_model(prices, dates, PRICE_MODEL_CHOICES[model_label],
+                                          seasonal=seasonal)
+            fit_ms = (time.perf_counter() - fit_start) * 1000
+            current_price = float(prices[-1])
+            price_volatility = None
+            st.caption(f"Fitted from {len(prices):,} prices up to {dates[-1]} in {fit_ms:.0f} ms: "
+                       + ", ".join(f"{k} {v:.3g}" for k, v in price_model.params().items())
+                       + f" (AIC {price_model.fit_info['aic']:,.0f})")
+        else:
+            model_label = st.selectbox("Price Model:", list(PRICE_MODEL_CHOICES))
+            current_price = st.slider("Current Price (₹/kg):", 50, 500, 150)
+            price_volatility = st.slider("Price Volatility (%):", 5, 50, 15) / 100
+            model_name = PRICE_MODEL_CHOICES[model_label]
+            if model_name in ('gbm', 'merton'):
+                drift = st.slider("Annual Drift (%):", -10, 20, 3) / 100
+                price_model = GBMModel(drift, price_volatility)
+            if model_name == 'merton':
+                jump_rate = st.slider("Jumps per Year:", 0.0, 12.0, 1.0, step=0.5)
+                jump_mean = st.slider("Average Jump (%):", -30, 50, 10) / 100
+                jump_sd = st.slider("Jump Size Spread (%):", 0, 50, 10) / 100
+                price_model = MertonModel(drift, price_volatility, jump_rate, np.log1p(jump_mean),
+                                          jump_sd)
+            elif model_name == 'ou':
+                mean_price = st.slider("Long-Run Price (₹/kg):", 50, 500, current_price)
+                half_life = st.slider("Reversion Half-Life (months):", 1, 36, 6)
+                price_model = OUModel(np.log(2) / (half_life / 12), mean_price, price_volatility)
         forecast_months = st.slider("Forecast Period (months):", 1, 24, 6)
+        sampling = st.selectbox("Variance Reduction:", list(SAMPLING_METHODS),
+                                help="Sobol paths are built with a Brownian bridge")
+        convergence = convergence_controls()
+        if convergence is None:
+            n_scenarios = st.select_slider("Scenarios:", [100, 250, 500, 1000, 2000, 5000, 10000,
+                                                          100000, 1000000], value=500)
+            control_variate = price_model is None and st.checkbox("Control Variate (analytic GBM mean)")
+            storage = st.selectbox("Path Storage:", list(PATH_STORAGE)[:2],
+                                   help="Compact storage halves memory for large scenario counts")
+        n_overlay = st.slider("Sample Paths to Overlay:", 0, MAX_SAMPLE_PATHS, 0, step=10)
         
         if st.button("🔮 Run Cost Forecast", type="primary"):
-            # Run simulation
-            np.random.seed(42)
-            dt = 1/12
-            drift = 0.03
-            n_scenarios = 500
-            price_paths = []
-            
-            for _ in range(n_scenarios):
-                prices = [current_price]
-                for _ in range(forecast_months):
-                    shock = np.random.normal(0, price_volatility)
-                    new_price = prices[-1] * np.exp((drift - 0.5 * price_volatility**2) * dt + 
-                                                   price_volatility * np.sqrt(dt) * shock)
-                    prices.append(max(new_price, current_price * 0.5))
-                price_paths.append(prices)
-            
-            price_paths = np.array(price_paths)
-            mean_path = np.mean(price_paths, axis=0)
-            p10_path = np.percentile(price_paths, 10, axis=0)
-            p90_path = np.percentile(price_paths, 90, axis=0)
-            
-            st.session_state.cost_data = {
-                'months': np.arange(len(mean_path)),
-                'mean_path': mean_path,
-                'p10_path': p10_path,
-                'p90_path': p90_path,
-                'current_price': current_price,
-                'ingredient': ingredient
-            }
-            st.success("✅ Forecast completed!")
+            # Run simulation (standard Monte Carlo reproduces the original 500 scenarios)
+            method = SAMPLING_METHODS[sampling]
+            params = {'ingredient': ingredient, 'current_price': current_price,
+                      'price_volatility': price_volatility, 'forecast_months': forecast_months,
+                      'method': method,
+                      'price_model': price_model.key() if price_model is not None else None}
+            
+            def cost_data(summary):
+                return {
+                    'months': np.arange(len(summary['mean_path'])),
+                    'mean_path': summary['mean_path'],
+                    'p10_path': summary['p10_path'],
+                    'p90_path': summary['p90_path'],
+                    'sample_paths': summary['sample_paths'],
+                    'mean_path_se': summary['mean_path_se'],
+                    'p10_path_se': summary['p10_path_se'],
+                    'p90_path_se': summary['p90_path_se'],
+                    'n_scenarios': summary['n_scenarios'],
+                    'convergence': (convergence_note(summary, 'scenarios')
+                                    if 'stop_reason' in summary else None),
+                    'sampling': sampling,
+                    'model_label': model_label,
+                    'current_price': current_price,
+                    'ingredient': ingredient
+                }
+            
+            def simulate(progress):
+                if convergence is not None:
+                    tolerance, time_budget = convergence
+                    summary = result_cache.get_or_compute(
+                        'cost', dict(params, tolerance=tolerance, time_budget=time_budget),
+                        lambda: adaptive_price_bands(
+                            current_price, price_volatility, forecast_months, tolerance=tolerance,
+                            time_budget=time_budget, method=method, n_samples=MAX_SAMPLE_PATHS,
+                            model=price_model,
+                            progress=lambda fraction, snapshot: progress(
+                                fraction, lambda: cost_data(snapshot())),
+                            seed=42),
+                        seed=42)
+                else:
+                    summary = result_cache.get_or_compute(
+                        'cost', dict(params, n_scenarios=n_scenarios, control_variate=control_variate,
+                                     dtype=PATH_STORAGE[storage]),
+                        lambda: estimate_price_bands(current_price, price_volatility, forecast_months,
+                                                     n_scenarios, method=method,
+                                                     control_variate=control_variate,
+                                                     n_samples=MAX_SAMPLE_PATHS,
+                                                     model=price_model, dtype=PATH_STORAGE[storage],
+                                                     memory_limit=SPILL_BYTES, spill_dir=SPILL_DIR,
+                                                     progress=lambda fraction, snapshot: progress(
+                                                         fraction, lambda: cost_data(snapshot())),
+                                                     seed=42),
+                        seed=42)
+                return cost_data(summary)
+            
+            start_job('cost_data', 'cost', simulate)
+        job_panel('cost_data')
     
     with col2:
         if st.session_state.cost_data is not None:
             data = st.session_state.cost_data
             
+            chart_start = time.perf_counter()
             # Create interactive plot
             fig = go.Figure()
             
+            # Sample paths go underneath as one WebGL trace
+            if n_overlay > 0 and data.get('sample_paths') is not None:
+                overlay_x, overlay_y = path_overlay(data['months'], data['sample_paths'][:n_overlay],
+                                                    POINTS_PER_SAMPLE_PATH)
+                fig.add_trace(go.Scattergl(
+                    x=overlay_x,
+                    y=overlay_y,
+                    mode='lines',
+                    name=f'{min(n_overlay, len(data["sample_paths"]))} Sample Paths',
+                    line=dict(color='rgba(184, 134, 11, 0.15)', width=1),
+                    hoverinfo="skip"
+                ))
+            
+            line_x, line_y = lttb(data['months'], data['mean_path'], MAX_CHART_POINTS)
             fig.add_trace(go.Scatter(
-                x=data['months'],
-                y=data['mean_path'],
-                mode='lines+markers',
+                x=line_x,
+                y=line_y,
+                mode='lines+markers' if len(line_x) <= MARKER_POINTS else 'lines',
                 name='Expected Price',
                 line=dict(color='#B8860B', width=3),
                 marker=dict(size=6)
             ))
             
             # Add confidence bands
+            band_x, band_y = band_polygon(data['months'], data['p10_path'], data['p90_path'],
+                                          MAX_CHART_POINTS)
             fig.add_trace(go.Scatter(
-                x=np.concatenate([data['months'], data['months'][::-1]]),
-                y=np.concatenate([data['p90_path'], data['p10_path'][::-1]]),
+                x=band_x,
+                y=band_y,
                 fill='toself',
                 fillcolor='rgba(184, 134, 11, 0.2)',
                 line=dict(color='rgba(255,255,255,0)'),
@@ -304,7 +875,7 @@ elif analysis_type == "💰 Cost Analysis":
                 showlegend=True
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig, chart_start, 'cost')
             
             # Insights
             final_price = data['mean_path'][-1]
@@ -323,15 +894,21 @@ elif analysis_type == "💰 Cost Analysis":
             else:
                 strategy = "🔵 NEUTRAL - Stable prices"
                 strategy_color = "#4682B4"
+            convergence_items = ""
+            if data.get('convergence'):
+                convergence_items = f"""
+            <li>{data['convergence']}</li>"""
             
             st.markdown(f"""
             <div class="insight-box">
             <h4>💰 Cost Insights</h4>
             <ul>
+            <li><strong>Price Model:</strong> {data['model_label']}</li>
             <li><strong>Current Price:</strong> ₹{data['current_price']:.2f}/kg</li>
-            <li><strong>Expected Final Price:</strong> ₹{final_price:.2f}/kg</li>
+            <li><strong>Expected Final Price:</strong> ₹{final_price:.2f}/kg (± {data['mean_path_se'][-1]:.2f})</li>
             <li><strong>Projected Change:</strong> {change_pct:+.1f}%</li>
             <li><strong>Maximum Risk:</strong> ₹{max_price:.2f}/kg</li>
+            <li><strong>Estimate Precision:</strong> ± ₹{data['p90_path_se'][-1]:.2f} on the final P90 (1 SE, {data['n_scenarios']:,} scenarios, {data['sampling']})</li>{convergence_items}
             </ul>
             
             <h4 style="color: {strategy_color}">🎯 Strategy: {strategy}</h4>
@@ -344,9 +921,24 @@ elif analysis_type == "💰 Cost Analysis":
             </ul>
             </div>
             """, unsafe_allow_html=True)
+            
+            # Download
+            summary = {
+                'month': data['months'],
+                'mean_price': data['mean_path'],
+                'p10_price': data['p10_path'],
+                'p90_price': data['p90_path'],
+                'mean_price_se': data['mean_path_se'],
+                'p10_price_se': data['p10_path_se'],
+                'p90_price_se': data['p90_path_se']
+            }
+            st.download_button("📥 Download Summary (CSV)", summary_csv(summary),
+                               file_name=f"{data['ingredient'].lower()}_price_forecast.csv",
+                               mime="text/csv")
+
 
 # Staff Planning
-elif analysis_type == "👥 Staff Planning":
+def render_staff_planning(result_cache):
     st.header("👥 Staff Planning")
     
     col1, col2 = st.columns([1, 2])
@@ -357,42 +949,64 @@ elif analysis_type == "👥 Staff Planning":
         avg_customers = st.slider("Daily Customers:", 50, 300, 120)
         customer_var = st.slider("Customer Variability (%):", 10, 50, 25) / 100
         service_rate = st.slider("Service Rate (customers/hour/staff):", 5, 15, 8)
+        hourly_wage = st.slider("Hourly Wage (₹/staff-hour):", 100, 500, int(DEFAULT_HOURLY_WAGE), step=10)
+        convergence = convergence_controls()
+        if convergence is None:
+            n_days = st.slider("Simulated Days:", 30, 730, 365, step=5)
+        
+        staffing_model = st.radio("Staffing Model:", ["Service Level (Erlang C)", "Simple Capacity"],
+                                  horizontal=True)
+        if staffing_model == "Service Level (Erlang C)":
+            model = 'erlang'
+            service_level = st.slider("Service Level Target (%):", 50, 99, 80) / 100
+            target_wait = st.slider("Maximum Wait (minutes):", 1, 15, 5)
+        else:
+            model = 'simple'
+            service_level = target_wait = None
         
         if st.button("⚡ Analyze Staffing", type="primary"):
             # Run simulation
-            hours = np.arange(8, 20)
-            base_pattern = np.array([0.4, 0.6, 0.8, 1.0, 1.4, 1.8, 1.6, 1.2, 0.9, 0.7, 0.8, 1.1])
-            hourly_customers = avg_customers * base_pattern / np.sum(base_pattern)
-            
-            np.random.seed(42)
-            n_days = 30
-            daily_patterns = []
-            
-            for day in range(n_days):
-                day_multiplier = 1.3 if day % 7 in [5, 6] else 1.0
-                adjusted_customers = hourly_customers * day_multiplier
-                actual_customers = np.maximum(0, np.random.normal(adjusted_customers, 
-                                                                 adjusted_customers * customer_var))
-                daily_patterns.append(actual_customers)
-            
-            daily_patterns = np.array(daily_patterns)
-            staff_needed = np.ceil(daily_patterns / service_rate)
-            avg_staff = np.mean(staff_needed, axis=0)
-            p90_staff = np.percentile(staff_needed, 90, axis=0)
-            
-            st.session_state.staff_data = {
-                'hours': hours,
-                'avg_staff': avg_staff,
-                'p90_staff': p90_staff,
-                'hourly_customers': np.mean(daily_patterns, axis=0),
-                'service_rate': service_rate
-            }
-            st.success("✅ Analysis completed!")
+            params = {'avg_customers': avg_customers, 'customer_var': customer_var,
+                      'service_rate': service_rate, 'model': model,
+                      'service_level': service_level, 'target_wait': target_wait}
+            
+            def staff_data(result):
+                return dict(result, model=model, service_level=service_level,
+                            target_wait=target_wait, hourly_wage=hourly_wage)
+            
+            def simulate(progress):
+                if convergence is not None:
+                    tolerance, time_budget = convergence
+                    result = result_cache.get_or_compute(
+                        'staffing', dict(params, tolerance=tolerance, time_budget=time_budget),
+                        lambda: adaptive_staffing(
+                            avg_customers, customer_var, service_rate, model=model,
+                            service_level=service_level, target_wait=target_wait,
+                            tolerance=tolerance, time_budget=time_budget,
+                            progress=lambda fraction, snapshot: progress(
+                                fraction, lambda: staff_data(snapshot())),
+                            seed=42),
+                        seed=42)
+                else:
+                    result = result_cache.get_or_compute(
+                        'staffing', dict(params, n_days=n_days),
+                        lambda: analyze_staffing(avg_customers, customer_var, service_rate, n_days,
+                                                 model=model, service_level=service_level,
+                                                 target_wait=target_wait,
+                                                 progress=lambda fraction, snapshot: progress(
+                                                     fraction, lambda: staff_data(snapshot())),
+                                                 seed=42),
+                        seed=42)
+                return staff_data(result)
+            
+            start_job('staff_data', 'staffing', simulate)
+        job_panel('staff_data')
     
     with col2:
         if st.session_state.staff_data is not None:
             data = st.session_state.staff_data
             
+            chart_start = time.perf_counter()
             # Create dual-axis plot
             fig = make_subplots(specs=[[{"secondary_y": True}]])
             
@@ -438,14 +1052,23 @@ elif analysis_type == "👥 Staff Planning":
                 showlegend=True
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig, chart_start, 'staffing')
             
             # Insights
             peak_hour = data['hours'][np.argmax(data['avg_staff'])]
             peak_staff = int(np.max(data['avg_staff']))
             min_staff = int(np.min(data['avg_staff']))
             total_hours = np.sum(data['avg_staff'])
-            daily_cost = total_hours * 200
+            daily_cost = total_hours * data.get('hourly_wage', DEFAULT_HOURLY_WAGE)
+            if data.get('model') == 'erlang':
+                service_target = (f"{data['service_level']:.0%} of customers served within "
+                                  f"{data['target_wait']} min")
+            else:
+                service_target = "capacity only (no queueing)"
+            convergence_items = ""
+            if 'stop_reason' in data:
+                convergence_items = f"""
+            <li>{convergence_note(data, 'days')}</li>"""
             
             st.markdown(f"""
             <div class="insight-box">
@@ -455,6 +1078,7 @@ elif analysis_type == "👥 Staff Planning":
             <li><strong>Minimum Staff:</strong> {min_staff} members</li>
             <li><strong>Total Daily Hours:</strong> {total_hours:.1f}</li>
             <li><strong>Daily Labor Cost:</strong> ₹{daily_cost:.0f}</li>
+            <li><strong>Service Target:</strong> {service_target}</li>{convergence_items}
             </ul>
             
             <h4>💡 Recommendations</h4>
@@ -473,9 +1097,457 @@ elif analysis_type == "👥 Staff Planning":
             </ul>
             </div>
             """, unsafe_allow_html=True)
+            
+            # Download
+            summary = {
+                'hour': data['hours'],
+                'avg_staff': data['avg_staff'],
+                'p90_staff': data['p90_staff'],
+                'avg_customers': data['hourly_customers']
+            }
+            st.download_button("📥 Download Summary (CSV)", summary_csv(summary),
+                               file_name="staffing_summary.csv", mime="text/csv")
+
+
+# Multi-Location
+def store_network(n_stores, n_regions, avg_demand, size_spread, products):
+    # Store sizes are drawn once per network size, so reruns keep the same stores
+    sizes = np.random.default_rng(n_stores).lognormal(0, size_spread, n_stores)
+    sizes /= sizes.mean()
+    mix = np.array([PRODUCT_MIX[p] for p in products])
+    regions = [f"Region {chr(ord('A') + i % n_regions)}" for i in range(n_stores)]
+    return avg_demand * sizes[:, None] * mix, regions
+
+
+def render_multi_location(result_cache):
+    st.header("🏬 Multi-Location Planning")
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.subheader("🎯 Parameters")
+        
+        n_stores = st.slider("Number of Stores:", 2, 200, 20)
+        n_regions = st.slider("Number of Regions:", 1, 10, 4)
+        products = st.multiselect("Products:", list(PRODUCT_MIX), default=list(PRODUCT_MIX))
+        avg_demand = st.slider("Average Daily Demand per Store (units):", 20, 300, 100)
+        size_spread = st.slider("Store Size Spread (%):", 0, 60, 25) / 100
+        demand_var = st.slider("Demand Variability (%):", 10, 80, 30) / 100
+        city_pct = st.slider("City-wide Shock Share (%):", 0, 90, 30,
+                             help="Share of each store's day-to-day variation shared by every store")
+        region_pct = st.slider("Regional Shock Share (%):", 0, 100 - city_pct, min(20, 100 - city_pct),
+                               help="Share shared by stores in the same region; the rest is store-level noise")
+        product_corr = st.slider("Correlation Between Products:", 0.0, 0.9, 0.4, step=0.05)
+        sim_days = st.slider("Simulation Days:", 7, 365, 30)
+        n_paths = st.slider("Simulated Paths:", 500, 10000, 2000, step=500)
+        
+        if st.button("🚀 Run Network Simulation", type="primary"):
+            if not products:
+                st.warning("Select at least one product.")
+            else:
+                avg, regions = store_network(n_stores, n_regions, avg_demand, size_spread, products)
+                params = {'n_stores': n_stores, 'n_regions': n_regions,
+                          'products': tuple(products), 'avg_demand': avg_demand,
+                          'size_spread': size_spread,
+                          'demand_var': demand_var, 'city_share': city_pct / 100,
+                          'region_share': region_pct / 100, 'product_corr': product_corr,
+                          'sim_days': sim_days, 'n_paths': n_paths}
+                
+                def simulate(progress):
+                    result = result_cache.get_or_compute(
+                        'network', params,
+                        lambda: simulate_network_demand(
+                            avg, demand_var, sim_days, regions=regions, n_paths=n_paths,
+                            product_corr=equicorrelation(len(products), product_corr),
+                            city_share=city_pct / 100, region_share=region_pct / 100,
+                            memory_budget=NETWORK_MEMORY_MB * 1024**2,
+                            progress=lambda fraction, snapshot: progress(
+                                fraction, lambda: dict(snapshot(), products=products,
+                                                       n_stores=n_stores)),
+                            seed=42),
+                        seed=42)
+                    return dict(result, products=products, n_stores=n_stores)
+                
+                start_job('network_data', 'network', simulate)
+        job_panel('network_data')
+    
+    with col2:
+        if st.session_state.network_data is not None:
+            data = st.session_state.network_data
+            product = st.selectbox("Show Product:", data['products'])
+            p = data['products'].index(product)
+            regions = data['regions'][:-1]
+            
+            chart_start = time.perf_counter()
+            fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                                subplot_titles=("Network Total", "Region Totals (Median)"))
+            
+            line_x, line_y = lttb(data['days'], data['p50'][-1, p], MAX_CHART_POINTS)
+            fig.add_trace(go.Scatter(x=line_x, y=line_y, mode='lines', name='Network Median',
+                                     line=dict(color='#D2691E', width=3)), row=1, col=1)
+            band_x, band_y = band_polygon(data['days'], data['p10'][-1, p], data['p90'][-1, p],
+                                          MAX_CHART_POINTS)
+            fig.add_trace(go.Scatter(x=band_x, y=band_y, fill='toself',
+                                     fillcolor='rgba(210, 105, 30, 0.2)',
+                                     line=dict(color='rgba(255,255,255,0)'),
+                                     name=f'P10-P90 Band ({data["n_paths"]:,} paths)',
+                                     hoverinfo="skip"), row=1, col=1)
+            
+            for r, region in enumerate(regions):
+                line_x, line_y = lttb(data['days'], data['p50'][r, p], MAX_CHART_POINTS)
+                fig.add_trace(go.Scatter(x=line_x, y=line_y, mode='lines', name=region),
+                              row=2, col=1)
+            
+            fig.update_xaxes(title_text="Day", row=2, col=1)
+            fig.update_yaxes(title_text="Units", row=1, col=1)
+            fig.update_yaxes(title_text="Units", row=2, col=1)
+            fig.update_layout(
+                title=f'{product} Demand Across {data["n_stores"]} Stores - {len(data["days"])} Days',
+                hovermode='x unified',
+                showlegend=True,
+                height=650
+            )
+            
+            show_chart(fig, chart_start, 'network')
+            
+            # Pooling: the network needs less buffer than its stores planned one by one
+            network_mean = np.mean(data['mean'][-1, p])
+            network_p90 = np.mean(data['p90'][-1, p])
+            region_buffer = np.sum(np.mean(data['p90'][:-1, p] - data['mean'][:-1, p], axis=1))
+            network_buffer = network_p90 - network_mean
+            busiest = regions[int(np.argmax(np.mean(data['mean'][:-1, p], axis=1)))]
+            
+            st.markdown(f"""
+            <div class="insight-box">
+            <h4>💡 Network Insights</h4>
+            <ul>
+            <li><strong>Network Daily Demand:</strong> {network_mean:.0f} units</li>
+            <li><strong>Network Peak (90th %):</strong> {network_p90:.0f} units</li>
+            <li><strong>Network Variability:</strong> {np.mean(data['std'][-1, p]) / network_mean:.2f}</li>
+            <li><strong>Busiest Region:</strong> {busiest}</li>
+            </ul>
+            
+            <h4>🎯 Recommendations</h4>
+            <ul>
+            <li><strong>Central Production:</strong> {network_p90:.0f} units/day</li>
+            <li><strong>Safety Buffer:</strong> {network_buffer:.0f} units pooled vs {region_buffer:.0f} planned region by region</li>
+            <li>{'⚠️ Strong city-wide swings - pooling helps little' if network_buffer > 0.8 * region_buffer else '✅ Regions offset each other - share safety stock'}</li>
+            </ul>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Region totals per day for every product
+            n_rows, n_products, n_days = data['mean'].shape
+            summary = {
+                'region': np.repeat(data['regions'], n_products * n_days),
+                'product': np.tile(np.repeat(data['products'], n_days), n_rows),
+                'day': np.tile(data['days'], n_rows * n_products),
+                'mean': data['mean'].ravel(),
+                'p10': data['p10'].ravel(),
+                'p50': data['p50'].ravel(),
+                'p90': data['p90'].ravel()
+            }
+            st.download_button("📥 Download Region Totals (CSV)", summary_csv(summary),
+                               file_name="network_demand_forecast.csv", mime="text/csv")
+
+
+# Profit & Risk
+def render_profit_risk(result_cache):
+    st.header("💹 Profit & Risk")
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.subheader("🎯 Parameters")
+        
+        products = st.multiselect("Products:", list(PRODUCT_CATALOG), default=list(PRODUCT_CATALOG))
+        avg_demand = st.slider("Average Daily Demand (units, best seller):", 50, 300, 150)
+        demand_var = st.slider("Demand Variability (%):", 10, 80, 30) / 100
+        plan_mode = st.radio("Production Plan:", ["Optimized", "Fixed Buffer"], horizontal=True,
+                             help="Optimized picks each product's profit-maximising daily quantity")
+        if plan_mode == "Fixed Buffer":
+            production_buffer = st.slider("Production Above Average Demand (%):", 0, 60, 20,
+                                          help="Units baked each day, relative to average demand") / 100
+        else:
+            production_buffer = None
+        price_volatility = st.slider("Ingredient Price Volatility (%):", 5, 50, 15) / 100
+        units_per_customer = st.slider("Units per Customer:", 1.0, 5.0, 2.0, step=0.5)
+        service_rate = st.slider("Service Rate (customers/hour/staff):", 5, 15, 8)
+        hourly_wage = st.slider("Hourly Wage (₹/staff-hour):", 100, 500, int(DEFAULT_HOURLY_WAGE), step=10)
+        n_days = st.slider("Simulation Days:", 7, 365, 30)
+        n_paths = st.select_slider("Simulated Paths:", [10000, 20000, 50000, 100000, 200000],
+                                   value=100000)
+        
+        if st.button("🚀 Run Profit Simulation", type="primary"):
+            if not products:
+                st.warning("Select at least one product.")
+            else:
+                avg = avg_demand * np.array([PRODUCT_MIX[p] for p in products])
+                sale_price = [PRODUCT_CATALOG[p]['price'] for p in products]
+                recipe = [[PRODUCT_CATALOG[p]['recipe'].get(i, 0.0) for i in INGREDIENT_PRICES]
+                          for p in products]
+                # The optimized plan is scored on demand independent of the draws it was
+                # fitted to (reusing them would overstate its profit and understate its
+                # risk); both plans are scored on the same stream, so they stay comparable.
+                # Each seed is (entropy, spawn key): a child of SeedSequence(42)
+                plan_seed, score_seed = (42, 0), (42, 1)
+                params = {'products': tuple(products), 'avg_demand': avg_demand, 'demand_var': demand_var,
+                          'production_buffer': production_buffer,
+                          'price_volatility': price_volatility,
+                          'units_per_customer': units_per_customer, 'service_rate': service_rate,
+                          'hourly_wage': hourly_wage, 'n_days': n_days, 'n_paths': n_paths,
+                          'plan_seed': plan_seed, 'score_seed': score_seed}
+                
+                def simulate(progress):
+                    plan_stream, score_stream = (
+                        np.random.SeedSequence(entropy, spawn_key=(key,))
+                        for entropy, key in (plan_seed, score_seed))
+                    if production_buffer is None:
+                        plans = optimize_production(avg, demand_var, n_days, sale_price,
+                                                    [recipe_cost(p) for p in products],
+                                                    n_paths=OPTIMIZER_PATHS,
+                                                    seed=np.random.default_rng(plan_stream))
+                        production = np.array([plan['quantity'] for plan in plans])
+                    else:
+                        production = np.rint(avg * (1 + production_buffer))
+                    result = simulate_profit(avg, demand_var, sale_price, production, recipe,
+                                             list(INGREDIENT_PRICES.values()), price_volatility,
+                                             n_days=n_days, n_paths=n_paths,
+                                             units_per_customer=units_per_customer,
+                                             service_rate=service_rate, hourly_wage=hourly_wage,
+                                             progress=lambda fraction, snapshot: progress(
+                                                 fraction, lambda: dict(snapshot(),
+                                                                        production=production,
+                                                                        products=products)),
+                                             seed=score_stream)
+                    return dict(result, production=production, products=products)
+                
+                start_job('profit_data', 'profit',
+                          lambda progress: result_cache.get_or_compute(
+                              'profit', params, lambda: simulate(progress), seed=42))
+        job_panel('profit_data')
+    
+    with col2:
+        if st.session_state.profit_data is not None:
+            data = st.session_state.profit_data
+            
+            chart_start = time.perf_counter()
+            # Profit histogram (binned here so the chart payload stays small)
+            counts, edges = np.histogram(data['profit'], bins=100)
+            centers = (edges[:-1] + edges[1:]) / 2
+            fig = go.Figure()
+            fig.add_trace(go.Bar(
+                x=centers,
+                y=counts / data['n_paths'] * 100,
+                name='Profit Distribution',
+                marker_color=np.where(centers < 0, '#CD5C5C', '#D2691E')
+            ))
+            fig.add_vline(x=data['mean'], line_dash="dash", line_color="#8B4513",
+                          annotation_text=f"Expected: ₹{data['mean']:,.0f}")
+            fig.add_vline(x=-data['var95'], line_dash="dot", line_color="#CD5C5C",
+                          annotation_text=f"5% Worst: ₹{-data['var95']:,.0f}")
+            fig.update_layout(
+                title=f'Profit Distribution - {data["n_days"]} Days, {data["n_paths"]:,} Paths',
+                xaxis_title='Profit (₹)',
+                yaxis_title='Paths (%)',
+                bargap=0,
+                showlegend=False
+            )
+            
+            show_chart(fig, chart_start, 'profit')
+            
+            margin = data['mean'] / data['revenue'] if data['revenue'] else 0.0
+            
+            st.markdown(f"""
+            <div class="insight-box">
+            <h4>💹 Profit Insights</h4>
+            <ul>
+            <li><strong>Expected Profit:</strong> ₹{data['mean']:,.0f} ({margin:.0%} margin)</li>
+            <li><strong>Probability of Loss:</strong> {data['p_loss']:.1%}</li>
+            <li><strong>Value at Risk (95%):</strong> ₹{data['var95']:,.0f}</li>
+            <li><strong>Conditional VaR (95%):</strong> ₹{data['cvar95']:,.0f}</li>
+            <li><strong>Value at Risk (99%):</strong> ₹{data['var99']:,.0f}</li>
+            </ul>
+            
+            <h4>🧾 Average Breakdown</h4>
+            <ul>
+            <li><strong>Revenue:</strong> ₹{data['revenue']:,.0f}</li>
+            <li><strong>Ingredients:</strong> ₹{data['ingredient_cost']:,.0f}</li>
+            <li><strong>Labor:</strong> ₹{data['labor_cost']:,.0f}</li>
+            <li><strong>Wasted Units:</strong> {data['waste_units']:,.0f}</li>
+            <li><strong>Demand Served:</strong> {data['fill_rate']:.1%}</li>
+            </ul>
+            
+            <h4>🥐 Daily Production</h4>
+            <ul>
+            {''.join(f"<li><strong>{product}:</strong> {units:.0f} units</li>" for product, units in zip(data['products'], data['production']))}
+            </ul>
+            </div>
+            """, unsafe_allow_html=True)
+            st.caption("Value at risk is the loss exceeded on the worst 5% (or 1%) of paths; "
+                       "a negative value means even those paths make a profit.")
+            
+            # Download
+            summary = {
+                'profit_from': edges[:-1],
+                'profit_to': edges[1:],
+                'paths': counts
+            }
+            st.download_button("📥 Download Profit Distribution (CSV)", summary_csv(summary),
+                               file_name="profit_distribution.csv", mime="text/csv")
+
+
+# Sensitivity Analysis
+def render_sensitivity(result_cache):
+    st.header("🎚️ Sensitivity Analysis")
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.subheader("🎯 Parameters")
+        
+        analysis = SENSITIVITY_ANALYSES[st.selectbox("Analysis:", list(SENSITIVITY_ANALYSES))]
+        inputs = SENSITIVITY_INPUTS[analysis]
+        base = {name: st.slider(label, low, high, default, key=f"sensitivity_{name}") / scale
+                for label, (name, low, high, default, scale) in inputs.items()}
+        swing = st.slider("Tornado Swing (± % of each range):", 5, 50, 10,
+                          help="How far each input moves up and down from the values above") / 100
+        sweep_mode = st.radio("Sweep:", ["Grid", "Latin Hypercube"], horizontal=True,
+                              help="A grid covers two inputs over their whole slider range; a Latin "
+                                   "hypercube samples every input at once")
+        if sweep_mode == "Grid":
+            x_label = st.selectbox("Grid X Axis:", list(inputs))
+            y_label = st.selectbox("Grid Y Axis:", [label for label in inputs if label != x_label])
+            n_points = st.slider("Grid Points per Axis:", 10, 50, 50)
+        else:
+            x_label = y_label = None
+            n_points = st.select_slider("Hypercube Samples:", [250, 500, 1000, 2500], value=1000)
+        if analysis == 'staffing':
+            n_paths = st.slider("Simulated Days:", 30, 730, 365, step=5)
+            options = {'n_days': n_paths}
+        elif analysis == 'cost':
+            forecast_months = st.slider("Forecast Period (months):", 1, 24, 6)
+            n_paths = st.select_slider("Scenarios:", [1000, 5000, 10000, 20000], value=10000)
+            options = {'n_steps': forecast_months, 'n_scenarios': n_paths}
+        else:
+            n_paths = st.select_slider("Simulated Paths:", [1000, 5000, 10000, 20000], value=10000)
+            options = {'sim_days': 30, 'n_paths': n_paths}
+        
+        if st.button("🎚️ Run Sensitivity Sweep", type="primary"):
+            # Every point reuses the same random draws, so differences come from the inputs alone
+            ranges = {name: (low / scale, high / scale)
+                      for name, low, high, _, scale in inputs.values()}
+            params = dict(base, analysis=analysis, swing=swing, sweep_mode=sweep_mode,
+                          x_label=x_label, y_label=y_label, n_points=n_points, **options)
+            
+            def simulate(progress):
+                # The tornado is the first tenth of the job, the sweep the rest
+                bars = tornado(analysis, base,
+                               {name: (max(value - swing * (hi - lo), lo),
+                                       min(value + swing * (hi - lo), hi))
+                                for (name, (lo, hi)), value in zip(ranges.items(), base.values())},
+                               progress=lambda fraction: progress(0.1 * fraction),
+                               seed=42, **options)
+                if sweep_mode == "Grid":
+                    axes = {inputs[label][0]: ranges[inputs[label][0]] for label in (x_label, y_label)}
+                    points = dict(base, **parameter_grid(axes, n_points))
+                else:
+                    points = latin_hypercube(ranges, n_points, seed=42)
+                
+                def sensitivity_data(values):
+                    return {'analysis': analysis, 'tornado': bars, 'sweep_mode': sweep_mode,
+                            'x_label': x_label, 'y_label': y_label, 'points': points,
+                            'values': values, 'n_paths': n_paths}
+                
+                # The demand sweep averages over days, so it reports without a snapshot
+                def report(fraction, snapshot=None):
+                    progress(0.1 + 0.9 * fraction, None if snapshot is None
+                             else lambda: sensitivity_data(snapshot()))
+                
+                return sensitivity_data(SWEEPS[analysis](**points, progress=report, seed=42,
+                                                         **options))
+            
+            start_job('sensitivity_data', 'sensitivity',
+                      lambda progress: result_cache.get_or_compute(
+                          'sensitivity', params, lambda: simulate(progress), seed=42))
+        job_panel('sensitivity_data')
+    
+    with col2:
+        if st.session_state.sensitivity_data is not None:
+            data = st.session_state.sensitivity_data
+            inputs = SENSITIVITY_INPUTS[data['analysis']]
+            labels = {name: label for label, (name, *_) in inputs.items()}
+            scales = {name: scale for name, *_, scale in inputs.values()}
+            output = st.selectbox("Output:", list(SENSITIVITY_OUTPUTS[data['analysis']]))
+            metric, fmt = SENSITIVITY_OUTPUTS[data['analysis']][output]
+            
+            chart_start = time.perf_counter()
+            # Tornado: widest swing on top (Plotly draws horizontal bars bottom-up)
+            bars = data['tornado']
+            center = bars['base'][metric]
+            low, high = bars['low'][metric], bars['high'][metric]
+            order = np.argsort(np.abs(high - low))
+            names = [labels[bars['parameters'][i]] for i in order]
+            fig = go.Figure()
+            fig.add_trace(go.Bar(y=names, x=low[order] - center, base=center, orientation='h',
+                                 name='Input Down', marker_color='#DEB887'))
+            fig.add_trace(go.Bar(y=names, x=high[order] - center, base=center, orientation='h',
+                                 name='Input Up', marker_color='#8B4513'))
+            fig.add_vline(x=center, line_dash="dash", line_color="#654321")
+            fig.update_layout(title=f'Tornado - {output}', xaxis_title=output, barmode='overlay',
+                              xaxis_tickformat=fmt)
+            show_chart(fig, chart_start, 'sensitivity')
+            
+            chart_start = time.perf_counter()
+            # Sweep: heatmap over the grid, or the hypercube samples over the two most
+            # influential inputs
+            points, values = data['points'], data['values'][metric]
+            if data['sweep_mode'] == "Grid":
+                x_name, y_name = inputs[data['x_label']][0], inputs[data['y_label']][0]
+                fig = go.Figure(go.Heatmap(
+                    x=points[x_name][:, 0] * scales[x_name],
+                    y=points[y_name][0] * scales[y_name],
+                    z=values.T,
+                    colorscale='YlOrBr',
+                    colorbar={'title': output, 'tickformat': fmt}
+                ))
+            else:
+                y_name, x_name = (bars['parameters'][i] for i in order[-2:])
+                fig = go.Figure(go.Scattergl(
+                    x=points[x_name] * scales[x_name],
+                    y=points[y_name] * scales[y_name],
+                    mode='markers',
+                    marker={'color': values, 'colorscale': 'YlOrBr', 'size': 6,
+                            'colorbar': {'title': output, 'tickformat': fmt}}
+                ))
+            fig.update_layout(title=f'{output} - {values.size:,} {data["sweep_mode"]} Points',
+                              xaxis_title=labels[x_name], yaxis_title=labels[y_name])
+            show_chart(fig, chart_start, 'sensitivity')
+            
+            top = labels[bars['parameters'][order[-1]]]
+            st.markdown(f"""
+            <div class="insight-box">
+            <h4>🎚️ Sensitivity Insights</h4>
+            <ul>
+            <li><strong>At Your Settings:</strong> {center:{fmt}}</li>
+            <li><strong>Most Influential Input:</strong> {top} ({min(low[order[-1]], high[order[-1]]):{fmt}} to {max(low[order[-1]], high[order[-1]]):{fmt}})</li>
+            <li><strong>Across the Sweep:</strong> {np.nanmin(values):{fmt}} to {np.nanmax(values):{fmt}}</li>
+            <li><strong>Points Evaluated:</strong> {np.count_nonzero(~np.isnan(values)):,} on the same {data['n_paths']:,} simulated {'days' if data['analysis'] == 'staffing' else 'paths'}</li>
+            </ul>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Download
+            summary = {label: np.ravel(np.broadcast_to(points[name], values.shape)) * scales[name]
+                       for name, label in labels.items()}
+            summary.update({label: np.ravel(data['values'][key])
+                            for label, (key, _) in SENSITIVITY_OUTPUTS[data['analysis']].items()})
+            st.download_button("📥 Download Sensitivity Sweep (CSV)", summary_csv(summary),
+                               file_name="sensitivity_sweep.csv", mime="text/csv")
+
 
 # Help & Guide
-else:
+def render_help():
     st.header("📚 User Guide")
     
     st.markdown("""
@@ -486,18 +1558,35 @@ else:
     ### 📈 Demand Forecasting
     - **Purpose**: Predicts daily sales with realistic variability
     - **Benefits**: Models customer behavior and seasonal patterns
-    - **Output**: Provides conservative estimates for production planning
+    - **Output**: Per-day P10/P50/P90 bands across thousands of simulated paths for production planning
+    - **Production Plan**: The daily quantity that maximises expected profit for your price, cost and salvage value
     
     ### 💰 Cost Analysis
     - **Purpose**: Forecasts ingredient prices using advanced modeling
     - **Benefits**: Optimizes purchasing timing and strategies
     - **Output**: Provides inflation-adjusted projections
+    - **Price Models**: Jump diffusion for shock-prone ingredients, mean reversion for staples, optional monthly seasonality, fitted from your price history
     
     ### 👥 Staff Planning
     - **Purpose**: Models customer arrival patterns by hour
-    - **Benefits**: Calculates optimal staffing levels
+    - **Benefits**: Calculates staffing levels that meet a service level target (Erlang C queueing)
     - **Output**: Balances service quality with labor costs
     
+    ### 💹 Profit & Risk
+    - **Purpose**: Combines demand, ingredient prices (through each product's recipe) and staffing on every path
+    - **Benefits**: Shows the whole profit distribution instead of three separate forecasts
+    - **Output**: Expected profit, probability of loss and value at risk (VaR/CVaR)
+    
+    ### 🏬 Multi-Location Planning
+    - **Purpose**: Simulates every store and product together, with city-wide and regional swings
+    - **Benefits**: Shows how much safety stock regions can share instead of each store holding its own
+    - **Output**: Per-day P10/P50/P90 totals for each region and the whole network
+    
+    ### 🎚️ Sensitivity Analysis
+    - **Purpose**: Shows which inputs of the demand, cost or staffing analysis matter most
+    - **Benefits**: Sweeps a whole grid (or Latin hypercube) of inputs in one pass over shared random draws
+    - **Output**: A tornado chart of each input's swing and a heatmap of the chosen output
+    
     ## 🎯 How to Use
     1. **Select Analysis Type** from the sidebar
     2. **Adjust Parameters** using the sliders and dropdowns
@@ -508,21 +1597,142 @@ else:
     ## 💡 Key Tips
     - Run simulations weekly for best results
     - Compare scenarios by adjusting parameters
-    - Monitor actual vs predicted performance
+    - Monitor actual vs predicted performance under "Past Forecasts vs Actual Sales"
     - Consider external factors not in the model
     
     ## 🚀 Advanced Features
     - Interactive charts with hover details
-    - Downloadable results (coming soon)
-    - Historical data integration (coming soon)
-    - Multi-location analysis (coming soon)
+    - Downloadable CSV summaries in each analysis tab
+    - Full path exports to Parquet/Arrow/CSV from the batch runner
+    - Historical sales import with fitted weekday and seasonal patterns
+    - Variance reduction (antithetic variates, Sobol with a Brownian bridge, control variates) with standard errors on every band
+    - Run-until-converged mode that stops once the bands reach a target precision or a time budget
+    - Long simulations run in the background with a progress bar, a cancel button and live partial results
+    - Multi-location planning with correlated demand across stores, regions and products
+    - Every run is stored on disk, so repeated scenarios load instantly after a restart and past forecasts can be checked against actual sales
+    - Sensitivity sweeps with tornado and heatmap charts, every point scored on the same random draws
+    - Performance panel with per-stage timings and memory, plus Prometheus metrics for monitoring
+    - Compact float32 or whole-unit path storage, spilling to disk beyond a memory limit for million-scenario runs
     """)
     
     st.info("💡 **Pro Tip**: Start with the Demand Forecasting to understand your base requirements, then use Cost Analysis for purchasing decisions, and finally optimize with Staff Planning.")
 
-# Footer
-st.markdown("""
-<div class="footer">
-    Web Application |  Developed with 🧡 by J. Inigo Papu Vinodhan, Asst. Prof., BBA Dept., St. Joseph's College, Trichy
-</div>
-""", unsafe_allow_html=True)
+
+def main():
+    # Set page config
+    st.set_page_config(
+        page_title="SJC Bakery Analytics Suite",
+        page_icon="🍞",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
+
+    result_cache = get_result_cache()
+    profiler = get_profiler()
+
+    # Initialize session state
+    if 'demand_data' not in st.session_state:
+        st.session_state.demand_data = None
+    if 'cost_data' not in st.session_state:
+        st.session_state.cost_data = None
+    if 'staff_data' not in st.session_state:
+        st.session_state.staff_data = None
+    if 'network_data' not in st.session_state:
+        st.session_state.network_data = None
+    if 'profit_data' not in st.session_state:
+        st.session_state.profit_data = None
+    # Imported (dates, prices) per ingredient for price model calibration
+    if 'price_history' not in st.session_state:
+        st.session_state.price_history = {}
+    if 'sensitivity_data' not in st.session_state:
+        st.session_state.sensitivity_data = None
+    # Background job ID per result it will fill in, e.g. 'demand_data'
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = {}
+    # Timing spans of this session's most recent simulation job
+    if 'job_trace' not in st.session_state:
+        st.session_state.job_trace = None
+
+    # Sidebar
+    st.sidebar.title("🎛️ Control Panel")
+    analysis_type = st.sidebar.radio(
+        "Select Analysis Type:",
+        ["📈 Demand Forecasting", "💰 Cost Analysis", "👥 Staff Planning", "💹 Profit & Risk",
+         "🏬 Multi-Location", "🎚️ Sensitivity", "📚 Help & Guide"]
+    )
+
+    # Filled in at the end of the script so they include this run's lookup and timings
+    cache_panel = st.sidebar.expander("🗄️ Simulation Cache")
+    performance_panel = st.sidebar.expander("🩺 Performance")
+
+    with trace('page', tab=analysis_type) as page_trace:
+        if analysis_type == "📈 Demand Forecasting":
+            render_demand_forecasting(result_cache)
+        elif analysis_type == "💰 Cost Analysis":
+            render_cost_analysis(result_cache)
+        elif analysis_type == "👥 Staff Planning":
+            render_staff_planning(result_cache)
+        elif analysis_type == "💹 Profit & Risk":
+            render_profit_risk(result_cache)
+        elif analysis_type == "🏬 Multi-Location":
+            render_multi_location(result_cache)
+        elif analysis_type == "🎚️ Sensitivity":
+            render_sensitivity(result_cache)
+        else:
+            render_help()
+
+    # Cache statistics for capacity planning
+    with cache_panel:
+        cache_stats = result_cache.stats()
+        st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+        st.write(f"**Hits:** {cache_stats['hits']} | **Misses:** {cache_stats['misses']}")
+        st.write(f"**Entries:** {cache_stats['entries']} | **Evictions:** {cache_stats['evictions']}")
+        st.write(f"**Memory:** {cache_stats['nbytes'] / 1024**2:.1f} / "
+                 f"{cache_stats['max_bytes'] / 1024**2:.0f} MB")
+        for module, counts in cache_stats['modules'].items():
+            st.caption(f"{module}: {counts['hits']} hits, {counts['misses']} misses")
+        store_stats = get_run_store().stats()
+        st.write(f"**Stored Results:** {store_stats['results']} ({store_stats['nbytes'] / 1024**2:.1f} MB) | "
+                 f"**Runs:** {store_stats['runs']} | **Disk Hits:** {cache_stats['disk_hits']}")
+
+    # Per-stage timings of this page view and of the session's last simulation job
+    with performance_panel:
+        rss, peak_rss = rss_bytes(), peak_rss_bytes()
+        st.metric("Page Time", f"{page_trace.seconds * 1000:,.0f} ms")
+        if rss is not None and peak_rss is not None:
+            st.write(f"**Memory:** {rss / 1024**2:,.0f} MB | **Peak:** {peak_rss / 1024**2:,.0f} MB")
+        for title, timed in (("This Page", page_trace), ("Last Simulation", st.session_state.job_trace)):
+            if timed is None or not timed.spans:
+                continue
+            stages = timed.stages()
+            if timed.seconds is not None:
+                title += f" ({timed.seconds * 1000:,.0f} ms)"
+            st.caption(title)
+            st.dataframe(pd.DataFrame({
+                'Stage': list(stages),
+                'Calls': [stage['count'] for stage in stages.values()],
+                'Time (ms)': [round(stage['seconds'] * 1000, 1) for stage in stages.values()],
+                'Memory Δ (MB)': [None if stage['rss_delta'] is None else round(stage['rss_delta'] / 1024**2, 1)
+                                  for stage in stages.values()],
+            }), hide_index=True, use_container_width=True)
+        st.download_button("📥 Metrics (Prometheus)", profiler.prometheus_text(),
+                           file_name="bakery_metrics.prom", mime="text/plain")
+    if METRICS_FILE:
+        profiler.write_prometheus(METRICS_FILE)
+
+    # Footer
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
+    
+    # Redraw while this session has a simulation running in the background
+    job_manager = get_job_manager()
+    if any(job is not None and not job.done
+           for job in map(job_manager.get, st.session_state.jobs.values())):
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Monte Carlo simulation kernels for the SJC Bakery Analytics Suite.
+
+The package is headless: it depends only on numpy, so batch jobs and
+benchmarks can import it without Streamlit or any plotting library. Keep
+the cold import under ``IMPORT_TIME_BUDGET`` seconds (checked by
+``benchmarks/import_time.py``).
+"""
+
+from .adaptive import run_until_converged
+from .cache import ResultCache, make_key
+from .cost import (adaptive_price_bands, estimate_price_bands, iter_price_paths,
+                   simulate_price_bands, simulate_price_paths, summarize_price_paths)
+from .demand import (adaptive_demand_bands, demand_profile, estimate_demand_bands,
+                     iter_demand_paths, simulate_demand_bands, simulate_demand_paths)
+from .downsample import band_polygon, envelope, lttb, path_overlay
+from .export import PathWriter
+from .multistore import correlation_factor, equicorrelation, simulate_network_demand
+from .newsvendor import SortedDemand, optimize_production
+from .price_models import GBMModel, MertonModel, OUModel, fit_price_model
+from .profit import risk_measures, simulate_profit
+from .sensitivity import (latin_hypercube, parameter_grid, sweep_demand, sweep_price,
+                          sweep_staffing, tornado)
+from .staffing import (ErlangTable, adaptive_staffing, analyze_staffing, erlang_staff_required,
+                       hourly_customer_profile, simulate_customer_patterns, staff_required)
+from .stats import StreamingQuantiles
+from .store import RunStore
+from .version import ENGINE_VERSION, IMPORT_TIME_BUDGET
+
+__all__ = [
+    "ENGINE_VERSION",
+    "ErlangTable",
+    "GBMModel",
+    "IMPORT_TIME_BUDGET",
+    "MertonModel",
+    "OUModel",
+    "PathWriter",
+    "ResultCache",
+    "RunStore",
+    "SortedDemand",
+    "StreamingQuantiles",
+    "adaptive_demand_bands",
+    "adaptive_price_bands",
+    "adaptive_staffing",
+    "analyze_staffing",
+    "band_polygon",
+    "correlation_factor",
+    "demand_profile",
+    "envelope",
+    "equicorrelation",
+    "erlang_staff_required",
+    "estimate_demand_bands",
+    "estimate_price_bands",
+    "fit_price_model",
+    "hourly_customer_profile",
+    "iter_demand_paths",
+    "iter_price_paths",
+    "latin_hypercube",
+    "lttb",
+    "make_key",
+    "optimize_production",
+    "parameter_grid",
+    "path_overlay",
+    "risk_measures",
+    "run_until_converged",
+    "simulate_customer_patterns",
+    "simulate_demand_bands",
+    "simulate_demand_paths",
+    "simulate_network_demand",
+    "simulate_price_bands",
+    "simulate_price_paths",
+    "simulate_profit",
+    "staff_required",
+    "summarize_price_paths",
+    "sweep_demand",
+    "sweep_price",
+    "sweep_staffing",
+    "tornado",
+]
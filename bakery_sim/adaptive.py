@@ -0,0 +1,149 @@
+"""Run-until-converged driver for the Monte Carlo engines.
+
+``run_until_converged`` draws independent batches of paths until the
+reported statistics are known to a relative tolerance or a time budget runs
+out. Each batch contributes its own mean and percentile estimates; the
+reported value is their average and the standard error their spread divided
+by ``sqrt(n_batches)`` (batch means). Only running sums are kept, so
+memory does not grow with the number of batches or paths.
+"""
+
+import time
+
+import numpy as np
+
+from .profiling import span
+from .sampling import normal_quantile
+
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_TIME_BUDGET = 10.0
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MIN_BATCHES = 10
+DEFAULT_MAX_BATCHES = 1000
+
+
+def _half_width_ratio(estimate, se, scale, z):
+    # Confidence half-width relative to the larger of the estimate and the
+    # column mean, so statistics near zero (e.g. P10 of sparse demand) are
+    # judged against the typical level of their column
+    allowed = np.maximum(np.abs(estimate), scale)
+    half = z * se
+    return np.divide(half, allowed, out=np.where(half > 0, np.inf, 0.0), where=allowed > 0)
+
+
+def run_until_converged(draw, percentiles=(10, 90), extra=None, tolerance=DEFAULT_TOLERANCE,
+                        time_budget=DEFAULT_TIME_BUDGET, confidence=DEFAULT_CONFIDENCE,
+                        min_batches=DEFAULT_MIN_BATCHES, max_batches=DEFAULT_MAX_BATCHES,
+                        targets=None, progress=None):
+    """Draw batches until the statistics converge, the time budget expires or
+    ``max_batches`` is reached.
+
+    ``draw()`` returns one (rows, columns) batch of independent paths; every
+    batch should have the same number of rows. Per batch, the column means,
+    the ``percentiles`` and any ``extra(batch)`` statistics (a dict of
+    per-column arrays, e.g. exceedance probabilities) are recorded.
+
+    The run has converged once, for every statistic named in ``targets``
+    (default: ``'mean'`` and each ``'p{q}'``) and every column, the
+    ``confidence`` half-width is at most ``tolerance`` times the larger of
+    the estimate and the column mean. Convergence is only checked after
+    ``min_batches`` batches, and at least two batches are drawn so there is
+    a standard error. A batch is not started if the previous one suggests it
+    would finish after ``time_budget`` seconds. ``progress(fraction,
+    snapshot)`` is called after each batch with an estimate of the fraction
+    of the run done (from the precision reached, the time used and the batch
+    cap) and a ``snapshot()`` returning the results so far.
+
+    Returns every statistic and its ``*_se``, the pooled ``std``, plus
+    ``n_paths``, ``n_batches``, ``converged``, ``stop_reason``
+    (``'converged'``, ``'time_budget'`` or ``'max_batches'``; ``None`` in
+    snapshots of a run still going), ``elapsed``
+    seconds and ``precision``, the largest relative half-width among the
+    targets.
+    """
+    if tolerance <= 0:
+        raise ValueError("tolerance must be positive")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    if max_batches < 2:
+        raise ValueError("max_batches must be at least 2")
+    z = float(normal_quantile((1 + confidence) / 2))
+    names = ['mean'] + [f'p{q:g}' for q in percentiles]
+    if targets is None:
+        targets = names
+
+    means, m2 = {}, {}
+    total = total_sq = None
+    n_paths = 0
+    start = time.perf_counter()
+    precision = np.inf
+    stop_reason = None
+
+    def summarize():
+        result = {}
+        for name, value in means.items():
+            result[name] = value.copy()
+            result[f'{name}_se'] = np.sqrt(m2[name] / max(n_batches - 1, 1) / n_batches)
+        variance = total_sq / n_paths - np.square(total / n_paths)
+        result.update({
+            'std': np.sqrt(np.maximum(variance, 0)),
+            'n_paths': n_paths,
+            'n_batches': n_batches,
+            'converged': stop_reason == 'converged',
+            'stop_reason': stop_reason,
+            'elapsed': time.perf_counter() - start,
+            'precision': float(precision),
+        })
+        return result
+
+    for n_batches in range(1, max_batches + 1):
+        batch_start = time.perf_counter()
+        with span('draw'):
+            batch = np.asarray(draw(), dtype=float)
+        estimates = {'mean': batch.mean(axis=0)}
+        if percentiles:
+            with span('percentile'):
+                for name, values in zip(names[1:], np.percentile(batch, percentiles, axis=0)):
+                    estimates[name] = values
+        if extra is not None:
+            estimates.update(extra(batch))
+        # Welford updates of each statistic's mean and spread across batches
+        for name, values in estimates.items():
+            if name not in means:
+                means[name] = np.array(values, dtype=float)
+                m2[name] = np.zeros_like(means[name])
+                continue
+            delta = values - means[name]
+            means[name] += delta / n_batches
+            m2[name] += delta * (values - means[name])
+        if total is None:
+            total, total_sq = batch.sum(axis=0), np.square(batch).sum(axis=0)
+        else:
+            total += batch.sum(axis=0)
+            total_sq += np.square(batch).sum(axis=0)
+        n_paths += batch.shape[0]
+        batch_time = time.perf_counter() - batch_start
+        elapsed = time.perf_counter() - start
+
+        if n_batches >= 2:
+            scale = np.abs(means['mean'])
+            precision = max(
+                np.max(_half_width_ratio(means[name], np.sqrt(m2[name] / (n_batches - 1) / n_batches),
+                                         scale, z), initial=0.0)
+                for name in targets)
+        if n_batches >= max(min_batches, 2) and precision <= tolerance:
+            stop_reason = 'converged'
+        elif n_batches >= 2 and elapsed + batch_time > time_budget:
+            stop_reason = 'time_budget'
+        if progress is not None:
+            # Standard errors shrink as 1/sqrt(batches), so (tolerance / precision)**2
+            # is roughly the share of the batches needed that have run
+            converging = min((tolerance / precision)**2 if precision > 0 else 1.0,
+                             n_batches / max(min_batches, 2))
+            progress(1.0 if stop_reason else
+                     max(converging, elapsed / time_budget, n_batches / max_batches), summarize)
+        if stop_reason:
+            break
+    else:
+        stop_reason = 'max_batches'
+    return summarize()
@@ -0,0 +1,234 @@
+"""Batch runner for scenario grids across stores, products and ingredients.
+
+A scenario file lists one simulation per row (CSV) or per entry (YAML). The
+runner fans scenarios out over a process pool and writes per-step summary
+rows as soon as each scenario finishes. With ``--paths-dir`` the raw paths of
+every scenario are also streamed to one Parquet, Arrow or CSV file each.
+
+Every scenario gets its own random stream, spawned from the root seed by
+scenario position with ``numpy.random.SeedSequence``. Results therefore do
+not depend on the number of workers or on which worker runs a scenario.
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .cost import simulate_price_bands
+from .demand import simulate_demand_bands
+from .export import PathWriter
+from .staffing import HOURS, simulate_customer_patterns, staff_required
+
+PERCENTILES = (10, 50, 90)
+OUTPUT_COLUMNS = ['scenario', 'store', 'analysis', 'item', 'step', 'mean', 'p10', 'p50', 'p90']
+
+# Parameter types and defaults per analysis; defaults match the app's sliders
+PARAMETERS = {
+    'demand': {
+        'avg_demand': (float, 150.0),
+        'demand_var': (float, 0.30),
+        'sim_days': (int, 30),
+        'n_paths': (int, 10000),
+        'chunk_size': (int, 10000),
+    },
+    'cost': {
+        'current_price': (float, 150.0),
+        'price_volatility': (float, 0.15),
+        'forecast_months': (int, 6),
+        'n_scenarios': (int, 500),
+        'chunk_size': (int, 100000),
+    },
+    'staffing': {
+        'avg_customers': (float, 120.0),
+        'customer_var': (float, 0.25),
+        'service_rate': (float, 8.0),
+        'n_days': (int, 365),
+        'staffing_model': (str, 'erlang'),
+        'service_level': (float, 0.8),
+        'target_wait': (float, 5.0),
+    },
+}
+ITEM_FIELDS = {'demand': 'product', 'cost': 'ingredient', 'staffing': None}
+
+
+def normalize_scenario(raw):
+    """Validate one raw scenario mapping and fill in typed defaults."""
+    analysis = str(raw.get('analysis', '')).strip().lower()
+    if analysis not in PARAMETERS:
+        raise ValueError(f"unknown analysis {analysis!r}; expected one of {sorted(PARAMETERS)}")
+    item_field = ITEM_FIELDS[analysis]
+    scenario = {
+        'analysis': analysis,
+        'store': str(raw.get('store') or ''),
+        'item': str(raw.get(item_field) or raw.get('item') or '') if item_field else '',
+    }
+    for name, (kind, default) in PARAMETERS[analysis].items():
+        value = raw.get(name)
+        scenario[name] = default if value in (None, '') else kind(value)
+    return scenario
+
+
+def _expand_grid(grid):
+    keys = list(grid)
+    values = [v if isinstance(v, list) else [v] for v in grid.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def load_scenarios(path):
+    """Read scenarios from a CSV or YAML file.
+
+    YAML files may hold a plain list of scenarios, or a mapping with optional
+    ``defaults``, ``grid`` (lists expanded as a cartesian product) and
+    ``scenarios`` entries.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    elif ext in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("reading YAML scenario files requires PyYAML (pip install pyyaml)")
+        with open(path) as f:
+            spec = yaml.safe_load(f) or []
+        if isinstance(spec, list):
+            rows = spec
+        else:
+            defaults = spec.get('defaults') or {}
+            rows = _expand_grid(spec['grid']) if spec.get('grid') else []
+            rows += spec.get('scenarios') or []
+            rows = [dict(defaults, **row) for row in rows]
+    else:
+        raise ValueError(f"unsupported scenario file type {ext!r}; use .csv, .yaml or .yml")
+    return [normalize_scenario(row) for row in rows]
+
+
+def paths_filename(index, scenario, fmt):
+    """File name for the raw paths of one scenario."""
+    parts = [f"{index:05d}", scenario['analysis'], scenario['store'], scenario['item']]
+    stem = "_".join(re.sub(r"[^A-Za-z0-9]+", "-", p).strip("-") for p in parts if p)
+    return f"{stem}.{fmt}"
+
+
+def run_scenario(scenario, seed, paths_file=None):
+    """Run one normalised scenario and return its summary as a list of rows.
+
+    ``seed`` may be anything accepted by ``numpy.random.default_rng``. If
+    ``paths_file`` is given, the raw paths (demand and cost) or the per-day
+    staff-needed matrix (staffing) are streamed to it.
+    """
+    rng = np.random.default_rng(seed)
+    analysis = scenario['analysis']
+    writer = None
+    try:
+        if analysis == 'demand':
+            steps = np.arange(1, scenario['sim_days'] + 1)
+            if paths_file:
+                writer = PathWriter(paths_file, [f"day_{d}" for d in steps])
+            result = simulate_demand_bands(scenario['avg_demand'], scenario['demand_var'],
+                                           scenario['sim_days'], n_paths=scenario['n_paths'],
+                                           chunk_size=scenario['chunk_size'],
+                                           percentiles=PERCENTILES,
+                                           sink=writer.write if writer else None, seed=rng)
+            stats = [result['mean']] + [result[f'p{q}'] for q in PERCENTILES]
+        elif analysis == 'cost':
+            steps = np.arange(scenario['forecast_months'] + 1)
+            if paths_file:
+                writer = PathWriter(paths_file, [f"month_{m}" for m in steps])
+            summary = simulate_price_bands(scenario['current_price'], scenario['price_volatility'],
+                                           scenario['forecast_months'],
+                                           n_scenarios=scenario['n_scenarios'],
+                                           chunk_size=scenario['chunk_size'],
+                                           percentiles=PERCENTILES,
+                                           sink=writer.write if writer else None, seed=rng)
+            stats = [summary['mean_path']] + [summary[f'p{q}_path'] for q in PERCENTILES]
+        else:
+            steps = HOURS
+            patterns = simulate_customer_patterns(scenario['avg_customers'],
+                                                  scenario['customer_var'],
+                                                  scenario['n_days'], seed=rng)
+            staff_needed = staff_required(patterns, scenario['service_rate'], scenario['staffing_model'],
+                                          scenario['service_level'], scenario['target_wait'])
+            if paths_file:
+                writer = PathWriter(paths_file, [f"hour_{h}" for h in steps], index_name='day')
+                writer.write(staff_needed)
+            stats = [staff_needed.mean(axis=0)] + list(np.percentile(staff_needed, PERCENTILES,
+                                                                     axis=0))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return [[int(step)] + [float(s[i]) for s in stats] for i, step in enumerate(steps)]
+
+
+def _run_task(task):
+    index, scenario, seed, paths_file = task
+    return index, run_scenario(scenario, seed, paths_file)
+
+
+def run_batch(scenarios, output, workers=1, seed=42, paths_dir=None, paths_format='parquet'):
+    """Run ``scenarios`` and stream summary rows to the CSV file ``output``.
+
+    Rows are written in scenario order as results arrive. If ``paths_dir``
+    is given, each scenario's raw paths go to their own file there in
+    ``paths_format`` ('parquet', 'arrow' or 'csv'). Returns the number of
+    scenarios completed.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(scenarios))
+    if paths_dir:
+        os.makedirs(paths_dir, exist_ok=True)
+    tasks = []
+    for i, s in enumerate(scenarios):
+        paths_file = os.path.join(paths_dir, paths_filename(i, s, paths_format)) if paths_dir else None
+        tasks.append((i, s, seeds[i], paths_file))
+
+    with open(output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_COLUMNS)
+        if workers == 1:
+            results = map(_run_task, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            chunksize = max(1, len(tasks) // (4 * workers))
+            results = executor.map(_run_task, tasks, chunksize=chunksize)
+        try:
+            done = 0
+            for index, rows in results:
+                s = scenarios[index]
+                prefix = [index, s['store'], s['analysis'], s['item']]
+                writer.writerows(prefix + row for row in rows)
+                f.flush()
+                done += 1
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bakery_sim",
+        description="Run a grid of bakery simulations and write per-step summaries to CSV.")
+    parser.add_argument("scenarios", help="scenario grid (.csv, .yaml or .yml)")
+    parser.add_argument("-o", "--output", default="results.csv", help="output CSV path")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=42, help="root seed for all scenarios")
+    parser.add_argument("--paths-dir", help="also write every scenario's raw paths to this directory")
+    parser.add_argument("--paths-format", choices=["parquet", "arrow", "csv"], default="parquet",
+                        help="file format for --paths-dir (default: parquet)")
+    args = parser.parse_args(argv)
+
+    scenarios = load_scenarios(args.scenarios)
+    done = run_batch(scenarios, args.output, workers=max(1, args.workers), seed=args.seed,
+                     paths_dir=args.paths_dir, paths_format=args.paths_format)
+    print(f"Wrote {done} scenarios to {args.output}", file=sys.stderr)
+    return 0
@@ -0,0 +1,162 @@
+"""In-memory memoisation of simulation results with LRU eviction.
+
+An optional ``RunStore`` (see ``store``) backs the memory cache on disk.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .profiling import span
+from .version import ENGINE_VERSION
+
+DEFAULT_MAX_BYTES = 256 * 1024**2
+
+
+def make_key(module, params, seed=None):
+    """Hashable cache key for one simulation run."""
+    return (module, tuple(sorted(params.items())), seed, ENGINE_VERSION)
+
+
+def result_nbytes(value):
+    """Approximate memory held by a result made of arrays, dicts and sequences."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(result_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(result_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _freeze(value):
+    # Cached arrays are shared between sessions, so make accidental writes fail loudly
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, dict):
+        for v in value.values():
+            _freeze(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _freeze(v)
+
+
+class ResultCache:
+    """Thread-safe LRU cache of simulation results bounded by total array size.
+
+    Entries are keyed on the module name, every input parameter, the seed and
+    the engine version. Least recently used entries are evicted once the
+    cached results exceed ``max_bytes``; a single result larger than the whole
+    budget is returned but never kept in memory.
+
+    With a ``store``, memory misses are looked up on disk (counted as hits
+    and in ``disk_hits``), every computed result is also written there, and
+    ``get_or_compute`` records each request in the store's run history.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._module_counts = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _count(self, module, hit):
+        counts = self._module_counts.setdefault(module, {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def get(self, module, params, seed=None):
+        """Return the cached result or ``None``, counting a hit or a miss."""
+        key = make_key(module, params, seed)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._count(module, True)
+                self._entries.move_to_end(key)
+                return entry[0]
+        result = self.store.get(key) if self.store is not None else None
+        with self._lock:
+            self._count(module, result is not None)
+            if result is None:
+                return None
+            self.disk_hits += 1
+        self._insert(key, result)
+        return result
+
+    def put(self, module, params, result, seed=None):
+        key = make_key(module, params, seed)
+        if self.store is not None:
+            self.store.put(key, module, params, result, seed)
+        self._insert(key, result)
+
+    def _insert(self, key, result):
+        size = result_nbytes(result)
+        if size > self.max_bytes:
+            return
+        _freeze(result)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, module, params, compute, seed=None, start_day=None):
+        """Return the cached result for these inputs, running ``compute()`` on a miss.
+
+        With a store the request is logged in its run history, with
+        ``start_day`` as the first forecast day (see ``RunStore.record_run``).
+        """
+        with span('cache', module=module):
+            result = self.get(module, params, seed)
+        computed = result is None
+        if computed:
+            with span('simulate', module=module):
+                result = compute()
+        with span('cache', module=module):
+            if computed:
+                self.put(module, params, result, seed)
+            if self.store is not None:
+                self.store.record_run(make_key(module, params, seed), module, params, start_day)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Hit/miss counters and memory use, overall and per module."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'modules': {m: dict(c) for m, c in self._module_counts.items()},
+            }
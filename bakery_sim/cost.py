@@ -0,0 +1,261 @@
+"""Ingredient price forecasting with geometric Brownian motion.
+
+The band estimators also accept the jump, mean-reversion and seasonal
+models of ``price_models`` through ``model``.
+"""
+
+import numpy as np
+
+from .adaptive import DEFAULT_TIME_BUDGET, DEFAULT_TOLERANCE, run_until_converged
+from .paths import DEFAULT_MEMORY_LIMIT, first_paths, path_buffer, store_paths
+from .profiling import span
+from .rng import as_random_state
+from .sampling import DEFAULT_BATCHES, batch_size_for, batch_summary, normal_draws
+from .stats import StreamingQuantiles
+
+DEFAULT_DRIFT = 0.03
+DEFAULT_DT = 1 / 12
+DEFAULT_FLOOR_RATIO = 0.5
+ADAPTIVE_BATCH_SCENARIOS = 1000
+ADAPTIVE_MAX_SCENARIOS = 1000000
+
+
+def simulate_price_paths(current_price, volatility, n_steps, n_scenarios=500,
+                         drift=DEFAULT_DRIFT, dt=DEFAULT_DT,
+                         floor_ratio=DEFAULT_FLOOR_RATIO, seed=None):
+    """Simulate GBM price paths, returning an array of shape (n_scenarios, n_steps + 1).
+
+    All shocks are drawn as one (n_scenarios, n_steps) block in scenario-major
+    order, so ``seed=42`` reproduces the original per-step loop value for value.
+    The shock is N(0, volatility) and is scaled by ``volatility * sqrt(dt)``
+    again in the exponent, exactly as the Cost Analysis tab has always done.
+    Prices never drop below ``current_price * floor_ratio``.
+    """
+    rs = as_random_state(seed)
+    paths = np.empty((n_scenarios, n_steps + 1))
+    paths[:, 0] = current_price
+    if n_steps == 0:
+        return paths
+    paths[:, 1:] = rs.normal(0, volatility, (n_scenarios, n_steps))
+    return _compound(paths, volatility, drift, dt, current_price * floor_ratio)
+
+
+def _compound(paths, volatility, drift, dt, floor=None):
+    # Turn the N(0, volatility) shocks in paths[..., 1:] into prices in place
+    growth = paths[..., 1:]
+    growth *= volatility * np.sqrt(dt)
+    growth += (drift - 0.5 * volatility**2) * dt
+    np.exp(growth, out=growth)
+
+    # Compound step by step across all scenarios at once; the floor makes the
+    # recursion path-dependent, so only the (short) time axis is iterated
+    for t in range(1, paths.shape[-1]):
+        np.multiply(paths[..., t - 1], paths[..., t], out=paths[..., t])
+        if floor is not None:
+            np.maximum(paths[..., t], floor, out=paths[..., t])
+    return paths
+
+
+def _shock_paths(rs, current_price, volatility, n_steps, n_batches, batch_size, method):
+    # (n_batches, batch_size, n_steps + 1) block ready for ``_compound``
+    paths = np.empty((n_batches, batch_size, n_steps + 1))
+    paths[..., 0] = current_price
+    if n_steps:
+        paths[..., 1:] = normal_draws(rs, n_batches, batch_size, n_steps, method,
+                                      bridge=method == 'sobol')
+        paths[..., 1:] *= volatility
+    return paths
+
+
+def analytic_mean_path(current_price, volatility, n_steps, drift=DEFAULT_DRIFT, dt=DEFAULT_DT):
+    """Expected price at each step without the floor.
+
+    Each step's log-return is normal with mean ``(drift - volatility**2 / 2) * dt``
+    and standard deviation ``volatility**2 * sqrt(dt)`` (see ``simulate_price_paths``).
+    """
+    log_growth = (drift - 0.5 * volatility**2) * dt + 0.5 * volatility**4 * dt
+    return current_price * np.exp(log_growth * np.arange(n_steps + 1))
+
+
+def summarize_price_paths(price_paths, percentiles=(10, 90)):
+    """Return the mean path and the requested percentile paths across scenarios."""
+    summary = {'mean_path': np.mean(price_paths, axis=0)}
+    for q, path in zip(percentiles, np.percentile(price_paths, percentiles, axis=0)):
+        summary[f'p{q:g}_path'] = path
+    return summary
+
+
+def iter_price_paths(current_price, volatility, n_steps, n_scenarios, chunk_size=100000,
+                     drift=DEFAULT_DRIFT, dt=DEFAULT_DT, floor_ratio=DEFAULT_FLOOR_RATIO,
+                     seed=None):
+    """Yield price paths in blocks of at most ``chunk_size`` scenarios.
+
+    Concatenating the blocks gives the same array as ``simulate_price_paths``
+    with the same seed.
+    """
+    if n_scenarios < 1 or chunk_size < 1:
+        raise ValueError("n_scenarios and chunk_size must be positive")
+    rs = as_random_state(seed)
+    done = 0
+    while done < n_scenarios:
+        rows = min(chunk_size, n_scenarios - done)
+        with span('draw'):
+            block = simulate_price_paths(current_price, volatility, n_steps, rows, drift=drift,
+                                         dt=dt, floor_ratio=floor_ratio, seed=rs)
+        yield block
+        done += rows
+
+
+def simulate_price_bands(current_price, volatility, n_steps, n_scenarios=500,
+                         chunk_size=100000, percentiles=(10, 90), drift=DEFAULT_DRIFT,
+                         dt=DEFAULT_DT, floor_ratio=DEFAULT_FLOOR_RATIO, bins=4096,
+                         sink=None, seed=None):
+    """Streaming counterpart of ``summarize_price_paths(simulate_price_paths(...))``.
+
+    Paths are generated ``chunk_size`` scenarios at a time and percentiles
+    come from per-step histograms, so memory does not grow with
+    ``n_scenarios``. ``sink`` is called with every block of paths.
+    """
+    # Histogram range: from the floor up to eight standard deviations of the
+    # total log-return above the start price (the shock is N(0, volatility)
+    # scaled by volatility * sqrt(dt), hence volatility squared)
+    horizon = max(n_steps * dt, dt)
+    log_sd = volatility**2 * np.sqrt(horizon)
+    floor = current_price * floor_ratio
+    hi = current_price * np.exp(abs(drift - 0.5 * volatility**2) * horizon + 8 * log_sd)
+    acc = StreamingQuantiles(n_steps + 1, floor, max(hi, current_price * 1.01), bins=bins)
+
+    for chunk in iter_price_paths(current_price, volatility, n_steps, n_scenarios, chunk_size,
+                                  drift=drift, dt=dt, floor_ratio=floor_ratio, seed=seed):
+        acc.update(chunk)
+        if sink is not None:
+            sink(chunk)
+
+    summary = {'mean_path': acc.mean, 'std_path': acc.std}
+    for q, path in zip(percentiles, acc.quantiles(percentiles)):
+        summary[f'p{q:g}_path'] = path
+    return summary
+
+
+def estimate_price_bands(current_price, volatility, n_steps, n_scenarios=500, method='mc',
+                         control_variate=False, n_batches=DEFAULT_BATCHES,
+                         percentiles=(10, 90), n_samples=0, drift=DEFAULT_DRIFT,
+                         dt=DEFAULT_DT, floor_ratio=DEFAULT_FLOOR_RATIO, model=None,
+                         dtype=np.float64, memory_limit=DEFAULT_MEMORY_LIMIT, spill_dir=None,
+                         progress=None, seed=None):
+    """Price bands with a standard error for every output, using variance reduction.
+
+    ``method`` is ``'mc'`` (plain draws), ``'antithetic'`` or ``'sobol'``
+    (randomised quasi-random points with Brownian-bridge path construction).
+    ``control_variate`` corrects the mean path with the unfloored price,
+    whose expectation is known (``analytic_mean_path``). Scenarios are split
+    into ``n_batches`` independent batches for the standard errors and
+    rounded up to fit the method (see ``batch_size_for``); ``n_scenarios``
+    in the result is the count actually simulated. With ``'mc'`` and an int
+    seed the paths are those of ``simulate_price_paths``. A ``model`` (see
+    ``price_models``) replaces the classic step, and then ``volatility``,
+    ``drift`` and ``floor_ratio`` are ignored; control variates need the
+    classic step.
+
+    Paths are simulated a batch at a time and kept in ``dtype`` (e.g.
+    ``np.float32`` to halve memory); beyond ``memory_limit`` bytes they
+    spill to a memory-mapped file in ``spill_dir`` (see ``path_buffer``),
+    so tens of millions of scenarios fit a few GB of RAM.
+    ``progress(fraction, snapshot)`` is called after every batch;
+    ``snapshot()`` returns the bands of the batches so far (standard errors
+    are NaN until two batches have run).
+
+    Returns ``mean_path``, ``std_path``, ``p{q}_path`` and matching ``*_se``
+    arrays, plus the first ``n_samples`` paths as ``sample_paths`` if
+    requested.
+    """
+    if model is not None and control_variate:
+        raise ValueError("control variates need the classic price step (model=None)")
+    rs = as_random_state(seed)
+    batch_size = batch_size_for(n_scenarios, n_batches, method)
+    shape = (n_batches, batch_size, n_steps + 1)
+    paths = path_buffer(shape, dtype, memory_limit, spill_dir)
+    control = control_mean = None
+    if control_variate:
+        control = path_buffer(shape, dtype, memory_limit, spill_dir)
+        control_mean = analytic_mean_path(current_price, volatility, n_steps, drift, dt)
+
+    def summarize(done):
+        # Bands of the first ``done`` batches
+        stats = batch_summary(paths[:done], percentiles,
+                              control[:done] if control_variate else None, control_mean)
+        summary = {'n_scenarios': done * batch_size, 'method': method}
+        for key, value in stats.items():
+            name, _, se = key.partition('_')
+            summary[f'{name}_path' + (f'_{se}' if se else '')] = value
+        if n_samples:
+            summary['sample_paths'] = first_paths(paths[:done], n_samples)
+        return summary
+
+    for b in range(n_batches):
+        if model is not None:
+            batch = model.batch_paths(rs, current_price, n_steps, 1, batch_size, method, dt)[0]
+        else:
+            batch = _shock_paths(rs, current_price, volatility, n_steps, 1, batch_size, method)[0]
+            if control_variate:
+                store_paths(control, b, _compound(batch.copy(), volatility, drift, dt))
+            _compound(batch, volatility, drift, dt, current_price * floor_ratio)
+        store_paths(paths, b, batch)
+        if progress is not None:
+            progress((b + 1) / n_batches, lambda done=b + 1: summarize(done))
+    return summarize(n_batches)
+
+
+def adaptive_price_bands(current_price, volatility, n_steps, tolerance=DEFAULT_TOLERANCE,
+                         time_budget=DEFAULT_TIME_BUDGET, batch_scenarios=ADAPTIVE_BATCH_SCENARIOS,
+                         max_scenarios=ADAPTIVE_MAX_SCENARIOS, method='mc', percentiles=(10, 90),
+                         n_samples=0, drift=DEFAULT_DRIFT, dt=DEFAULT_DT,
+                         floor_ratio=DEFAULT_FLOOR_RATIO, model=None, progress=None, seed=None):
+    """Price bands from as many scenarios as the precision needs.
+
+    Scenarios are simulated ``batch_scenarios`` at a time (with ``method`` as
+    in ``estimate_price_bands``) until the mean and percentile paths are
+    known to ``tolerance`` at 95% confidence, ``time_budget`` seconds have
+    passed or ``max_scenarios`` have run; see ``run_until_converged`` (which
+    also describes ``progress``). With
+    ``'mc'`` and an int seed the first batch is the first ``batch_scenarios``
+    paths of ``simulate_price_paths``. ``model`` is as in
+    ``estimate_price_bands``.
+
+    Returns the keys of ``estimate_price_bands`` plus ``std_path``,
+    ``converged``, ``stop_reason``, ``n_batches``, ``elapsed`` and
+    ``precision``.
+    """
+    rs = as_random_state(seed)
+    batch_size = batch_size_for(batch_scenarios, 1, method)
+    floor = current_price * floor_ratio
+    samples = []
+
+    def draw():
+        if model is not None:
+            paths = model.batch_paths(rs, current_price, n_steps, 1, batch_size, method, dt)[0]
+        else:
+            paths = _shock_paths(rs, current_price, volatility, n_steps, 1, batch_size, method)[0]
+            _compound(paths, volatility, drift, dt, floor)
+        if n_samples and not samples:
+            samples.append(paths[:n_samples].copy())
+        return paths
+
+    def finish(stats):
+        summary = {'n_scenarios': stats.pop('n_paths'), 'method': method}
+        for key in ['mean', 'mean_se', 'std'] + [f'p{q:g}{se}' for q in percentiles
+                                                  for se in ('', '_se')]:
+            name, _, se = key.partition('_')
+            summary[f'{name}_path' + (f'_{se}' if se else '')] = stats.pop(key)
+        summary.update(stats)
+        if samples:
+            summary['sample_paths'] = samples[0]
+        return summary
+
+    def report(fraction, snapshot):
+        progress(fraction, lambda: finish(snapshot()))
+
+    return finish(run_until_converged(draw, percentiles, tolerance=tolerance,
+                                      time_budget=time_budget,
+                                      max_batches=max(2, max_scenarios // batch_size),
+                                      progress=report if progress is not None else None))
@@ -0,0 +1,282 @@
+"""Daily product demand simulation."""
+
+import numpy as np
+
+from .adaptive import DEFAULT_TIME_BUDGET, DEFAULT_TOLERANCE, run_until_converged
+from .paths import DEFAULT_MEMORY_LIMIT, first_paths, path_buffer, store_paths
+from .profiling import span
+from .rng import as_random_state
+from .sampling import DEFAULT_BATCHES, batch_size_for, batch_summary, normal_draws
+from .stats import StreamingQuantiles
+
+WEEKLY_AMPLITUDE = 0.3
+MONTHLY_AMPLITUDE = 0.1
+NOISE_DISTRIBUTIONS = ('normal', 'lognormal')
+ADAPTIVE_BATCH_PATHS = 1000
+ADAPTIVE_MAX_PATHS = 1000000
+
+
+def _effects(sim_days, profile=None):
+    if profile is not None:
+        profile = np.asarray(profile, dtype=float)
+        if profile.shape != (sim_days,):
+            raise ValueError(f"profile must have one multiplier per day ({sim_days})")
+        return (profile,)
+    days = np.arange(sim_days)
+    day_effects = 1 + WEEKLY_AMPLITUDE * np.sin(days * 2 * np.pi / 7)
+    seasonal_trend = 1 + MONTHLY_AMPLITUDE * np.sin(days * 2 * np.pi / 30)
+    return day_effects, seasonal_trend
+
+
+def demand_profile(sim_days):
+    """Weekly day-of-week effect times the monthly seasonal trend for each day."""
+    day_effects, seasonal_trend = _effects(sim_days)
+    return day_effects * seasonal_trend
+
+
+def _apply_effects(base_demand, effects):
+    # Multiply in the same order as the original app so seeded runs match bit for bit
+    for effect in effects:
+        base_demand *= effect
+    return np.maximum(0, base_demand, out=base_demand)
+
+
+def _base_demand(rs, avg_demand, demand_var, shape, noise):
+    if noise not in NOISE_DISTRIBUTIONS:
+        raise ValueError(f"unknown noise distribution {noise!r}; expected one of {NOISE_DISTRIBUTIONS}")
+    # Same values as rs.normal(avg, avg * var) / rs.lognormal(...) draw for draw
+    return _base_from_normals(rs.standard_normal(shape), avg_demand, demand_var, noise)
+
+
+def _base_from_normals(z, avg_demand, demand_var, noise):
+    # Map standard normals to base demand in place
+    if noise == 'normal':
+        z *= avg_demand * demand_var
+        z += avg_demand
+        return z
+    if noise == 'lognormal':
+        # Same mean and standard deviation as the normal case, but right-skewed
+        sigma = np.sqrt(np.log1p(demand_var**2))
+        z *= sigma
+        z += -0.5 * sigma**2
+        np.exp(z, out=z)
+        z *= avg_demand
+        return z
+    raise ValueError(f"unknown noise distribution {noise!r}; expected one of {NOISE_DISTRIBUTIONS}")
+
+
+def simulate_demand_paths(avg_demand, demand_var, sim_days, n_paths=1, profile=None,
+                          noise='normal', seed=None):
+    """Simulate independent demand paths, returning shape (n_paths, sim_days).
+
+    ``profile`` replaces the built-in weekly and monthly sine effects with one
+    multiplier per day (e.g. from a ``DemandFit``); ``noise`` picks the
+    day-to-day distribution. With the defaults, ``n_paths=1`` and ``seed=42``
+    the single row matches the original Demand Forecasting path exactly.
+    """
+    rs = as_random_state(seed)
+    base_demand = _base_demand(rs, avg_demand, demand_var, (n_paths, sim_days), noise)
+    return _apply_effects(base_demand, _effects(sim_days, profile))
+
+
+def iter_demand_paths(avg_demand, demand_var, sim_days, n_paths, chunk_size=10000,
+                      profile=None, noise='normal', seed=None):
+    """Yield ``n_paths`` demand paths as blocks of at most ``chunk_size`` rows.
+
+    The random stream is consumed in path order, so concatenating the blocks
+    gives the same array as ``simulate_demand_paths`` with the same seed.
+    """
+    if n_paths < 1 or chunk_size < 1:
+        raise ValueError("n_paths and chunk_size must be positive")
+    rs = as_random_state(seed)
+    effects = _effects(sim_days, profile)
+    done = 0
+    while done < n_paths:
+        rows = min(chunk_size, n_paths - done)
+        with span('draw'):
+            block = _apply_effects(_base_demand(rs, avg_demand, demand_var, (rows, sim_days), noise),
+                                   effects)
+        yield block
+        done += rows
+
+
+def simulate_demand_bands(avg_demand, demand_var, sim_days, n_paths=10000,
+                          chunk_size=10000, percentiles=(10, 50, 90),
+                          waste_level=None, n_samples=1, profile=None, noise='normal',
+                          bins=4096, sink=None, progress=None, seed=None):
+    """Run ``n_paths`` demand paths in chunks and return per-day statistics.
+
+    Only ``chunk_size`` paths are materialised at a time; per-day percentiles
+    are estimated from streaming histograms (see ``StreamingQuantiles``).
+    Results do not depend on the chunk size. The first ``n_samples`` paths
+    are kept as ``sample_paths`` (and the first as ``sample_path``) for
+    plotting. If ``waste_level`` is given, the per-day
+    probability of demand below it is returned as ``waste_prob``. ``sink``
+    is called with every block of paths, e.g. to export them as they are
+    produced. ``progress(fraction, snapshot)`` is called after every block;
+    ``snapshot()`` returns the statistics of the paths so far. ``profile``
+    and ``noise`` are as for ``simulate_demand_paths``.
+    """
+    # Upper edge eight sigmas out (further for the skewed lognormal):
+    # overflow into the last bin is negligible
+    sigma = avg_demand * demand_var * (8 if noise == 'normal' else 16)
+    peak = np.max(profile) if profile is not None else demand_profile(sim_days).max()
+    hi = max((avg_demand + sigma) * peak, 1.0)
+    acc = StreamingQuantiles(sim_days, 0.0, hi, bins=bins)
+
+    n_samples = max(n_samples, 1)
+    samples = []
+    kept = 0
+
+    def summarize():
+        sample_paths = np.concatenate(samples)
+        result = {
+            'days': np.arange(1, sim_days + 1),
+            'n_paths': acc.n,
+            'mean': acc.mean,
+            'std': acc.std,
+            'sample_path': sample_paths[0],
+            'sample_paths': sample_paths,
+        }
+        for q, band in zip(percentiles, acc.quantiles(percentiles)):
+            result[f'p{q:g}'] = band
+        if waste_level is not None:
+            result['waste_prob'] = acc.fraction_below(waste_level)
+        return result
+
+    for chunk in iter_demand_paths(avg_demand, demand_var, sim_days, n_paths, chunk_size,
+                                   profile=profile, noise=noise, seed=seed):
+        if kept < n_samples:
+            samples.append(chunk[:n_samples - kept].copy())
+            kept += samples[-1].shape[0]
+        acc.update(chunk)
+        if sink is not None:
+            sink(chunk)
+        if progress is not None:
+            progress(acc.n / n_paths, summarize)
+    return summarize()
+
+
+def estimate_demand_bands(avg_demand, demand_var, sim_days, n_paths=10000, method='mc',
+                          control_variate=False, n_batches=DEFAULT_BATCHES,
+                          percentiles=(10, 50, 90), waste_level=None, n_samples=1,
+                          profile=None, noise='normal', dtype=np.float64,
+                          memory_limit=DEFAULT_MEMORY_LIMIT, spill_dir=None, progress=None,
+                          seed=None):
+    """Per-day demand statistics with standard errors, using variance reduction.
+
+    ``method`` is ``'mc'``, ``'antithetic'`` or ``'sobol'`` (one quasi-random
+    dimension per day). ``control_variate`` corrects the mean with the demand
+    before truncation at zero, whose expectation is ``avg_demand`` times the
+    day's effects. Paths are split into ``n_batches`` batches for the
+    standard errors and rounded up to fit the method; ``n_paths`` in the
+    result is the count actually simulated. Unlike ``simulate_demand_bands``
+    every path is kept, in ``dtype``: ``np.float32`` halves the memory and
+    an integer type (e.g. ``np.int32``) rounds demand to whole units. Paths
+    beyond ``memory_limit`` bytes spill to a memory-mapped file in
+    ``spill_dir`` (see ``path_buffer``). With ``'mc'`` and an int seed the
+    paths are those of ``simulate_demand_paths``. ``progress(fraction,
+    snapshot)`` is called after every batch; ``snapshot()`` returns the
+    statistics of the batches so far (standard errors are NaN until two
+    batches have run).
+
+    Returns the keys of ``simulate_demand_bands`` plus ``mean_se``,
+    ``p{q}_se`` and (with ``waste_level``) ``waste_prob_se``.
+    """
+    rs = as_random_state(seed)
+    batch_size = batch_size_for(n_paths, n_batches, method)
+    shape = (n_batches, batch_size, sim_days)
+    demand = path_buffer(shape, dtype, memory_limit, spill_dir)
+    effects = _effects(sim_days, profile)
+    control = control_mean = None
+    if control_variate:
+        # Untruncated demand can be negative, so whole-unit runs keep it as float32
+        control = path_buffer(shape, np.float32 if demand.dtype.kind in 'iu' else dtype,
+                              memory_limit, spill_dir)
+        control_mean = avg_demand * np.prod(effects, axis=0)
+    below = np.empty((n_batches, sim_days))
+
+    def summarize(done):
+        # Statistics of the first ``done`` batches
+        stats = batch_summary(demand[:done], percentiles,
+                              control[:done] if control_variate else None, control_mean)
+        sample_paths = first_paths(demand[:done], max(n_samples, 1))
+        result = {
+            'days': np.arange(1, sim_days + 1),
+            'n_paths': done * batch_size,
+            'method': method,
+            'sample_path': sample_paths[0],
+            'sample_paths': sample_paths,
+        }
+        result.update(stats)
+        if waste_level is not None:
+            result['waste_prob'] = below[:done].mean(axis=0)
+            result['waste_prob_se'] = (below[:done].std(axis=0, ddof=1) / np.sqrt(done)
+                                       if done > 1 else np.full(sim_days, np.nan))
+        return result
+
+    for b in range(n_batches):
+        batch = _base_from_normals(normal_draws(rs, 1, batch_size, sim_days, method)[0],
+                                   avg_demand, demand_var, noise)
+        for effect in effects:
+            batch *= effect
+        if control_variate:
+            store_paths(control, b, batch)
+        np.maximum(batch, 0, out=batch)
+        store_paths(demand, b, batch)
+        if waste_level is not None:
+            below[b] = (demand[b] < waste_level).mean(axis=0)
+        if progress is not None:
+            progress((b + 1) / n_batches, lambda done=b + 1: summarize(done))
+    return summarize(n_batches)
+
+
+def adaptive_demand_bands(avg_demand, demand_var, sim_days, tolerance=DEFAULT_TOLERANCE,
+                          time_budget=DEFAULT_TIME_BUDGET, batch_paths=ADAPTIVE_BATCH_PATHS,
+                          max_paths=ADAPTIVE_MAX_PATHS, method='mc', percentiles=(10, 50, 90),
+                          waste_level=None, n_samples=1, profile=None, noise='normal',
+                          progress=None, seed=None):
+    """Per-day demand statistics from as many paths as the precision needs.
+
+    Paths are simulated ``batch_paths`` at a time (with ``method`` as in
+    ``estimate_demand_bands``) until every day's mean and percentiles are
+    known to ``tolerance`` at 95% confidence, ``time_budget`` seconds have
+    passed or ``max_paths`` paths have run; see ``run_until_converged``
+    (which also describes ``progress``). With ``'mc'`` and an int seed the first batch is the first
+    ``batch_paths`` paths of ``simulate_demand_paths``.
+
+    Returns the keys of ``estimate_demand_bands`` plus ``converged``,
+    ``stop_reason``, ``n_batches``, ``elapsed`` and ``precision``.
+    """
+    rs = as_random_state(seed)
+    batch_size = batch_size_for(batch_paths, 1, method)
+    effects = _effects(sim_days, profile)
+    n_samples = max(n_samples, 1)
+    samples = []
+
+    def draw():
+        z = normal_draws(rs, 1, batch_size, sim_days, method)[0]
+        paths = _apply_effects(_base_from_normals(z, avg_demand, demand_var, noise), effects)
+        if not samples:
+            samples.append(paths[:n_samples].copy())
+        return paths
+
+    def waste(batch):
+        return {'waste_prob': (batch < waste_level).mean(axis=0)}
+
+    def finish(result):
+        result.update({
+            'days': np.arange(1, sim_days + 1),
+            'method': method,
+            'sample_path': samples[0][0],
+            'sample_paths': samples[0],
+        })
+        return result
+
+    def report(fraction, snapshot):
+        progress(fraction, lambda: finish(snapshot()))
+
+    return finish(run_until_converged(draw, percentiles, waste if waste_level is not None else None,
+                                      tolerance=tolerance, time_budget=time_budget,
+                                      max_batches=max(2, max_paths // batch_size),
+                                      progress=report if progress is not None else None))
@@ -0,0 +1,96 @@
+"""Reduce chart series to a bounded number of points before plotting.
+
+Lines are thinned with Largest-Triangle-Three-Buckets (LTTB), which keeps
+the visual shape including peaks; bands are reduced to per-bucket min/max
+envelopes so they never get narrower than the data. Everything returns
+plain arrays, so the result can go into any plotting library.
+"""
+
+import numpy as np
+
+
+def _bucket_edges(n, n_buckets, start=0):
+    return np.linspace(start, n, n_buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the ``n_out`` points LTTB keeps (first and last always kept)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 1)])
+
+    # Interior points are split into n_out - 2 buckets; pick from each the
+    # point forming the largest triangle with the previous pick and the
+    # average of the next bucket
+    edges = _bucket_edges(n - 1, n_out - 2, start=1)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 1 < n_out - 2:
+            nlo, nhi = edges[b + 1], edges[b + 2]
+            avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[prev] - avg_x) * (y[lo:hi] - y[prev]) -
+                      (x[prev] - x[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+
+def lttb(x, y, n_out):
+    """Downsample a line to at most ``n_out`` points, returning ``(x, y)``."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    idx = lttb_indices(x, y, n_out)
+    return x[idx], y[idx]
+
+
+def envelope(x, lower, upper, n_out):
+    """Min of ``lower`` and max of ``upper`` over at most ``n_out`` buckets.
+
+    Returns ``(x, lower, upper)`` where ``x`` is each bucket's first x value.
+    """
+    x = np.asarray(x)
+    lower = np.asarray(lower)
+    upper = np.asarray(upper)
+    if x.size <= n_out:
+        return x, lower, upper
+    starts = _bucket_edges(x.size, n_out)[:-1]
+    return x[starts], np.minimum.reduceat(lower, starts), np.maximum.reduceat(upper, starts)
+
+
+def band_polygon(x, lower, upper, max_points=1000):
+    """Closed outline of a band for ``fill='toself'`` traces, bounded in size.
+
+    The band is reduced with ``envelope`` to ``max_points // 2`` buckets and
+    returned as ``(x, y)`` running forward along ``upper`` and back along
+    ``lower``.
+    """
+    bx, blo, bhi = envelope(x, lower, upper, max(max_points // 2, 1))
+    return np.concatenate([bx, bx[::-1]]), np.concatenate([bhi, blo[::-1]])
+
+
+def path_overlay(x, paths, points_per_path=200):
+    """Flatten many paths into one NaN-separated series for a single trace.
+
+    Each row of ``paths`` is thinned with LTTB to ``points_per_path`` points.
+    One trace with gaps is far cheaper to send and render than one trace per
+    path.
+    """
+    x = np.asarray(x, dtype=float)
+    xs, ys = [], []
+    for path in np.atleast_2d(paths):
+        px, py = lttb(x, path, points_per_path)
+        xs.extend([px, [np.nan]])
+        ys.extend([py, [np.nan]])
+    if not xs:
+        return np.array([]), np.array([])
+    return np.concatenate(xs[:-1]), np.concatenate(ys[:-1])
@@ -0,0 +1,105 @@
+"""Streaming export of simulation outputs to Parquet, Arrow IPC or CSV.
+
+Paths are written block by block as the kernels produce them, one Parquet
+row group or Arrow record batch per block, so a large run never has to be
+held in memory for export. Parquet and Arrow need the optional ``pyarrow``
+package; CSV works with the standard library alone.
+"""
+
+import csv
+import os
+
+import numpy as np
+
+FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.csv': 'csv'}
+
+
+def format_for_path(path):
+    """Infer the export format from a file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"unsupported export file type {ext!r}; use one of {sorted(FORMATS)}")
+    return FORMATS[ext]
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow export require pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+class PathWriter:
+    """Write a stream of (rows, columns) blocks to one columnar file.
+
+    Each row is one simulated path (or day, for staffing) and gets an
+    ``index_name`` column numbering rows across all blocks, followed by one
+    column per entry of ``columns``. Use as a context manager, or call
+    ``close`` when done::
+
+        with PathWriter("demand.parquet", [f"day_{d}" for d in days]) as writer:
+            simulate_demand_bands(..., sink=writer.write)
+    """
+
+    def __init__(self, path, columns, index_name='path', fmt=None, dtype=np.float64):
+        self.path = path
+        self.columns = [str(c) for c in columns]
+        self.index_name = index_name
+        self.fmt = fmt or format_for_path(path)
+        self.dtype = np.dtype(dtype)
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+
+        if self.fmt == 'csv':
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([index_name] + self.columns)
+        elif self.fmt in ('parquet', 'arrow'):
+            pa = _require_pyarrow()
+            self._schema = pa.schema([(index_name, pa.int64())] +
+                                     [(c, pa.from_numpy_dtype(self.dtype)) for c in self.columns])
+            if self.fmt == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(path, self._schema, compression='zstd')
+            else:
+                import pyarrow.ipc as ipc
+                self._file = pa.OSFile(path, 'wb')
+                self._writer = ipc.new_file(self._file, self._schema)
+        else:
+            raise ValueError(f"unknown export format {self.fmt!r}")
+
+    def write(self, block):
+        """Append a (rows, len(columns)) block of values."""
+        block = np.asarray(block, dtype=self.dtype)
+        if block.ndim != 2 or block.shape[1] != len(self.columns):
+            raise ValueError(f"expected a block with {len(self.columns)} columns, got {block.shape}")
+        index = np.arange(self.rows_written, self.rows_written + block.shape[0])
+
+        if self.fmt == 'csv':
+            for i, row in zip(index, block.tolist()):
+                self._writer.writerow([i] + row)
+        else:
+            import pyarrow as pa
+            arrays = [pa.array(index)] + [pa.array(block[:, j]) for j in range(block.shape[1])]
+            batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+            if self.fmt == 'parquet':
+                self._writer.write_batch(batch)
+            else:
+                self._writer.write(batch)
+        self.rows_written += block.shape[0]
+
+    def close(self):
+        if self._writer is not None and self.fmt != 'csv':
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        self._writer = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
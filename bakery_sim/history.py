@@ -0,0 +1,338 @@
+"""Historical POS sales storage and per-product demand pattern fitting.
+
+Transactions are aggregated to daily units per product and appended to a
+directory of raw little-endian column files, which are read back through
+``numpy.memmap`` so years of history are never parsed or loaded in full
+again. Alongside the columns the store keeps, per product, the count and
+the first three power sums of daily units for every weekday x month cell.
+Those are updated as new days arrive and are all that ``fit`` needs: the
+multiplicative model's prediction is constant within a cell, so the fitted
+multipliers and residual moments are exact without rescanning the history.
+
+``meta.json`` is the commit point of an ingest. Column files are cut back
+to the row counts it records before new rows are appended, and the cell
+sums go to a new file that it names, so an ingest that dies part way
+leaves the previous state intact and can simply be rerun.
+
+A day counts as trading if any product sold on it; products that sold
+nothing on a trading day after their first sale are recorded as zero.
+
+    python -m bakery_sim.history STORE_DIR sales_2024.csv sales_2025.parquet
+"""
+
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+COLUMNS = {'day': '<i4', 'product': '<i4', 'units': '<f8'}
+N_MOMENTS = 4  # count, sum, sum of squares, sum of cubes
+SKEW_THRESHOLD = 0.5
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday (Monday = 0)
+RAKING_MAX_PASSES = 100
+RAKING_TOL = 1e-10
+
+
+def weekday_of(days):
+    """Weekday (Monday = 0) of integer days since 1970-01-01."""
+    return (np.asarray(days) + EPOCH_WEEKDAY) % 7
+
+
+def month_of(days):
+    """Month index (January = 0) of integer days since 1970-01-01."""
+    return np.asarray(days).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12
+
+
+class DemandFit:
+    """Fitted demand model for one product.
+
+    ``level`` is daily units before the ``weekday`` (7) and ``month`` (12)
+    multiplicative effects, which average one over the fitted days. ``cv``
+    is the coefficient of variation of the residual noise and ``noise`` its
+    distribution ('normal' or 'lognormal', chosen from the residual
+    skewness).
+    """
+
+    def __init__(self, product, level, weekday, month, cv, skew, noise, n_days, last_day):
+        self.product = product
+        self.level = level
+        self.weekday = weekday
+        self.month = month
+        self.cv = cv
+        self.skew = skew
+        self.noise = noise
+        self.n_days = n_days
+        self.last_day = last_day
+
+    def profile(self, n_days, start_day=None):
+        """Multiplier for each of ``n_days`` days from ``start_day`` (default: the day after the history ends)."""
+        start = self.last_day + 1 if start_day is None else start_day
+        days = start + np.arange(n_days)
+        return self.weekday[weekday_of(days)] * self.month[month_of(days)]
+
+    def key(self):
+        """Hashable summary for result caching."""
+        return (self.product, self.n_days, self.last_day, round(self.level, 6), round(self.cv, 6),
+                self.noise, tuple(np.round(self.weekday, 6)), tuple(np.round(self.month, 6)))
+
+
+def _ratio(num, den):
+    # num / den, with 1 where nothing was observed
+    out = np.ones_like(num)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def _read_transactions(source, columns, chunksize):
+    """Yield (dates, products, quantities) blocks from a CSV or Parquet file."""
+    ext = os.path.splitext(source)[1].lower()
+    if ext == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("reading Parquet sales files requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize, columns=columns):
+            yield tuple(batch.column(i).to_numpy(zero_copy_only=False) for i in range(3))
+    elif ext == '.csv':
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("reading CSV sales files requires pandas (pip install pandas)")
+        for chunk in pd.read_csv(source, usecols=columns, chunksize=chunksize):
+            yield tuple(chunk[c].to_numpy() for c in columns)
+    else:
+        raise ValueError(f"unsupported sales file type {ext!r}; use .csv or .parquet")
+
+
+class SalesHistory:
+    """Append-only, memory-mapped store of daily sales per product."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            self.moments = np.load(os.path.join(path, self.meta.get('moments', 'moments.npy')))
+        else:
+            self.meta = {'version': 1, 'products': [], 'product_first_day': [], 'rows': 0,
+                         'trading_days': 0, 'first_day': None, 'last_day': None}
+            self.moments = np.zeros((0, 7, 12, N_MOMENTS))
+
+    @property
+    def products(self):
+        return list(self.meta['products'])
+
+    @property
+    def last_day(self):
+        return self.meta['last_day']
+
+    def _column(self, name, rows=None):
+        rows = self.meta['rows'] if rows is None else rows
+        if rows == 0:
+            return np.zeros(0, dtype=COLUMNS[name])
+        return np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=COLUMNS[name], mode='r',
+                         shape=(rows,))
+
+    def trading_days(self):
+        """Integer days (since 1970-01-01) on which anything sold."""
+        n = self.meta['trading_days']
+        if n == 0:
+            return np.zeros(0, dtype='<i4')
+        return np.memmap(os.path.join(self.path, 'days.bin'), dtype='<i4', mode='r', shape=(n,))
+
+    def daily(self, product):
+        """``(dates, units)`` for one product over every trading day since its first sale."""
+        pid = self.meta['products'].index(product)
+        mask = np.asarray(self._column('product') == pid)
+        days = self.trading_days()
+        days = np.asarray(days[days >= self.meta['product_first_day'][pid]])
+        units = np.zeros(days.size)
+        units[np.searchsorted(days, self._column('day')[mask])] = self._column('units')[mask]
+        return days.astype('datetime64[D]'), units
+
+    def ingest(self, source, date_col='date', product_col='product', quantity_col='quantity',
+               chunksize=1_000_000):
+        """Aggregate a transaction file to daily units and append days after ``last_day``.
+
+        Transactions on or before the last stored day are skipped, so feeding
+        the same export twice or an overlapping export is safe. Returns a
+        dict with the number of transactions read, skipped, and new trading
+        days added.
+        """
+        with self._lock:
+            return self._ingest(source, date_col, product_col, quantity_col, chunksize)
+
+    def _ingest(self, source, date_col, product_col, quantity_col, chunksize):
+        products = {name: i for i, name in enumerate(self.meta['products'])}
+        first_day = list(self.meta['product_first_day'])
+        last_day = self.meta['last_day']
+        start = None
+        grid = np.zeros((0, len(products)))
+        read = skipped = 0
+
+        for dates, names, qty in _read_transactions(source, [date_col, product_col, quantity_col],
+                                                    chunksize):
+            read += len(dates)
+            days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+            keep = days > last_day if last_day is not None else np.ones(len(days), dtype=bool)
+            skipped += int((~keep).sum())
+            if not keep.any():
+                continue
+            days, names, qty = days[keep], np.asarray(names)[keep].astype(str), qty[keep]
+
+            uniq, inverse = np.unique(names, return_inverse=True)
+            for name in uniq:
+                if name not in products:
+                    products[name] = len(products)
+                    first_day.append(None)
+            pids = np.array([products[n] for n in uniq])[inverse]
+
+            # Grow the dense (day x product) accumulation grid to cover this chunk
+            lo, hi = int(days.min()), int(days.max())
+            if start is None:
+                start = lo
+            new_start = min(start, lo)
+            new_len = max(start + grid.shape[0], hi + 1) - new_start
+            if new_start != start or new_len != grid.shape[0] or len(products) != grid.shape[1]:
+                bigger = np.zeros((new_len, len(products)))
+                bigger[start - new_start:start - new_start + grid.shape[0], :grid.shape[1]] = grid
+                grid, start = bigger, new_start
+            np.add.at(grid, (days - start, pids), np.asarray(qty, dtype=float))
+
+            for pid in np.unique(pids):
+                d = int(days[pids == pid].min())
+                if first_day[pid] is None or d < first_day[pid]:
+                    first_day[pid] = d
+
+        if start is None:
+            return {'transactions': read, 'skipped': skipped, 'days_added': 0}
+
+        # Days with no sales at all are closures, not zero-demand days
+        grid_days = start + np.arange(grid.shape[0])
+        present = (grid != 0).any(axis=1)
+        grid, grid_days = grid[present], grid_days[present]
+        started = grid_days[:, None] >= np.array(first_day)[None, :]
+
+        d_idx, p_idx = np.nonzero(started & (grid != 0))
+        rows, n_days = self.meta['rows'], self.meta['trading_days']
+        self._append('day', grid_days[d_idx], rows)
+        self._append('product', p_idx, rows)
+        self._append('units', grid[d_idx, p_idx], rows)
+        self._append('days', grid_days, n_days, dtype='<i4')
+
+        moments = np.zeros((len(products), 7, 12, N_MOMENTS))
+        moments[:self.moments.shape[0]] = self.moments
+        obs_d, obs_p = np.nonzero(started)
+        values = grid[obs_d, obs_p]
+        cell = (obs_p, weekday_of(grid_days[obs_d]), month_of(grid_days[obs_d]))
+        for k in range(N_MOMENTS):
+            np.add.at(moments, cell + (k,), values**k)
+
+        meta = dict(self.meta)
+        meta.update({
+            'products': sorted(products, key=products.get),
+            'product_first_day': first_day,
+            'rows': rows + len(d_idx),
+            'trading_days': n_days + len(grid_days),
+            'first_day': meta['first_day'] if meta['first_day'] is not None
+            else int(grid_days[0]),
+            'last_day': int(grid_days[-1]),
+            # A new file per ingest, so the old sums stay valid until meta.json names these
+            'moments': f'moments-{n_days + len(grid_days)}.npy',
+        })
+        old_moments = self.meta.get('moments', 'moments.npy')
+        self._replace(meta['moments'], lambda f: np.save(f, moments))
+        self._replace('meta.json', lambda f: f.write(json.dumps(meta).encode()))
+        self.meta, self.moments = meta, moments
+        try:
+            os.remove(os.path.join(self.path, old_moments))
+        except OSError:
+            pass
+        return {'transactions': read, 'skipped': skipped, 'days_added': len(grid_days)}
+
+    def _append(self, name, values, count, dtype=None):
+        # Drop any rows past ``count`` left by an ingest that did not finish
+        values = np.asarray(values, dtype=dtype or COLUMNS[name])
+        with open(os.path.join(self.path, f'{name}.bin'), 'ab') as f:
+            f.truncate(count * values.itemsize)
+            f.write(values.tobytes())
+
+    def _replace(self, name, write):
+        # Write a store file under a temporary name, then swap it in atomically
+        path = os.path.join(self.path, name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def fit(self, product):
+        """Fit weekday and month multipliers and the noise distribution for ``product``."""
+        pid = self.meta['products'].index(product)
+        count, s1, s2, s3 = np.moveaxis(self.moments[pid], -1, 0)
+        n = count.sum()
+        if n == 0:
+            raise ValueError(f"no sales history for {product!r}")
+        level = s1.sum() / n
+
+        # Multiplicative weekday x month model fitted to the cell sums by raking:
+        # each pass refits one set of multipliers given the other, so a month
+        # with more weekends than usual does not absorb the weekend effect
+        weekday, month = np.ones(7), np.ones(12)
+        if level > 0:
+            for _ in range(RAKING_MAX_PASSES):
+                previous = weekday * month[:, None]
+                weekday = _ratio(s1.sum(axis=1), (count * month[None, :]).sum(axis=1) * level)
+                month = _ratio(s1.sum(axis=0), (count * weekday[:, None]).sum(axis=0) * level)
+                # Scale each set to a day-weighted mean of one, moving the scale into level
+                for mult, days in ((weekday, count.sum(axis=1)), (month, count.sum(axis=0))):
+                    scale = (mult * days).sum() / days.sum()
+                    mult[days > 0] /= scale
+                    level *= scale
+                if np.max(np.abs(weekday * month[:, None] - previous)) < RAKING_TOL:
+                    break
+
+        # Residual ratio y / prediction: the prediction is constant per cell,
+        # so its moments follow from the cell power sums
+        pred = level * weekday[:, None] * month[None, :]
+        seen = (count > 0) & (pred > 0)
+        r1 = (s1[seen] / pred[seen]).sum() / n
+        r2 = (s2[seen] / pred[seen]**2).sum() / n
+        r3 = (s3[seen] / pred[seen]**3).sum() / n
+        var = max(r2 - r1**2, 0.0)
+        sd = np.sqrt(var)
+        skew = (r3 - 3 * r1 * var - r1**3) / sd**3 if sd > 0 else 0.0
+        return DemandFit(product, level * r1, weekday, month, sd / r1 if r1 > 0 else 0.0,
+                         float(skew), 'lognormal' if skew > SKEW_THRESHOLD else 'normal',
+                         int(n), self.meta['last_day'])
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m bakery_sim.history",
+                                     description="Append POS transaction files to a sales history store.")
+    parser.add_argument("store", help="history store directory (created if missing)")
+    parser.add_argument("files", nargs="+", help="transaction files (.csv or .parquet)")
+    parser.add_argument("--date-col", default="date")
+    parser.add_argument("--product-col", default="product")
+    parser.add_argument("--quantity-col", default="quantity")
+    args = parser.parse_args(argv)
+
+    history = SalesHistory(args.store)
+    for path in args.files:
+        result = history.ingest(path, args.date_col, args.product_col, args.quantity_col)
+        print(f"{path}: {result['transactions']} transactions, {result['skipped']} skipped, "
+              f"{result['days_added']} new days", file=sys.stderr)
+    for product in history.products:
+        fit = history.fit(product)
+        print(f"{product}: level {fit.level:.1f}/day, cv {fit.cv:.2f}, {fit.noise} noise "
+              f"({fit.n_days} days)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
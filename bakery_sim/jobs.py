@@ -0,0 +1,174 @@
+"""Background simulation jobs with progress, cancellation and partial results.
+
+``JobManager`` runs simulations on a thread pool so a caller (e.g. a
+Streamlit script) can return immediately and poll. The kernels spend their
+time in numpy, which releases the GIL, so threads run them in parallel.
+A job function receives a ``progress(fraction, snapshot=None)`` callback
+with the signature the chunked kernels accept: ``snapshot`` returns the
+result so far and is called at most once per ``partial_interval`` seconds.
+Cancellation is cooperative: once a job is cancelled its next
+``progress`` call raises ``JobCancelled``.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .profiling import trace
+
+DEFAULT_WORKERS = 2
+DEFAULT_PARTIAL_INTERVAL = 1.0
+DEFAULT_KEEP = 100
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's progress callback once the job has been cancelled."""
+
+
+class Job:
+    """One submitted simulation: its status, progress and latest results.
+
+    ``partial`` holds the most recent snapshot reported by the job function
+    and ``result`` its return value; ``error`` is the exception of a failed
+    job. ``trace`` collects the timing spans recorded while it runs (see
+    ``profiling``). All attributes are safe to read from other threads.
+    """
+
+    def __init__(self, job_id, label='', partial_interval=DEFAULT_PARTIAL_INTERVAL):
+        self.id = job_id
+        self.label = label
+        self.partial_interval = partial_interval
+        self.status = QUEUED
+        self.progress = 0.0
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.trace = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._last_partial = None
+
+    def __repr__(self):
+        return f"Job({self.id!r}, {self.label!r}, {self.status}, {self.progress:.0%})"
+
+    @property
+    def done(self):
+        return self.status in FINISHED_STATES
+
+    @property
+    def elapsed(self):
+        """Seconds spent running so far (or in total once finished)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, fraction, snapshot=None):
+        """Progress callback for the job function (called from the worker thread)."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.progress = min(max(float(fraction), self.progress), 1.0)
+        now = time.monotonic()
+        if snapshot is not None and (self._last_partial is None
+                                     or now - self._last_partial >= self.partial_interval):
+            self.partial = snapshot()
+            self._last_partial = now
+
+    def cancel(self):
+        """Ask the job to stop; a job that has not started yet never runs."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes or ``timeout`` seconds pass; True if finished."""
+        return self._done.wait(timeout)
+
+    def _run(self, fn):
+        if self._cancel.is_set():
+            self._finish(CANCELLED)
+            return
+        self.started = time.time()
+        self.status = RUNNING
+        with trace('job', label=self.label) as self.trace:
+            try:
+                self.result = fn(self.report)
+            except JobCancelled:
+                status = CANCELLED
+            except Exception as exc:
+                self.error = exc
+                status = FAILED
+            else:
+                self.progress = 1.0
+                status = DONE
+        self._finish(status)
+
+    def _finish(self, status):
+        self.finished = time.time()
+        self.status = status
+        self._done.set()
+
+
+class JobManager:
+    """Thread pool of simulation jobs addressed by job ID.
+
+    ``submit(fn)`` queues ``fn(progress)`` and returns its ``Job``. The
+    ``keep`` most recently finished jobs stay available through ``get`` so a
+    client can collect results after the fact; older ones are forgotten.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, partial_interval=DEFAULT_PARTIAL_INTERVAL,
+                 keep=DEFAULT_KEEP):
+        self.partial_interval = partial_interval
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='bakery-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, label=''):
+        """Queue ``fn(progress)`` and return its ``Job``."""
+        job = Job(uuid.uuid4().hex[:12], label, self.partial_interval)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(job._run, fn)
+        return job
+
+    def get(self, job_id):
+        """The job with this ID, or ``None`` if it is unknown or was pruned."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job by ID; returns False if the ID is unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def jobs(self):
+        """All known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=True):
+        """Cancel every unfinished job and stop the worker threads."""
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=wait)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.keep, 0)]:
+            del self._jobs[job_id]
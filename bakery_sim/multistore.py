@@ -0,0 +1,216 @@
+"""Correlated demand across a network of stores and products.
+
+Each store-product-day draws a standard normal shock made of three
+independent layers: a city-wide shock shared by every store, a regional
+shock shared by stores in the same region, and store-level noise. Every
+layer is correlated across products through the Cholesky factor of a
+product correlation matrix, so the full covariance over stores and products
+is ``(city + region + store blocks) kron corr`` without ever forming it.
+Demand is then ``avg * profile * (1 + cv * shock)`` truncated at zero, so
+each store has the same marginal distribution as ``simulate_demand_paths``.
+"""
+
+import numpy as np
+
+from .demand import demand_profile
+from .profiling import span
+from .rng import as_generator
+from .stats import StreamingQuantiles
+
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+NETWORK = 'Network'
+
+
+def correlation_factor(corr):
+    """Lower Cholesky factor of a product correlation matrix."""
+    corr = np.asarray(corr, dtype=float)
+    if corr.ndim != 2 or corr.shape[0] != corr.shape[1]:
+        raise ValueError("correlation matrix must be square")
+    if not np.allclose(corr, corr.T) or not np.allclose(np.diag(corr), 1):
+        raise ValueError("correlation matrix must be symmetric with a unit diagonal")
+    try:
+        return np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        raise ValueError("correlation matrix must be positive definite") from None
+
+
+def equicorrelation(n_products, rho):
+    """Correlation matrix with ``rho`` between every pair of products."""
+    corr = np.full((n_products, n_products), float(rho))
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def paths_per_chunk(n_stores, n_products, sim_days, n_regions=1,
+                    memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Number of network paths that fit in ``memory_budget`` bytes of working arrays."""
+    # Per path: the shock block (stores, regions and the city), its
+    # product-correlated copy and the region totals, all float64
+    per_path = (2 * n_stores + 2 * n_regions + 2) * n_products * sim_days * 8
+    return max(1, int(memory_budget // per_path))
+
+
+def _network_profile(profile, n_products, sim_days):
+    # Returns a (sim_days, n_products) multiplier to broadcast against the shocks
+    if profile is None:
+        profile = demand_profile(sim_days)
+    profile = np.asarray(profile, dtype=float)
+    if profile.shape == (sim_days,):
+        return np.repeat(profile[:, None], n_products, axis=1)
+    if profile.shape == (n_products, sim_days):
+        return profile.T.copy()
+    raise ValueError(f"profile must have shape ({sim_days},) or ({n_products}, {sim_days})")
+
+
+def _total_sd(loading, starts, weights):
+    # Standard deviation (per product) of the region and network totals of
+    # ``loading * shock`` before the day profile and the truncation at zero
+    city, region, store = weights
+    by_region = np.add.reduceat(loading, starts, axis=0)
+    by_region_sq = np.add.reduceat(np.square(loading), starts, axis=0)
+    region_var = (city + region) * np.square(by_region) + store * by_region_sq
+    network_var = (city * np.square(loading.sum(axis=0))
+                   + region * np.square(by_region).sum(axis=0)
+                   + store * np.square(loading).sum(axis=0))
+    return np.sqrt(np.vstack([region_var, network_var]))
+
+
+def simulate_network_demand(avg_demand, demand_var, sim_days, regions=None, n_paths=10000,
+                            product_corr=None, city_share=0.3, region_share=0.2,
+                            profile=None, percentiles=(10, 50, 90), bins=256,
+                            memory_budget=DEFAULT_MEMORY_BUDGET, sink=None, progress=None,
+                            seed=None):
+    """Simulate correlated demand for every store and product and total it by region.
+
+    ``avg_demand`` has shape (n_stores, n_products); ``demand_var`` is the
+    coefficient of variation, a scalar or an array broadcastable to it.
+    ``regions`` labels each store (default: one region). ``product_corr`` is
+    the product correlation matrix (default: independent products).
+    ``city_share`` and ``region_share`` are the fractions of each store's
+    shock variance that are shared city-wide and region-wide; the rest is
+    store-level noise. ``profile`` is one multiplier per day, or one row per
+    product, defaulting to the built-in weekly and monthly effects.
+
+    Paths are simulated in chunks sized so the working arrays stay within
+    ``memory_budget`` bytes; the streaming histograms add
+    ``(n_regions + 1) * n_products * sim_days * bins`` counters on top.
+    ``sink`` is called with each (rows, n_regions + 1, n_products, sim_days)
+    block of region and network totals, and ``progress(fraction, snapshot)``
+    after every chunk with a ``snapshot()`` of the results so far.
+
+    Returns ``regions`` (the sorted labels followed by ``'Network'``) and per
+    region, product and day ``mean``, ``std`` and ``p{q}`` arrays of shape
+    (n_regions + 1, n_products, sim_days), plus ``store_mean`` of shape
+    (n_stores, n_products, sim_days).
+    """
+    avg = np.asarray(avg_demand, dtype=float)
+    if avg.ndim == 1:
+        avg = avg[:, None]
+    if avg.ndim != 2:
+        raise ValueError("avg_demand must have shape (n_stores, n_products)")
+    n_stores, n_products = avg.shape
+    cv = np.broadcast_to(np.asarray(demand_var, dtype=float), avg.shape)
+    if n_paths < 1:
+        raise ValueError("n_paths must be positive")
+    store_share = 1.0 - city_share - region_share
+    if min(city_share, region_share, store_share) < 0:
+        raise ValueError("city_share and region_share must be non-negative and sum to at most 1")
+    weights = (city_share, region_share, store_share)
+    scale = np.sqrt(weights)
+
+    if regions is None:
+        regions = np.zeros(n_stores, dtype=int)
+        labels = ['All stores']
+    else:
+        labels, regions = np.unique(np.asarray(regions), return_inverse=True)
+        if regions.shape != (n_stores,):
+            raise ValueError(f"regions must label each of the {n_stores} stores")
+        labels = [str(label) for label in labels]
+    n_regions = len(labels)
+    # Stores are simulated grouped by region so totals are contiguous slices
+    order = np.argsort(regions, kind='stable')
+    starts = np.searchsorted(regions[order], np.arange(n_regions))
+    bounds = np.append(starts, n_stores)
+    avg = avg[order]
+    loading = avg * cv[order]
+
+    factor = None
+    if product_corr is not None:
+        factor = correlation_factor(product_corr)
+        if factor.shape != (n_products, n_products):
+            raise ValueError(f"product_corr must be {n_products} x {n_products}")
+    day_profile = _network_profile(profile, n_products, sim_days)
+
+    # Histogram ranges: eight sigmas either side of each total's mean
+    center = np.vstack([np.add.reduceat(avg, starts, axis=0), avg.sum(axis=0)])
+    spread = 8 * _total_sd(loading, starts, weights)
+    peak = day_profile.T[None]
+    lo = np.maximum((center - spread)[:, :, None] * peak, 0)
+    hi = np.maximum((center + spread)[:, :, None] * peak, lo + 1)
+    acc = StreamingQuantiles(lo.size, lo.ravel(), hi.ravel(), bins=bins)
+    store_sum = np.zeros((n_stores, sim_days, n_products))
+
+    # Per store-day-product demand is cell_mean + cell_scale * shock
+    cell_mean = avg[:, None, :] * day_profile
+    cell_scale = loading[:, None, :] * day_profile
+
+    rng = as_generator(seed)
+    chunk_paths = paths_per_chunk(n_stores, n_products, sim_days, n_regions, memory_budget)
+    # Chunk buffers are allocated once and reused; the last chunk uses a prefix.
+    # Each path's store, region and city shocks are one contiguous draw, so
+    # results do not depend on the memory budget.
+    rows = min(chunk_paths, n_paths)
+    shock_buf = np.empty((rows, n_stores + n_regions + 1, sim_days, n_products))
+    if factor is not None:
+        demand_buf = np.empty((rows, n_stores, sim_days, n_products))
+    else:
+        demand_buf = shock_buf[:, :n_stores]
+    shape = (n_regions + 1, n_products, sim_days)
+
+    def summarize():
+        store_mean = np.empty_like(store_sum)
+        store_mean[order] = store_sum / done
+        result = {
+            'days': np.arange(1, sim_days + 1),
+            'n_paths': done,
+            'chunk_paths': chunk_paths,
+            'regions': labels + [NETWORK],
+            'mean': acc.mean.reshape(shape),
+            'std': acc.std.reshape(shape),
+            'store_mean': store_mean.transpose(0, 2, 1),
+        }
+        for q, band in zip(percentiles, acc.quantiles(percentiles)):
+            result[f'p{q:g}'] = band.reshape(shape)
+        return result
+
+    done = 0
+    while done < n_paths:
+        rows = min(chunk_paths, n_paths - done)
+        with span('draw'):
+            draw = rng.standard_normal(out=shock_buf[:rows])
+        shocks = draw[:, :n_stores]
+        region_shocks = draw[:, n_stores:n_stores + n_regions]
+        shocks *= scale[2]
+        region_shocks *= scale[1]
+        region_shocks += scale[0] * draw[:, n_stores + n_regions:]
+        for r in range(n_regions):
+            shocks[:, bounds[r]:bounds[r + 1]] += region_shocks[:, r:r + 1]
+
+        demand = demand_buf[:rows]
+        if factor is not None:
+            np.matmul(shocks, factor.T, out=demand)
+        demand *= cell_scale
+        demand += cell_mean
+        np.maximum(demand, 0, out=demand)
+        store_sum += demand.sum(axis=0)
+
+        totals = np.add.reduceat(demand, starts, axis=1)
+        totals = np.concatenate([totals, totals.sum(axis=1, keepdims=True)], axis=1)
+        totals = totals.transpose(0, 1, 3, 2)
+        acc.update(totals.reshape(rows, -1))
+        if sink is not None:
+            sink(totals)
+        done += rows
+        if progress is not None:
+            progress(done / n_paths, summarize)
+    return summarize()
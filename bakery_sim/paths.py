@@ -0,0 +1,82 @@
+"""Compact and out-of-core storage for simulated paths.
+
+The variance-reduced estimators need every path at once (pooled and
+per-batch percentiles), so their memory grows with the scenario count.
+``path_buffer`` allocates that block in a smaller ``dtype`` if asked:
+``float32`` halves it, and an integer type stores demand in whole units.
+A buffer larger than ``memory_limit`` bytes is a memory-mapped temporary
+file instead of RAM (removed once the buffer is garbage collected), so the
+operating system pages it in and out as needed.
+
+Buffers are column-major: each column (a day or forecast step) is one
+contiguous run of values, so ``batch_summary`` can compute its statistics
+column block by column block, reading each column once and never holding
+more than a working budget of float64 copies.
+"""
+
+import tempfile
+
+import numpy as np
+
+# Paths above this size are spilled to a memory-mapped file
+DEFAULT_MEMORY_LIMIT = 1024**3
+# float64 working memory for statistics over a block of columns
+DEFAULT_WORKING_BYTES = 256 * 1024**2
+
+
+def path_buffer(shape, dtype=np.float64, memory_limit=DEFAULT_MEMORY_LIMIT, spill_dir=None):
+    """Uninitialised (n_batches, batch_size, n_columns) buffer stored column by column.
+
+    ``dtype`` is a float type, or an integer type for values that are whole
+    units (see ``store_paths``). With ``memory_limit=None`` the buffer is
+    always in RAM; otherwise one larger than ``memory_limit`` bytes lives in
+    a temporary file in ``spill_dir`` (default: the system temp directory).
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind not in 'fiu':
+        raise ValueError(f"paths must be stored as a float or integer type, not {dtype}")
+    *rows, n_columns = shape
+    storage = (n_columns, *rows)
+    if memory_limit is not None and dtype.itemsize * np.prod(shape, dtype=np.int64) > memory_limit:
+        values = np.memmap(tempfile.TemporaryFile(dir=spill_dir), dtype=dtype, mode='w+',
+                           shape=storage)
+    else:
+        values = np.empty(storage, dtype=dtype)
+    return np.moveaxis(values, 0, -1)
+
+
+def is_spilled(values):
+    """Whether a ``path_buffer`` lives in a memory-mapped file."""
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def store_paths(buffer, index, paths):
+    """Write float64 ``paths`` into ``buffer[index]``, rounding them for integer buffers.
+
+    Raises ``ValueError`` if a rounded value does not fit the integer type.
+    """
+    if buffer.dtype.kind in 'iu':
+        paths = np.rint(paths)
+        info = np.iinfo(buffer.dtype)
+        if paths.size and (paths.min() < info.min or paths.max() > info.max):
+            raise ValueError(f"values from {paths.min():g} to {paths.max():g} do not fit {buffer.dtype}")
+    buffer[index] = paths
+
+
+def first_paths(buffer, n):
+    """The first ``n`` paths of a (n_batches, batch_size, n_columns) buffer as float64 rows."""
+    n_batches, batch_size, n_columns = buffer.shape
+    needed = min(-(-n // batch_size), n_batches)
+    rows = np.concatenate([buffer[b] for b in range(needed)]) if needed else buffer[0, :0]
+    return np.array(rows[:n], dtype=float)
+
+
+def column_blocks(n_columns, n_rows, copies=1, working_bytes=DEFAULT_WORKING_BYTES):
+    """Slices of columns whose ``copies`` float64 copies of ``n_rows`` values fit ``working_bytes``."""
+    step = max(1, int(working_bytes // max(8 * n_rows * copies, 1)))
+    for start in range(0, n_columns, step):
+        yield slice(start, min(start + step, n_columns))
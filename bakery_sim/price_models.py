@@ -0,0 +1,384 @@
+"""Ingredient price models and their calibration from price history.
+
+Every model describes the log price with optional monthly seasonality (a
+multiplicative factor per calendar month, stored as 12 log factors summing
+to zero):
+
+- ``GBMModel``: geometric Brownian motion with annual ``drift`` and
+  ``sigma`` (a standard parameterisation, unlike the classic Cost Analysis
+  step in ``cost.simulate_price_paths``).
+- ``MertonModel``: GBM plus Poisson jumps (``jump_rate`` per year, normal
+  log jump sizes) for supply shocks such as butter or chocolate. ``drift``
+  is the expected growth including jumps.
+- ``OUModel``: Ornstein-Uhlenbeck mean reversion of the log price towards
+  ``mean_price`` at speed ``kappa`` per year, for staples such as flour and
+  sugar.
+
+``fit_price_model`` calibrates any of them by maximum likelihood in closed
+form (GBM, OU) or by EM (jumps), so years of daily prices fit in
+milliseconds.
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from .history import month_of
+from .rng import as_random_state
+from .sampling import normal_draws
+
+DEFAULT_DT = 1 / 12
+DAYS_PER_YEAR = 365.25
+PRICE_MODELS = ('gbm', 'merton', 'ou')
+EM_MAX_ITER = 500
+EM_TOL = 1e-9
+
+
+class PriceModel(ABC):
+    """Base class: seasonality, path generation and caching keys.
+
+    ``month`` is the calendar month (January = 0) of the current price;
+    forecasts step forward ``dt`` years at a time from there. Subclasses
+    implement ``params``, ``_log_paths`` and ``_mean_growth``.
+    """
+
+    name = None
+
+    def __init__(self, seasonality=None, month=0):
+        self.seasonality = np.zeros(12) if seasonality is None else np.asarray(seasonality, dtype=float)
+        self.month = int(month)
+        self.fit_info = None
+
+    def __repr__(self):
+        params = ', '.join(f'{k}={v:.4g}' for k, v in self.params().items())
+        return f"{type(self).__name__}({params})"
+
+    @abstractmethod
+    def params(self):
+        """Model parameters as a dict (seasonality excluded)."""
+
+    def key(self):
+        """Hashable summary for result caching."""
+        return (self.name, self.month, *(round(float(v), 9) for v in self.params().values()),
+                *np.round(self.seasonality, 9))
+
+    def seasonal_factors(self, n_steps, dt=DEFAULT_DT):
+        """Log seasonal factor at each of the ``n_steps + 1`` forecast points."""
+        months = (self.month + np.floor(np.arange(n_steps + 1) * dt * 12 + 1e-9).astype(int)) % 12
+        return self.seasonality[months]
+
+    @abstractmethod
+    def _log_paths(self, rs, x0, z, dt):
+        # Deseasonalised log prices (..., n_steps + 1) from standard normals z (..., n_steps)
+        pass
+
+    @abstractmethod
+    def _mean_growth(self, x0, t):
+        # E[price at t] / price at 0 for deseasonalised log price x0, for an array of times t
+        pass
+
+    def batch_paths(self, rs, current_price, n_steps, n_batches, batch_size, method='mc',
+                    dt=DEFAULT_DT):
+        """Price paths of shape (n_batches, batch_size, n_steps + 1) from an ``rs`` stream.
+
+        Diffusion shocks come from ``normal_draws`` with ``method`` (Sobol
+        paths use a Brownian bridge); jumps, if any, are plain draws.
+        """
+        season = self.seasonal_factors(n_steps, dt)
+        x0 = np.log(current_price) - season[0]
+        if n_steps == 0:
+            return np.full((n_batches, batch_size, 1), float(current_price))
+        z = normal_draws(rs, n_batches, batch_size, n_steps, method, bridge=method == 'sobol')
+        paths = self._log_paths(rs, x0, z, dt)
+        paths += season
+        return np.exp(paths, out=paths)
+
+    def simulate(self, current_price, n_steps, n_scenarios=500, dt=DEFAULT_DT, seed=None):
+        """Simulate price paths, returning an array of shape (n_scenarios, n_steps + 1)."""
+        rs = as_random_state(seed)
+        return self.batch_paths(rs, current_price, n_steps, 1, n_scenarios, dt=dt)[0]
+
+    def mean_path(self, current_price, n_steps, dt=DEFAULT_DT):
+        """Expected price at each forecast point."""
+        season = self.seasonal_factors(n_steps, dt)
+        return current_price * np.exp(season - season[0]) * self._mean_growth(
+            np.log(current_price) - season[0], np.arange(n_steps + 1) * dt)
+
+
+class GBMModel(PriceModel):
+    """Geometric Brownian motion: log returns N((drift - sigma**2 / 2) dt, sigma**2 dt)."""
+
+    name = 'gbm'
+
+    def __init__(self, drift=0.03, sigma=0.15, seasonality=None, month=0):
+        super().__init__(seasonality, month)
+        self.drift = float(drift)
+        self.sigma = float(sigma)
+
+    def params(self):
+        return {'drift': self.drift, 'sigma': self.sigma}
+
+    def _log_paths(self, rs, x0, z, dt):
+        paths = np.empty(z.shape[:-1] + (z.shape[-1] + 1,))
+        paths[..., 0] = x0
+        np.multiply(z, self.sigma * np.sqrt(dt), out=paths[..., 1:])
+        paths[..., 1:] += (self.drift - 0.5 * self.sigma**2) * dt
+        np.cumsum(paths, axis=-1, out=paths)
+        return paths
+
+    def _mean_growth(self, x0, t):
+        return np.exp(self.drift * t)
+
+
+class MertonModel(GBMModel):
+    """GBM with compound Poisson jumps in the log price.
+
+    Jumps arrive at ``jump_rate`` per year with log sizes
+    N(``jump_mean``, ``jump_sd``); the diffusion drift is compensated so the
+    expected price still grows at ``drift``.
+    """
+
+    name = 'merton'
+
+    def __init__(self, drift=0.03, sigma=0.15, jump_rate=1.0, jump_mean=0.1, jump_sd=0.1,
+                 seasonality=None, month=0):
+        super().__init__(drift, sigma, seasonality, month)
+        self.jump_rate = float(jump_rate)
+        self.jump_mean = float(jump_mean)
+        self.jump_sd = float(jump_sd)
+
+    def params(self):
+        return dict(super().params(), jump_rate=self.jump_rate, jump_mean=self.jump_mean,
+                    jump_sd=self.jump_sd)
+
+    def _log_paths(self, rs, x0, z, dt):
+        # Mean relative jump size, compensated out of the drift
+        kappa = np.expm1(self.jump_mean + 0.5 * self.jump_sd**2)
+        paths = np.empty(z.shape[:-1] + (z.shape[-1] + 1,))
+        paths[..., 0] = x0
+        steps = paths[..., 1:]
+        np.multiply(z, self.sigma * np.sqrt(dt), out=steps)
+        steps += (self.drift - 0.5 * self.sigma**2 - self.jump_rate * kappa) * dt
+        # The sum of n normal jumps is N(n * mean, n * sd**2)
+        n_jumps = rs.poisson(self.jump_rate * dt, z.shape)
+        steps += n_jumps * self.jump_mean
+        steps += np.sqrt(n_jumps) * self.jump_sd * rs.standard_normal(z.shape)
+        np.cumsum(paths, axis=-1, out=paths)
+        return paths
+
+
+class OUModel(PriceModel):
+    """Ornstein-Uhlenbeck mean reversion of the log price.
+
+    ``log P`` reverts to ``log(mean_price)`` at rate ``kappa`` per year
+    (half-life ``ln 2 / kappa`` years) with annual volatility ``sigma``.
+    Steps use the exact transition, so any ``dt`` is unbiased; ``kappa = 0``
+    is a driftless random walk in the log price.
+    """
+
+    name = 'ou'
+
+    def __init__(self, kappa=1.0, mean_price=100.0, sigma=0.15, seasonality=None, month=0):
+        super().__init__(seasonality, month)
+        self.kappa = float(kappa)
+        self.mean_price = float(mean_price)
+        self.sigma = float(sigma)
+
+    def params(self):
+        return {'kappa': self.kappa, 'mean_price': self.mean_price, 'sigma': self.sigma}
+
+    def _transition(self, t):
+        # Decay factor and conditional variance of the log price after t years
+        decay = np.exp(-self.kappa * t)
+        if self.kappa > 0:
+            return decay, self.sigma**2 * -np.expm1(-2 * self.kappa * t) / (2 * self.kappa)
+        return decay, self.sigma**2 * t
+
+    def _log_paths(self, rs, x0, z, dt):
+        theta = np.log(self.mean_price)
+        decay, var = self._transition(dt)
+        paths = np.empty(z.shape[:-1] + (z.shape[-1] + 1,))
+        paths[..., 0] = x0 - theta
+        np.multiply(z, np.sqrt(var), out=paths[..., 1:])
+        # Deviation from the long-run level decays geometrically step by step
+        for t in range(1, paths.shape[-1]):
+            paths[..., t] += decay * paths[..., t - 1]
+        paths += theta
+        return paths
+
+    def _mean_growth(self, x0, t):
+        theta = np.log(self.mean_price)
+        decay, var = self._transition(t)
+        return np.exp(theta + (x0 - theta) * decay + 0.5 * var - x0)
+
+
+def _normal_loglik(resid, var):
+    return -0.5 * resid.size * (np.log(2 * np.pi * var) + 1) if var > 0 else np.inf
+
+
+def _month_design(months):
+    design = np.zeros((months.size, 12))
+    design[np.arange(months.size), months] = 1
+    return design
+
+
+def _random_walk_seasonality(y, months):
+    # OLS (the Gaussian MLE) of log returns on a constant plus the change in
+    # seasonal factor; the minimum-norm solution has factors summing to zero
+    design = _month_design(months)
+    a = np.column_stack([np.ones(y.size - 1), design[1:] - design[:-1]])
+    coef = np.linalg.lstsq(a, np.diff(y), rcond=None)[0]
+    return coef[1:] - coef[1:].mean()
+
+
+def _fit_gbm(returns, dt):
+    mean = returns.mean()
+    var = returns.var()
+    sigma2 = var / dt
+    params = {'drift': mean / dt + 0.5 * sigma2, 'sigma': np.sqrt(sigma2)}
+    return params, _normal_loglik(returns - mean, var)
+
+
+def _fit_merton(returns, dt):
+    # At most one jump per step (the Bernoulli approximation, accurate when
+    # jump_rate * dt is small): returns are a two-normal mixture of the
+    # diffusion alone and diffusion plus one jump, fitted by EM with
+    # closed-form steps; the smaller-variance component is the diffusion
+    r = returns
+    n = r.size
+    center = np.median(r)
+    mad = 1.4826 * np.median(np.abs(r - center))
+    mu1, var1 = center, max(mad**2, r.var() * 1e-3, 1e-300)
+    mu2, var2, p = center, max(r.var() * 4, var1 * 4), 0.05
+    loglik = -np.inf
+    for _ in range(EM_MAX_ITER):
+        log1 = np.log1p(-p) - 0.5 * (np.log(2 * np.pi * var1) + (r - mu1)**2 / var1)
+        log2 = np.log(p) - 0.5 * (np.log(2 * np.pi * var2) + (r - mu2)**2 / var2)
+        top = np.maximum(log1, log2)
+        total = top + np.log(np.exp(log1 - top) + np.exp(log2 - top))
+        w = np.exp(log2 - total)
+        new_loglik = total.sum()
+        w_sum = w.sum()
+        if w_sum < 1e-9 or n - w_sum < 1e-9:
+            break
+        p = w_sum / n
+        mu1 = ((1 - w) * r).sum() / (n - w_sum)
+        mu2 = (w * r).sum() / w_sum
+        var1 = max(((1 - w) * (r - mu1)**2).sum() / (n - w_sum), 1e-300)
+        var2 = max((w * (r - mu2)**2).sum() / w_sum, 1e-300)
+        if new_loglik - loglik < EM_TOL * n:
+            loglik = new_loglik
+            break
+        loglik = new_loglik
+    if var2 < var1:
+        mu1, var1, mu2, var2, p = mu2, var2, mu1, var1, 1 - p
+
+    if not np.isfinite(loglik) or p * n < 1:
+        # No jumps worth modelling: the GBM fit with a zero jump rate
+        params, loglik = _fit_gbm(r, dt)
+        return dict(params, jump_rate=0.0, jump_mean=0.0, jump_sd=0.0), loglik
+    sigma2 = var1 / dt
+    jump_mean, jump_sd = mu2 - mu1, np.sqrt(max(var2 - var1, 0.0))
+    jump_rate = p / dt
+    kappa = np.expm1(jump_mean + 0.5 * jump_sd**2)
+    params = {'drift': mu1 / dt + 0.5 * sigma2 + jump_rate * kappa, 'sigma': np.sqrt(sigma2),
+              'jump_rate': jump_rate, 'jump_mean': jump_mean, 'jump_sd': jump_sd}
+    return params, loglik
+
+
+def _ar1(x):
+    # OLS of x[t] on x[t - 1]: slope, intercept and residuals
+    prev, curr = x[:-1], x[1:]
+    prev_mean, curr_mean = prev.mean(), curr.mean()
+    dev = prev - prev_mean
+    denom = (dev**2).sum()
+    slope = (dev * (curr - curr_mean)).sum() / denom if denom > 0 else 1.0
+    intercept = curr_mean - slope * prev_mean
+    return slope, intercept, curr - intercept - slope * prev
+
+
+def _fit_ou(y, months, dt):
+    # The exact AR(1) transition makes OLS the conditional MLE. With
+    # seasonality the factors and the AR(1) slope are fitted alternately,
+    # each step being the exact MLE given the other
+    season = np.zeros(12)
+    if months is not None:
+        design = _month_design(months)
+        for _ in range(50):
+            slope = _ar1(y - season[months])[0]
+            a = np.column_stack([np.ones(y.size - 1), design[1:] - slope * design[:-1]])
+            coef = np.linalg.lstsq(a, y[1:] - slope * y[:-1], rcond=None)[0]
+            update = coef[1:] - coef[1:].mean()
+            done = np.max(np.abs(update - season)) < 1e-10
+            season = update
+            if done:
+                break
+    x = y - season[months] if months is not None else y
+    slope, intercept, resid = _ar1(x)
+
+    var = resid.var()
+    if slope >= 1:
+        # No measurable reversion: a random walk around the current level
+        params = {'kappa': 0.0, 'mean_price': float(np.exp(x[-1])), 'sigma': np.sqrt(var / dt)}
+    else:
+        slope = max(slope, 1e-9)
+        kappa = -np.log(slope) / dt
+        params = {'kappa': kappa, 'mean_price': float(np.exp(intercept / (1 - slope))),
+                  'sigma': np.sqrt(var * 2 * kappa / -np.expm1(-2 * kappa * dt))}
+    return params, season, _normal_loglik(resid, var)
+
+
+def fit_price_model(prices, dates=None, model='gbm', seasonal=False, dt=None):
+    """Maximum-likelihood calibration of a price model from a price history.
+
+    ``prices`` are positive prices in time order and ``dates`` their dates
+    (anything ``numpy.datetime64`` accepts). Observations are treated as
+    equally spaced; ``dt`` defaults to the average gap between dates in
+    years (or one day without dates). ``seasonal`` also fits a factor per
+    calendar month, which needs ``dates``.
+
+    Returns a ``PriceModel`` whose ``month`` is that of the last price and
+    whose ``fit_info`` holds ``log_likelihood``, ``aic``, ``n_obs`` and ``dt``.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if model not in PRICE_MODELS:
+        raise ValueError(f"unknown price model {model!r}; expected one of {PRICE_MODELS}")
+    if prices.ndim != 1 or prices.size < 3:
+        raise ValueError("need at least three prices to calibrate")
+    if not np.all(prices > 0):
+        raise ValueError("prices must be positive")
+    months = None
+    if dates is not None:
+        days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+        if days.shape != prices.shape:
+            raise ValueError("dates and prices must have the same length")
+        if np.any(np.diff(days) <= 0):
+            raise ValueError("dates must be strictly increasing")
+        if dt is None:
+            dt = (days[-1] - days[0]) / (days.size - 1) / DAYS_PER_YEAR
+        months = month_of(days)
+    elif seasonal:
+        raise ValueError("seasonal calibration needs dates")
+    if dt is None:
+        dt = 1 / DAYS_PER_YEAR
+
+    y = np.log(prices)
+    if model == 'ou':
+        params, season, loglik = _fit_ou(y, months if seasonal else None, dt)
+        fitted = OUModel(**params, seasonality=season)
+    else:
+        season = _random_walk_seasonality(y, months) if seasonal else np.zeros(12)
+        returns = np.diff(y - season[months]) if seasonal else np.diff(y)
+        if model == 'gbm':
+            params, loglik = _fit_gbm(returns, dt)
+            fitted = GBMModel(**params, seasonality=season)
+        else:
+            params, loglik = _fit_merton(returns, dt)
+            fitted = MertonModel(**params, seasonality=season)
+
+    if months is not None:
+        fitted.month = int(months[-1])
+    n_params = len(params) + (11 if seasonal else 0)
+    fitted.fit_info = {'log_likelihood': float(loglik), 'aic': float(2 * n_params - 2 * loglik),
+                       'n_obs': int(prices.size), 'dt': float(dt)}
+    return fitted
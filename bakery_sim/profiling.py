@@ -0,0 +1,292 @@
+"""Timing spans for the simulation and dashboard hot paths.
+
+``span(stage, **labels)`` times a block of work: random draws, percentile
+and histogram aggregation inside the kernels, or chart construction and
+rendering in the app. Every span adds to process-wide per-stage totals,
+exported in the Prometheus text format by ``Profiler.prometheus_text`` (or
+written to a file, or served over HTTP). Spans inside a
+``trace(name, **labels)`` block are also kept on that ``Trace`` with the
+change in resident memory, so one page view or one job can be broken down
+stage by stage. Traces follow the context, not the thread: spans from
+other threads only join a trace that was started in (or copied into)
+their context.
+
+Finished spans and traces are logged as JSON on the ``bakery_sim.profiling``
+logger (spans at DEBUG, traces at INFO) and, with a ``log_path``, appended
+to that file one JSON object per line.
+
+Labels become Prometheus labels, so keep their values to a small set
+(module, tab, method), never parameters or IDs. A stage's time includes any
+spans nested inside it.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('bakery_trace', default=None)
+_open = contextvars.ContextVar('bakery_open_stages', default=())
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def rss_bytes():
+    """Current resident memory of this process, or ``None`` where unavailable."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process so far, or ``None`` where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Trace:
+    """The spans recorded during one ``trace`` block (e.g. one page view or job).
+
+    ``spans`` holds one dict per finished span, in the order they finished,
+    with ``stage``, ``labels``, ``seconds``, ``depth`` (0 for spans not
+    nested in another) and ``rss_delta`` (bytes, or ``None``). Once the
+    block exits, ``seconds``, ``rss`` and ``peak_rss`` describe the whole
+    trace.
+    """
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = dict(labels or {})
+        self.spans = []
+        self.started = time.time()
+        self.seconds = None
+        self.rss = None
+        self.peak_rss = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Trace({self.name!r}, {len(self.spans)} spans)"
+
+    def _add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def stages(self):
+        """``{stage: {'seconds', 'count', 'rss_delta'}}`` summed over this trace's spans."""
+        with self._lock:
+            spans = list(self.spans)
+        totals = {}
+        for record in spans:
+            stage = totals.setdefault(record['stage'], {'seconds': 0.0, 'count': 0, 'rss_delta': 0})
+            stage['seconds'] += record['seconds']
+            stage['count'] += 1
+            if record['rss_delta'] is not None and stage['rss_delta'] is not None:
+                stage['rss_delta'] += record['rss_delta']
+            else:
+                stage['rss_delta'] = None
+        return totals
+
+    def as_dict(self):
+        return {'trace': self.name, 'labels': self.labels, 'started': self.started,
+                'seconds': self.seconds, 'rss': self.rss, 'peak_rss': self.peak_rss,
+                'stages': self.stages()}
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Profiler:
+    """Per-stage timing totals plus the traces and log output described above.
+
+    ``last_trace`` is the most recently finished trace of any name.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.last_trace = None
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Time the enclosed block as ``stage``.
+
+        A span inside another span of the same stage is not recorded, so
+        helpers that time themselves are not counted twice.
+        """
+        stages = _open.get()
+        if stage in stages:
+            yield
+            return
+        trace = _current.get()
+        depth = len(stages)
+        token = _open.set(stages + (stage,))
+        rss = rss_bytes() if trace is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            _open.reset(token)
+            after = rss_bytes() if rss is not None else None
+            self._record(trace, stage, labels, seconds, depth,
+                         after - rss if after is not None else None)
+
+    def record(self, stage, seconds, **labels):
+        """Add a span timed elsewhere, e.g. work that does not fit one ``with`` block."""
+        self._record(_current.get(), stage, labels, seconds, len(_open.get()), None)
+
+    def _record(self, trace, stage, labels, seconds, depth, rss_delta):
+        key = (stage, tuple(sorted((name, str(value)) for name, value in labels.items())))
+        with self._lock:
+            totals = self._stages.setdefault(key, [0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+            totals[3] = seconds
+        if trace is not None:
+            record = {'stage': stage, 'labels': labels, 'seconds': seconds, 'depth': depth,
+                      'rss_delta': rss_delta}
+            trace._add(record)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({'event': 'span', 'trace': trace.name, **record},
+                                        default=str))
+
+    @contextmanager
+    def trace(self, name, **labels):
+        """Collect the spans of the enclosed block on a new ``Trace``, which is yielded."""
+        trace = Trace(name, labels)
+        token = _current.set(trace)
+        open_token = _open.set(())
+        start = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            _open.reset(open_token)
+            _current.reset(token)
+            trace.seconds = time.perf_counter() - start
+            trace.rss = rss_bytes()
+            trace.peak_rss = peak_rss_bytes()
+            if trace.rss is not None and trace.peak_rss is not None:
+                # The two counters are sampled differently; the peak is never below current
+                trace.peak_rss = max(trace.peak_rss, trace.rss)
+            self.last_trace = trace
+            self._log(trace)
+
+    def _log(self, trace):
+        line = json.dumps({'event': 'trace', **trace.as_dict()}, default=str)
+        logger.info(line)
+        if self.log_path is not None:
+            with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+    def stages(self):
+        """``{(stage, labels): {'count', 'seconds', 'max_seconds', 'last_seconds'}}`` since start."""
+        with self._lock:
+            return {key: dict(zip(('count', 'seconds', 'max_seconds', 'last_seconds'), totals))
+                    for key, totals in self._stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def prometheus_text(self):
+        """Stage totals and process memory in the Prometheus text exposition format."""
+        stages = sorted(self.stages().items())
+        lines = []
+        for metric, kind, field, doc in (
+                ('bakery_stage_seconds', 'summary', None, "Time spent in each instrumented stage."),
+                ('bakery_stage_max_seconds', 'gauge', 'max_seconds', "Longest single span per stage."),
+                ('bakery_stage_last_seconds', 'gauge', 'last_seconds', "Most recent span per stage.")):
+            lines += [f"# HELP {metric} {doc}", f"# TYPE {metric} {kind}"]
+            for (stage, labels), totals in stages:
+                text = _label_text((('stage', stage),) + labels)
+                if field is None:
+                    lines.append(f"{metric}_sum{text} {totals['seconds']:.9g}")
+                    lines.append(f"{metric}_count{text} {totals['count']}")
+                else:
+                    lines.append(f"{metric}{text} {totals[field]:.9g}")
+        for metric, value, doc in (
+                ('bakery_process_resident_bytes', rss_bytes(), "Current resident memory."),
+                ('bakery_process_peak_resident_bytes', peak_rss_bytes(), "Peak resident memory.")):
+            if value is not None:
+                lines += [f"# HELP {metric} {doc}", f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Write ``prometheus_text`` to ``path`` atomically (for a textfile collector)."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve ``prometheus_text`` at ``/metrics`` from a daemon thread; returns the server.
+
+        Calling it again returns the server already running.
+        """
+        with self._lock:
+            if self._server is not None:
+                return self._server
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+            profiler = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?')[0] != '/metrics':
+                        self.send_error(404)
+                        return
+                    body = profiler.prometheus_text().encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=self._server.serve_forever, name='bakery-metrics',
+                             daemon=True).start()
+            return self._server
+
+
+# Process-wide profiler used by the kernels, the job manager and the app
+PROFILER = Profiler()
+
+
+def span(stage, **labels):
+    """``PROFILER.span``: time the enclosed block as ``stage``."""
+    return PROFILER.span(stage, **labels)
+
+
+def trace(name, **labels):
+    """``PROFILER.trace``: collect the enclosed block's spans on a new ``Trace``."""
+    return PROFILER.trace(name, **labels)
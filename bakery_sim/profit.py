@@ -0,0 +1,163 @@
+"""Joint profit simulation over demand, ingredient price and staffing paths.
+
+Each Monte Carlo path draws daily demand for every product, a GBM price
+path for every ingredient and the staff needed to serve that day's
+customers, then books revenue from units sold against the ingredients
+consumed by the production plan (a recipe bill of materials) and labour.
+"""
+
+import numpy as np
+
+from .cost import DEFAULT_DRIFT, simulate_price_paths
+from .demand import simulate_demand_paths
+from .profiling import span
+from .rng import as_generator
+from .staffing import (BASE_PATTERN, DEFAULT_SERVICE_LEVEL, DEFAULT_TARGET_WAIT,
+                       staff_required)
+
+DAYS_PER_MONTH = 30
+DEFAULT_HOURLY_WAGE = 200.0
+DEFAULT_RISK_LEVELS = (0.95, 0.99)
+
+
+def risk_measures(profit, levels=DEFAULT_RISK_LEVELS):
+    """Summary statistics and tail risk of a sample of path profits.
+
+    ``var{level}`` is the loss exceeded on a ``1 - level`` fraction of paths
+    (positive means a loss) and ``cvar{level}`` is the average loss over
+    those paths. ``p_loss`` is the fraction of paths with negative profit.
+    """
+    profit = np.sort(np.asarray(profit, dtype=float))
+    result = {
+        'mean': profit.mean(),
+        'std': profit.std(),
+        'p_loss': np.count_nonzero(profit < 0) / profit.size,
+    }
+    for level in levels:
+        # Rounded first so e.g. (1 - 0.95) * 100 gives a tail of 5, not 6
+        tail = max(1, int(np.ceil(round((1 - level) * profit.size, 9))))
+        tag = f'{level * 100:g}'
+        result[f'var{tag}'] = -profit[tail - 1]
+        result[f'cvar{tag}'] = -profit[:tail].mean()
+    return result
+
+
+def staff_hours_table(max_customers, service_rate, model='erlang',
+                      service_level=DEFAULT_SERVICE_LEVEL, target_wait=DEFAULT_TARGET_WAIT):
+    """Staff-hours needed on a day with 0..``max_customers`` customers.
+
+    Customers are spread over the opening hours with the Staff Planning
+    hourly pattern; entry ``n`` is the summed hourly staff requirement.
+    """
+    share = BASE_PATTERN / BASE_PATTERN.sum()
+    hourly = np.arange(int(max_customers) + 1)[:, None] * share
+    return staff_required(hourly, service_rate, model, service_level, target_wait).sum(axis=1)
+
+
+def price_day_weights(n_days):
+    """Weights that turn monthly price steps into the sum of daily prices.
+
+    Day ``d`` pays a price linearly interpolated between the monthly GBM
+    steps either side of it, so ``prices @ weights`` is the total price over
+    ``n_days`` days of one unit bought each day.
+    """
+    t = np.arange(n_days) / DAYS_PER_MONTH
+    step = np.floor(t).astype(np.int64)
+    frac = t - step
+    n_steps = int(np.ceil(t[-1])) if n_days else 0
+    weights = np.bincount(step, 1 - frac, minlength=n_steps + 1)
+    weights += np.bincount(step + 1, frac, minlength=n_steps + 2)[:n_steps + 1]
+    return weights
+
+
+def simulate_profit(avg_demand, demand_var, sale_price, production, recipe,
+                    ingredient_price, ingredient_vol, n_days=30, n_paths=100000,
+                    units_per_customer=2.0, service_rate=8, hourly_wage=DEFAULT_HOURLY_WAGE,
+                    staffing_model='erlang', service_level=DEFAULT_SERVICE_LEVEL,
+                    target_wait=DEFAULT_TARGET_WAIT, fixed_daily_cost=0.0,
+                    drift=DEFAULT_DRIFT, profile=None, chunk_size=20000,
+                    levels=DEFAULT_RISK_LEVELS, progress=None, seed=None):
+    """Simulate ``n_paths`` joint paths of ``n_days`` and return the profit distribution.
+
+    ``avg_demand``, ``demand_var``, ``sale_price`` and ``production`` (units
+    baked per day) have one entry per product; ``recipe`` is the (n_products,
+    n_ingredients) kg of each ingredient per unit; ``ingredient_price`` and
+    ``ingredient_vol`` have one entry per ingredient. Ingredient prices follow
+    the monthly GBM of the Cost Analysis tab, interpolated to each day's
+    purchase, and unsold units are wasted. Labour is the staff-hours needed for the day's
+    customers (all units demanded divided by ``units_per_customer``) at
+    ``hourly_wage``. ``profile`` is as for ``simulate_demand_paths``.
+    ``progress(fraction, snapshot)`` is called after every chunk with a
+    ``snapshot()`` of the results over the paths so far.
+
+    Returns the per-path ``profit`` array, the ``risk_measures`` of it, and
+    the mean ``revenue``, ``ingredient_cost``, ``labor_cost``,
+    ``waste_units`` and ``fill_rate`` per path.
+    """
+    avg_demand = np.atleast_1d(np.asarray(avg_demand, dtype=float))
+    n_products = avg_demand.size
+    demand_var = np.broadcast_to(np.asarray(demand_var, dtype=float), (n_products,))
+    sale_price = np.broadcast_to(np.asarray(sale_price, dtype=float), (n_products,))
+    production = np.broadcast_to(np.asarray(production, dtype=float), (n_products,))
+    ingredient_price = np.atleast_1d(np.asarray(ingredient_price, dtype=float))
+    ingredient_vol = np.broadcast_to(np.asarray(ingredient_vol, dtype=float),
+                                     ingredient_price.shape)
+    recipe = np.asarray(recipe, dtype=float).reshape(n_products, ingredient_price.size)
+    if n_paths < 1 or chunk_size < 1:
+        raise ValueError("n_paths and chunk_size must be positive")
+
+    # Ingredient use is fixed by the production plan; only prices vary
+    daily_kg = production @ recipe
+    day_weights = price_day_weights(n_days)
+    n_steps = day_weights.size - 1
+    sold_value = sale_price[:, None, None]
+
+    rng = as_generator(seed)
+    profit = np.empty(n_paths)
+    totals = dict.fromkeys(('revenue', 'ingredient_cost', 'labor_cost', 'waste_units'), 0.0)
+    demanded = sold = 0.0
+    done = 0
+
+    def summarize():
+        # Rows before ``done`` are final, so a view is safe to hand out
+        result = {'profit': profit[:done], 'n_paths': done, 'n_days': n_days}
+        result.update(risk_measures(result['profit'], levels))
+        result.update({key: value / done for key, value in totals.items()})
+        result['fill_rate'] = sold / demanded if demanded else 1.0
+        return result
+
+    while done < n_paths:
+        rows = min(chunk_size, n_paths - done)
+        with span('draw'):
+            demand = np.stack([simulate_demand_paths(avg_demand[p], demand_var[p], n_days, rows,
+                                                     profile=profile, seed=rng)
+                               for p in range(n_products)])
+        units_sold = np.minimum(demand, production[:, None, None])
+        revenue = (units_sold * sold_value).sum(axis=(0, 2))
+
+        ingredient_cost = np.zeros(rows)
+        with span('draw'):
+            for i in range(ingredient_price.size):
+                if daily_kg[i] == 0:
+                    continue
+                prices = simulate_price_paths(ingredient_price[i], ingredient_vol[i], n_steps,
+                                              n_scenarios=rows, drift=drift, seed=rng)
+                ingredient_cost += daily_kg[i] * (prices @ day_weights)
+
+        customers = np.rint(demand.sum(axis=0) / units_per_customer).astype(np.int64)
+        table = staff_hours_table(customers.max(), service_rate, staffing_model,
+                                  service_level, target_wait)
+        labor_cost = hourly_wage * table[customers].sum(axis=1)
+
+        profit[done:done + rows] = (revenue - ingredient_cost - labor_cost
+                                    - fixed_daily_cost * n_days)
+        totals['revenue'] += revenue.sum()
+        totals['ingredient_cost'] += ingredient_cost.sum()
+        totals['labor_cost'] += labor_cost.sum()
+        totals['waste_units'] += (production.sum() * n_days * rows) - units_sold.sum()
+        demanded += demand.sum()
+        sold += units_sold.sum()
+        done += rows
+        if progress is not None:
+            progress(done / n_paths, summarize)
+    return summarize()
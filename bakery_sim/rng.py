@@ -0,0 +1,30 @@
+"""Random number source helpers shared by the simulation kernels."""
+
+import numpy as np
+
+
+def as_random_state(seed=None):
+    """Coerce ``seed`` into an object with the legacy ``normal`` sampling API.
+
+    Integers give a private ``RandomState`` whose stream matches
+    ``np.random.seed(seed)`` followed by ``np.random.normal`` calls, so results
+    agree with the original app without touching the global generator.
+    ``RandomState`` and ``Generator`` instances are passed through.
+    """
+    if isinstance(seed, (np.random.RandomState, np.random.Generator)):
+        return seed
+    return np.random.RandomState(seed)
+
+
+def as_generator(seed=None):
+    """Coerce ``seed`` into a ``np.random.Generator`` for kernels with no legacy stream.
+
+    Newer kernels have no original output to reproduce, so they use the
+    faster ``Generator`` API. Integers and ``SeedSequence`` objects seed a
+    fresh PCG64 generator; ``Generator`` instances are passed through.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if isinstance(seed, np.random.RandomState):
+        raise TypeError("expected a seed, SeedSequence or Generator, not a RandomState")
+    return np.random.default_rng(seed)
@@ -0,0 +1,280 @@
+"""Parameter sweeps over common random draws.
+
+Each ``sweep_*`` function takes its swept parameters as arrays that are
+broadcast together (a grid is ``x[:, None]`` against ``y[None, :]``, a Latin
+hypercube is equal-length 1-D arrays) and scores every combination against
+one shared set of standard normal draws. Differences between points are
+then due to the parameters alone, and work is shared: scale parameters
+(average demand, current price) multiply results computed once per distinct
+shape parameter, and demand quantiles and means are read from sorted draws
+and prefix sums as in ``SortedDemand``.
+
+Sweeps and ``tornado`` take an optional ``progress`` callback (see
+``jobs``), called as work completes so a background job can report and
+cancel. The price and staffing sweeps also pass a ``snapshot()`` after each
+chunk of points, whose outputs are NaN at points not yet evaluated.
+"""
+
+import numpy as np
+
+from .cost import DEFAULT_DRIFT, DEFAULT_DT, DEFAULT_FLOOR_RATIO
+from .demand import NOISE_DISTRIBUTIONS, demand_profile
+from .rng import as_generator
+from .staffing import (BASE_PATTERN, DEFAULT_SERVICE_LEVEL, DEFAULT_TARGET_WAIT, day_multipliers,
+                       staff_required)
+
+# Working-array elements per chunk of swept points (float64: 128 MB)
+DEFAULT_CHUNK_VALUES = 2**24
+DEFAULT_WASTE_RATIO = 0.7
+DEFAULT_PRICE_RISE = 0.1
+
+
+def latin_hypercube(ranges, n_samples, seed=None):
+    """Latin hypercube sample of ``n_samples`` points over ``{name: (low, high)}``.
+
+    Every parameter's range is cut into ``n_samples`` equal strata and each
+    stratum is used exactly once, in an independent random order per
+    parameter. Returns ``{name: array of n_samples values}``.
+    """
+    rng = as_generator(seed)
+    points = {}
+    for name, (low, high) in ranges.items():
+        u = (rng.permutation(n_samples) + rng.random(n_samples)) / n_samples
+        points[name] = low + u * (high - low)
+    return points
+
+
+def parameter_grid(ranges, n_points):
+    """Full grid over ``{name: (low, high)}`` with ``n_points`` values per parameter.
+
+    Returns ``{name: array}`` with one axis per parameter, in the order given,
+    ready to pass to a ``sweep_*`` function.
+    """
+    names = list(ranges)
+    axes = [np.linspace(low, high, n_points) for low, high in ranges.values()]
+    return dict(zip(names, np.meshgrid(*axes, indexing='ij')))
+
+
+def _chunks(n_items, per_item, chunk_values):
+    step = max(1, int(chunk_values // max(per_item, 1)))
+    for start in range(0, n_items, step):
+        yield slice(start, min(start + step, n_items))
+
+
+def _order_stat(sorted_values, q):
+    # Index and weight for np.percentile's linear interpolation at q percent
+    n = sorted_values.shape[0]
+    pos = (n - 1) * q / 100
+    lo = int(np.floor(pos))
+    return lo, min(lo + 1, n - 1), pos - lo
+
+
+def sweep_demand(avg_demand, demand_var, sim_days=30, n_paths=10000, noise='normal',
+                 waste_ratio=DEFAULT_WASTE_RATIO, profile=None, progress=None, seed=None):
+    """Demand outcomes for every combination of ``avg_demand`` and ``demand_var``.
+
+    Daily demand is that of ``simulate_demand_paths`` with one (n_paths,
+    sim_days) block of standard normal draws shared by every point. Returns
+    arrays of the broadcast shape: ``mean_demand`` (mean daily demand),
+    ``p90_demand`` (per-day 90th percentile averaged over days, as the
+    Demand tab reports it) and ``waste_prob`` (chance of a day below
+    ``waste_ratio`` times average demand). ``progress(fraction)`` is called
+    after every simulated day; outputs average over days, so there is no
+    partial snapshot.
+    """
+    if noise not in NOISE_DISTRIBUTIONS:
+        raise ValueError(f"unknown noise distribution {noise!r}; expected one of {NOISE_DISTRIBUTIONS}")
+    avg, cv = np.broadcast_arrays(np.asarray(avg_demand, dtype=float),
+                                  np.asarray(demand_var, dtype=float))
+    profile = np.asarray(demand_profile(sim_days) if profile is None else profile, dtype=float)
+    z = np.sort(as_generator(seed).standard_normal((n_paths, sim_days)), axis=0)
+    lo, hi, frac = _order_stat(z, 90)
+
+    # Every metric is avg_demand times a function of cv alone, and demand is
+    # increasing in the draw, so quantiles and exceedances come from the
+    # sorted draws of each day
+    levels, inverse = np.unique(cv, return_inverse=True)
+    mean = np.empty((levels.size, sim_days))
+    p90 = np.empty((levels.size, sim_days))
+    waste = np.empty((levels.size, sim_days))
+    if noise == 'normal':
+        # Paths with Z above -1/cv have positive demand: n - k of them summing
+        # to (n - k) + cv * (sum of their Z)
+        prefix = np.vstack([np.zeros(sim_days), np.cumsum(z, axis=0)])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cutoff = np.where(levels > 0, -1 / levels, -np.inf)
+            below = np.where(levels[:, None] > 0, (waste_ratio / profile - 1) / levels[:, None],
+                             np.where(profile < waste_ratio, np.inf, -np.inf))
+        ends = np.maximum(1 + levels[:, None, None] * z[[lo, hi]], 0)
+    else:
+        sigma = np.sqrt(np.log1p(levels**2))[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            below = np.where(sigma > 0, (np.log(waste_ratio / profile) + 0.5 * sigma**2) / sigma,
+                             np.where(profile < waste_ratio, np.inf, -np.inf))
+        ends = np.exp(sigma[:, :, None] * z[[lo, hi]] - 0.5 * sigma[:, :, None]**2)
+    for day in range(sim_days):
+        if noise == 'normal':
+            k = np.searchsorted(z[:, day], cutoff, side='right')
+            mean[:, day] = ((n_paths - k) + levels * (prefix[-1, day] - prefix[k, day])) / n_paths
+        else:
+            mean[:, day] = np.exp(sigma * z[:, day] - 0.5 * sigma**2).mean(axis=1)
+        waste[:, day] = np.searchsorted(z[:, day], below[:, day], side='left') / n_paths
+        if progress is not None:
+            progress((day + 1) / sim_days)
+    mean *= profile
+    p90[:] = profile * ((1 - frac) * ends[:, 0] + frac * ends[:, 1])
+
+    return {
+        'mean_demand': avg * mean.mean(axis=1)[inverse].reshape(avg.shape),
+        'p90_demand': avg * p90.mean(axis=1)[inverse].reshape(avg.shape),
+        'waste_prob': waste.mean(axis=1)[inverse].reshape(avg.shape),
+    }
+
+
+def sweep_price(current_price, volatility, drift=DEFAULT_DRIFT, n_steps=6, n_scenarios=10000,
+                dt=DEFAULT_DT, floor_ratio=DEFAULT_FLOOR_RATIO, rise=DEFAULT_PRICE_RISE,
+                chunk_values=DEFAULT_CHUNK_VALUES, progress=None, seed=None):
+    """Final-price outcomes for every combination of the GBM parameters.
+
+    Paths follow ``simulate_price_paths`` (including its floor) with one
+    (n_scenarios, n_steps) block of draws shared by every point. Prices
+    scale with ``current_price``, so paths are only simulated once per
+    distinct (volatility, drift) pair. Returns arrays of the broadcast
+    shape: ``mean_final``, ``p10_final`` and ``p90_final`` prices after
+    ``n_steps`` and ``prob_rise``, the chance the price ends more than
+    ``rise`` above today's. ``progress(fraction)`` is called after every
+    step of a chunk of points and ``progress(fraction, snapshot)`` once the
+    chunk is done; ``snapshot()`` returns the outputs with NaN at points
+    not yet evaluated.
+    """
+    price, vol, mu = np.broadcast_arrays(*(np.asarray(v, dtype=float)
+                                           for v in (current_price, volatility, drift)))
+    z = as_generator(seed).standard_normal((n_steps, n_scenarios))
+    pairs, inverse = np.unique(np.stack([vol.ravel(), mu.ravel()], axis=1), axis=0,
+                               return_inverse=True)
+    inverse = inverse.ravel()
+
+    stats = np.full((4, len(pairs)), np.nan)
+
+    def finish():
+        values = stats[:, inverse].reshape((4,) + price.shape)
+        return {
+            'mean_final': price * values[0],
+            'p10_final': price * values[1],
+            'p90_final': price * values[2],
+            'prob_rise': values[3],
+        }
+
+    for part in _chunks(len(pairs), n_scenarios, chunk_values):
+        v = pairs[part, 0][:, None]
+        scale = v**2 * np.sqrt(dt)
+        step_mean = (pairs[part, 1][:, None] - 0.5 * v**2) * dt
+        # Price relative to today's, compounded step by step with the floor
+        ratio = np.ones((len(v), n_scenarios))
+        growth = np.empty_like(ratio)
+        for t in range(n_steps):
+            np.multiply(scale, z[t], out=growth)
+            growth += step_mean
+            np.exp(growth, out=growth)
+            ratio *= growth
+            np.maximum(ratio, floor_ratio, out=ratio)
+            if progress is not None and t + 1 < n_steps:
+                done = part.start + (part.stop - part.start) * (t + 1) / n_steps
+                progress(done / len(pairs))
+        stats[0, part] = ratio.mean(axis=1)
+        stats[1:3, part] = np.percentile(ratio, (10, 90), axis=1)
+        stats[3, part] = (ratio > 1 + rise).mean(axis=1)
+        if progress is not None:
+            progress(part.stop / len(pairs), finish)
+    return finish()
+
+
+def sweep_staffing(avg_customers, customer_var, service_rate, n_days=365, model='erlang',
+                   service_level=DEFAULT_SERVICE_LEVEL, target_wait=DEFAULT_TARGET_WAIT,
+                   chunk_values=DEFAULT_CHUNK_VALUES, progress=None, seed=None):
+    """Staffing outcomes for every combination of demand and service rate.
+
+    Hourly customers follow ``simulate_customer_patterns`` with one
+    (n_days, hours) block of draws shared by every point, and staff come
+    from ``staff_required``. Returns arrays of the broadcast shape:
+    ``staff_hours`` (average staff-hours per day), ``peak_staff`` (the
+    busiest hour's average staff) and ``p90_peak_staff`` (the busiest hour's
+    90th percentile staff). ``progress(fraction, snapshot)`` is called after
+    every chunk of points; ``snapshot()`` returns the outputs with NaN at
+    points not yet evaluated.
+    """
+    customers, cv, rate = np.broadcast_arrays(*(np.asarray(v, dtype=float)
+                                                for v in (avg_customers, customer_var,
+                                                          service_rate)))
+    shape = customers.shape
+    customers, cv, rate = customers.ravel(), cv.ravel(), rate.ravel()
+    z = as_generator(seed).standard_normal((n_days, BASE_PATTERN.size))
+    base = (BASE_PATTERN / BASE_PATTERN.sum()) * day_multipliers(n_days)[:, None]
+
+    stats = np.full((3, customers.size), np.nan)
+    done = 0
+
+    def finish():
+        return {
+            'staff_hours': stats[0].reshape(shape),
+            'peak_staff': stats[1].reshape(shape),
+            'p90_peak_staff': stats[2].reshape(shape),
+        }
+
+    # The Erlang target depends on the service rate, so points are grouped by it
+    for value in np.unique(rate):
+        group = np.flatnonzero(rate == value)
+        for part in _chunks(group.size, z.size, chunk_values):
+            idx = group[part]
+            hourly = customers[idx, None, None] * base * (1 + cv[idx, None, None] * z)
+            np.maximum(hourly, 0, out=hourly)
+            staff = staff_required(hourly, value, model, service_level, target_wait)
+            average = staff.mean(axis=1)
+            stats[0, idx] = average.sum(axis=1)
+            stats[1, idx] = average.max(axis=1)
+            stats[2, idx] = np.percentile(staff, 90, axis=1).max(axis=1)
+            done += idx.size
+            if progress is not None:
+                progress(done / customers.size, finish)
+    return finish()
+
+
+SWEEPS = {'demand': sweep_demand, 'cost': sweep_price, 'staffing': sweep_staffing}
+
+
+def tornado(analysis, base, ranges, progress=None, seed=None, **options):
+    """One-at-a-time sensitivity of every metric to each parameter in ``ranges``.
+
+    ``base`` holds the central value of every swept parameter of the
+    ``analysis`` (``'demand'``, ``'cost'`` or ``'staffing'``) and ``ranges``
+    the ``(low, high)`` value of those to vary. Each parameter is swept in
+    turn at the base point and its two moved values, all over the same
+    draws, and ``progress(fraction)`` is called after each. ``options`` go
+    to the sweep function.
+
+    Returns ``parameters`` (the names in ``ranges``), ``base`` (each metric
+    at the base point) and ``low`` / ``high`` (each metric with one
+    parameter moved, an array over ``parameters``).
+    """
+    names = list(ranges)
+    # Every parameter's sweep must see the same draws, so a Generator is
+    # turned into a fixed seed once
+    if isinstance(seed, np.random.Generator):
+        seed = seed.integers(2**63)
+    seed = np.random.SeedSequence(seed)
+    results = []
+    for i, name in enumerate(names or [None]):
+        points = {key: np.full(3, float(value)) for key, value in base.items()}
+        if name is not None:
+            points[name][1:] = ranges[name]
+        results.append(SWEEPS[analysis](**points, seed=seed, **options))
+        if progress is not None:
+            progress((i + 1) / max(len(names), 1))
+    return {
+        'parameters': names,
+        'base': {metric: float(values[0]) for metric, values in results[0].items()},
+        'low': {metric: np.array([r[metric][1] for r in results[:len(names)]])
+                for metric in results[0]},
+        'high': {metric: np.array([r[metric][2] for r in results[:len(names)]])
+                 for metric in results[0]},
+    }
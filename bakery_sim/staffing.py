@@ -0,0 +1,245 @@
+"""Hourly customer arrivals and staffing requirements."""
+
+import functools
+
+import numpy as np
+
+from .adaptive import DEFAULT_TIME_BUDGET, DEFAULT_TOLERANCE, run_until_converged
+from .profiling import span
+from .rng import as_random_state
+
+HOURS = np.arange(8, 20)
+BASE_PATTERN = np.array([0.4, 0.6, 0.8, 1.0, 1.4, 1.8, 1.6, 1.2, 0.9, 0.7, 0.8, 1.1])
+WEEKEND_DAYS = (5, 6)
+WEEKEND_MULTIPLIER = 1.3
+
+STAFFING_MODELS = ('erlang', 'simple')
+DEFAULT_SERVICE_LEVEL = 0.8
+DEFAULT_TARGET_WAIT = 5.0
+STAFFING_CHUNK_DAYS = 364
+ADAPTIVE_BATCH_DAYS = 28
+ADAPTIVE_MAX_DAYS = 100000
+
+
+def hourly_customer_profile(avg_customers):
+    """Expected customers in each opening hour for a regular weekday."""
+    return avg_customers * BASE_PATTERN / np.sum(BASE_PATTERN)
+
+
+def day_multipliers(n_days):
+    """Demand multiplier for each simulated day (weekends are busier)."""
+    weekend = np.isin(np.arange(n_days) % 7, WEEKEND_DAYS)
+    return np.where(weekend, WEEKEND_MULTIPLIER, 1.0)
+
+
+def simulate_customer_patterns(avg_customers, customer_var, n_days=30, seed=None):
+    """Simulate hourly customer counts, returning shape (n_days, len(HOURS)).
+
+    All days are drawn in one block; with ``seed=42`` the result matches the
+    original day-by-day loop exactly.
+    """
+    rs = as_random_state(seed)
+    adjusted_customers = hourly_customer_profile(avg_customers) * day_multipliers(n_days)[:, None]
+    actual_customers = rs.normal(adjusted_customers, adjusted_customers * customer_var)
+    return np.maximum(0, actual_customers, out=actual_customers)
+
+
+class ErlangTable:
+    """Precomputed Erlang C waiting probabilities on a grid of offered loads.
+
+    ``wait_prob[c - 1, i]`` is the probability that a customer has to queue
+    with ``c`` staff at an offered load of ``i * step`` Erlangs (arrival rate
+    divided by per-staff service rate). Staff requirements for any service
+    level target are then a lookup plus one vectorised comparison, so many
+    configurations can be evaluated without redoing the Erlang recursion.
+    Loads are rounded up to the grid, which can only overstate staffing.
+    """
+
+    def __init__(self, max_load=100.0, step=0.01):
+        self.step = step
+        self.loads = np.arange(int(np.ceil(max_load / step)) + 1) * step
+        self.max_load = self.loads[-1]
+        self.max_staff = int(np.ceil(self.max_load + 10 * np.sqrt(self.max_load) + 10))
+
+        # Erlang B recursion, then convert to Erlang C where c > load
+        a = self.loads
+        blocking = np.ones_like(a)
+        wait_prob = np.ones((self.max_staff, a.size))
+        for c in range(1, self.max_staff + 1):
+            blocking = a * blocking / (c + a * blocking)
+            stable = c > a
+            denom = np.where(stable, c - a * (1 - blocking), 1.0)
+            wait_prob[c - 1] = np.where(stable, c * blocking / denom, 1.0)
+        self.wait_prob = wait_prob
+
+    def staff_required(self, loads, service_level, wait_service_product):
+        """Smallest staff count meeting the target for each offered load.
+
+        The service level is ``1 - P(wait) * exp(-(c - load) * mu * t)``;
+        ``wait_service_product`` is ``mu * t`` (target wait in hours times
+        customers served per staff-hour). Zero load needs zero staff.
+        """
+        loads = np.asarray(loads, dtype=float)
+        if loads.size and loads.max() > self.max_load:
+            raise ValueError(f"offered load {loads.max():.1f} exceeds table maximum {self.max_load}")
+        idx = np.ceil(loads / self.step - 1e-9).astype(np.int64)
+        unique_idx, inverse = np.unique(idx, return_inverse=True)
+
+        staff = np.arange(1, self.max_staff + 1)[:, None]
+        load = self.loads[unique_idx]
+        met = 1 - self.wait_prob[:, unique_idx] * np.exp(-(staff - load) * wait_service_product)
+        met = (met >= service_level) & (staff > load)
+        required = np.where(met.any(axis=0), met.argmax(axis=0) + 1, self.max_staff)
+        required[unique_idx == 0] = 0
+        return required[inverse].reshape(loads.shape)
+
+
+@functools.lru_cache(maxsize=8)
+def get_erlang_table(max_load=100.0, step=0.01):
+    """Shared ``ErlangTable``, built once per grid."""
+    return ErlangTable(max_load, step)
+
+
+def erlang_staff_required(customers, service_rate, service_level=DEFAULT_SERVICE_LEVEL,
+                          target_wait=DEFAULT_TARGET_WAIT):
+    """Staff needed so ``service_level`` of customers wait at most ``target_wait`` minutes.
+
+    ``customers`` are hourly arrival counts (any shape) and ``service_rate``
+    is customers served per staff member per hour (M/M/c, Erlang C).
+    """
+    loads = np.asarray(customers, dtype=float) / service_rate
+    max_load = 100.0
+    while loads.size and loads.max() > max_load:
+        max_load *= 2
+    table = get_erlang_table(max_load)
+    return table.staff_required(loads, service_level, service_rate * target_wait / 60)
+
+
+def staff_required(customers, service_rate, model='erlang', service_level=DEFAULT_SERVICE_LEVEL,
+                   target_wait=DEFAULT_TARGET_WAIT):
+    """Staff needed for hourly customer counts under the chosen staffing model.
+
+    ``'simple'`` divides customers by the service rate and rounds up, which
+    ignores queueing; ``'erlang'`` meets a service level target.
+    """
+    if model == 'simple':
+        return np.ceil(np.asarray(customers) / service_rate)
+    if model == 'erlang':
+        return erlang_staff_required(customers, service_rate, service_level, target_wait)
+    raise ValueError(f"unknown staffing model {model!r}; expected one of {STAFFING_MODELS}")
+
+
+def analyze_staffing(avg_customers, customer_var, service_rate, n_days=30, model='erlang',
+                     service_level=DEFAULT_SERVICE_LEVEL, target_wait=DEFAULT_TARGET_WAIT,
+                     chunk_days=STAFFING_CHUNK_DAYS, progress=None, seed=None):
+    """Average and 90th percentile staff needed per hour over simulated days.
+
+    Days are simulated ``chunk_days`` at a time (rounded up to whole weeks);
+    the random stream is consumed in day order, so results do not depend on
+    the chunk size and ``seed=42`` matches the original day-by-day loop.
+    ``progress(fraction, snapshot)`` is called after every chunk;
+    ``snapshot()`` returns the statistics of the days so far.
+    """
+    rs = as_random_state(seed)
+    chunk_days = max(-(-chunk_days // 7) * 7, 7)
+    daily_patterns = np.empty((n_days, HOURS.size))
+    staff_needed = np.empty((n_days, HOURS.size))
+
+    def summarize(done):
+        with span('percentile'):
+            p90_staff = np.percentile(staff_needed[:done], 90, axis=0)
+        return {
+            'hours': HOURS.copy(),
+            'avg_staff': np.mean(staff_needed[:done], axis=0),
+            'p90_staff': p90_staff,
+            'hourly_customers': np.mean(daily_patterns[:done], axis=0),
+            'service_rate': service_rate
+        }
+
+    for start in range(0, n_days, chunk_days):
+        # Chunks start on a whole week, so the weekend days line up
+        days = slice(start, min(start + chunk_days, n_days))
+        with span('draw'):
+            daily_patterns[days] = simulate_customer_patterns(avg_customers, customer_var,
+                                                              days.stop - start, rs)
+        with span('staffing', model=model):
+            staff_needed[days] = staff_required(daily_patterns[days], service_rate, model,
+                                                service_level, target_wait)
+        if progress is not None:
+            progress(days.stop / n_days, lambda done=days.stop: summarize(done))
+    return summarize(n_days)
+
+
+def adaptive_staffing(avg_customers, customer_var, service_rate, model='erlang',
+                      service_level=DEFAULT_SERVICE_LEVEL, target_wait=DEFAULT_TARGET_WAIT,
+                      tolerance=DEFAULT_TOLERANCE, time_budget=DEFAULT_TIME_BUDGET,
+                      batch_days=ADAPTIVE_BATCH_DAYS, max_days=ADAPTIVE_MAX_DAYS,
+                      progress=None, seed=None):
+    """``analyze_staffing`` over as many simulated days as the precision needs.
+
+    Days are simulated in batches of ``batch_days`` (rounded up to whole
+    weeks, so every batch has the same weekend mix) until each hour's
+    average and 90th percentile staff are known to ``tolerance`` at 95%
+    confidence, ``time_budget`` seconds have passed or ``max_days`` days have
+    run; see ``run_until_converged`` (which also describes ``progress``).
+
+    Returns the keys of ``analyze_staffing`` with ``avg_staff_se`` and
+    ``p90_staff_se``, plus ``n_days``, ``converged``, ``stop_reason``,
+    ``n_batches``, ``elapsed`` and ``precision``.
+    """
+    rs = as_random_state(seed)
+    batch_days = -(-batch_days // 7) * 7
+    customers = []
+    # Staff counts are small integers, so a per-hour tally gives the exact
+    # pooled 90th percentile; batch percentiles only supply its standard error
+    tally = np.zeros((HOURS.size, 1), dtype=np.int64)
+
+    def draw():
+        nonlocal tally
+        patterns = simulate_customer_patterns(avg_customers, customer_var, batch_days, rs)
+        customers[:] = [patterns]
+        staff = staff_required(patterns, service_rate, model, service_level,
+                               target_wait).astype(np.int64)
+        width = max(tally.shape[1], int(staff.max()) + 1)
+        tally = np.pad(tally, ((0, 0), (0, width - tally.shape[1])))
+        for h in range(HOURS.size):
+            tally[h] += np.bincount(staff[:, h], minlength=width)
+        return staff
+
+    def hourly_customers(batch):
+        return {'hourly_customers': customers[0].mean(axis=0)}
+
+    def finish(stats):
+        return {
+            'hours': HOURS.copy(),
+            'avg_staff': stats['mean'],
+            'avg_staff_se': stats['mean_se'],
+            'p90_staff': _tally_percentile(tally, 90),
+            'p90_staff_se': stats['p90_se'],
+            'hourly_customers': stats['hourly_customers'],
+            'service_rate': service_rate,
+            'n_days': stats['n_paths'],
+            'n_batches': stats['n_batches'],
+            'converged': stats['converged'],
+            'stop_reason': stats['stop_reason'],
+            'elapsed': stats['elapsed'],
+            'precision': stats['precision'],
+        }
+
+    def report(fraction, snapshot):
+        progress(fraction, lambda: finish(snapshot()))
+
+    return finish(run_until_converged(draw, (90,), hourly_customers, tolerance=tolerance,
+                                      time_budget=time_budget,
+                                      max_batches=max(2, max_days // batch_days),
+                                      progress=report if progress is not None else None))
+
+
+def _tally_percentile(tally, q):
+    # np.percentile (linear interpolation) of each row's values from their
+    # counts: tally[h, v] is how often row h took the value v
+    cum = np.cumsum(tally, axis=1)
+    pos = (cum[:, -1] - 1) * q / 100
+    lower = (cum <= np.floor(pos)[:, None]).sum(axis=1)
+    upper = (cum <= np.ceil(pos)[:, None]).sum(axis=1)
+    return lower + (pos - np.floor(pos)) * (upper - lower)
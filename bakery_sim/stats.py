@@ -0,0 +1,82 @@
+"""Streaming statistics for simulation outputs that are too large to hold in memory."""
+
+import numpy as np
+
+from .profiling import span
+
+
+class StreamingQuantiles:
+    """Per-column quantile and moment estimates accumulated chunk by chunk.
+
+    Each column (e.g. each simulated day) keeps a fixed-width histogram over
+    ``[lo, hi)``, so memory stays at ``n_columns * bins`` counters no matter
+    how many rows are pushed through ``update``. ``lo`` and ``hi`` may be
+    scalars or per-column arrays. Values outside the range are counted in
+    the edge bins. Quantiles are read back by linear interpolation inside the
+    bin, so their error is bounded by one bin width.
+    """
+
+    def __init__(self, n_columns, lo, hi, bins=4096):
+        lo = np.broadcast_to(np.asarray(lo, dtype=float), (n_columns,))
+        hi = np.broadcast_to(np.asarray(hi, dtype=float), (n_columns,))
+        if np.any(hi <= lo):
+            raise ValueError("hi must be greater than lo")
+        self.n_columns = n_columns
+        self.lo = lo.copy()
+        self.hi = hi.copy()
+        self.bins = bins
+        self.width = (self.hi - self.lo) / bins
+        self.counts = np.zeros((n_columns, bins), dtype=np.int64)
+        self.n = 0
+        self._sum = np.zeros(n_columns)
+        self._sumsq = np.zeros(n_columns)
+
+    def update(self, chunk):
+        """Add a (rows, n_columns) block of observations."""
+        with span('aggregate'):
+            chunk = np.asarray(chunk, dtype=float)
+            idx = ((chunk - self.lo) / self.width).astype(np.int64)
+            np.clip(idx, 0, self.bins - 1, out=idx)
+            idx += np.arange(self.n_columns) * self.bins
+            self.counts += np.bincount(idx.ravel(),
+                                       minlength=self.counts.size).reshape(self.counts.shape)
+            self.n += chunk.shape[0]
+            self._sum += chunk.sum(axis=0)
+            self._sumsq += np.square(chunk).sum(axis=0)
+
+    @property
+    def mean(self):
+        return self._sum / self.n
+
+    @property
+    def std(self):
+        var = self._sumsq / self.n - np.square(self.mean)
+        return np.sqrt(np.maximum(var, 0))
+
+    def quantiles(self, percentiles):
+        """Return an array of shape (len(percentiles), n_columns)."""
+        if self.n == 0:
+            raise ValueError("no observations have been added")
+        with span('percentile'):
+            cum = np.cumsum(self.counts, axis=1)
+            result = np.empty((len(percentiles), self.n_columns))
+            rows = np.arange(self.n_columns)
+            for i, q in enumerate(percentiles):
+                target = q / 100 * self.n
+                b = np.minimum((cum < target).sum(axis=1), self.bins - 1)
+                below = np.where(b > 0, cum[rows, b - 1], 0)
+                in_bin = np.maximum(self.counts[rows, b], 1)
+                frac = np.clip((target - below) / in_bin, 0, 1)
+                result[i] = self.lo + (b + frac) * self.width
+        return result
+
+    def fraction_below(self, value):
+        """Estimated per-column probability of an observation below ``value``."""
+        pos = np.broadcast_to((value - self.lo) / self.width, (self.n_columns,))
+        b = np.clip(np.floor(pos), 0, self.bins).astype(np.int64)
+        cum = np.concatenate([np.zeros((self.n_columns, 1)), np.cumsum(self.counts, axis=1)], axis=1)
+        rows = np.arange(self.n_columns)
+        below = cum[rows, b]
+        inside = b < self.bins
+        below[inside] += self.counts[rows[inside], b[inside]] * (pos[inside] - b[inside])
+        return below / self.n
@@ -0,0 +1,227 @@
+"""Persistent simulation results and run history.
+
+``RunStore`` keeps two SQLite tables in one file. ``results`` holds one row
+per distinct run key (module, parameters, seed and engine version): the
+parameters as JSON and the result itself, with its arrays packed into one
+compressed ``.npz`` blob and everything else as JSON. ``runs`` logs every
+request for a result, with the item it was for (product or ingredient) and
+the first forecast day, indexed so the past forecasts for a product and
+date range are one lookup. Results therefore survive restarts and a
+repeated scenario is read back instead of re-simulated.
+
+Used as the second tier of ``ResultCache``; it can be shared with other
+processes (the database runs in WAL mode).
+"""
+
+import hashlib
+import io
+import json
+import numbers
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .version import ENGINE_VERSION
+
+# Parameters naming what a run is for, in order of preference
+ITEM_PARAMS = ('product_type', 'product', 'ingredient')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    module TEXT NOT NULL,
+    engine_version TEXT NOT NULL,
+    seed INTEGER,
+    params TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    arrays BLOB NOT NULL,
+    nbytes INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL REFERENCES results(key),
+    module TEXT NOT NULL,
+    item TEXT,
+    start_day INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_item ON runs(module, item, start_day);
+CREATE INDEX IF NOT EXISTS runs_created ON runs(created);
+CREATE INDEX IF NOT EXISTS results_module ON results(module, engine_version);
+"""
+
+
+def key_digest(key):
+    """Stable text digest of a ``make_key`` tuple."""
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def _jsonable(value):
+    # Parameters for display and querying: tuples become lists, numpy scalars
+    # Python numbers and anything else its repr
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def _pack(result):
+    """``(json_text, npz_bytes)`` for a result of dicts, sequences, arrays and scalars."""
+    arrays = {}
+
+    def encode(value):
+        if isinstance(value, np.ndarray):
+            if value.dtype == object:
+                raise TypeError("object arrays cannot be stored")
+            name = f'a{len(arrays)}'
+            arrays[name] = value
+            return {'array': name}
+        if isinstance(value, dict):
+            if not all(isinstance(k, str) for k in value):
+                raise TypeError("only dicts with string keys can be stored")
+            return {'dict': {k: encode(v) for k, v in value.items()}}
+        if isinstance(value, tuple):
+            return {'tuple': [encode(v) for v in value]}
+        if isinstance(value, list):
+            return [encode(v) for v in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        raise TypeError(f"cannot store {type(value).__name__} values")
+
+    summary = json.dumps(encode(result))
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return summary, buf.getvalue()
+
+
+def _unpack(summary, blob):
+    with np.load(io.BytesIO(blob), allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+
+    def decode(value):
+        if isinstance(value, list):
+            return [decode(v) for v in value]
+        if isinstance(value, dict):
+            if 'array' in value:
+                return arrays[value['array']]
+            if 'tuple' in value:
+                return tuple(decode(v) for v in value['tuple'])
+            return {k: decode(v) for k, v in value['dict'].items()}
+        return value
+
+    return decode(json.loads(summary))
+
+
+def _today():
+    return int(time.time() // 86400)
+
+
+class RunStore:
+    """SQLite run history with compressed result blobs (see the module docstring)."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, key):
+        """The stored result for a ``make_key`` tuple, or ``None``."""
+        with self._lock:
+            row = self._conn.execute("SELECT summary, arrays FROM results WHERE key = ?",
+                                     (key_digest(key),)).fetchone()
+        return None if row is None else _unpack(*row)
+
+    def put(self, key, module, params, result, seed=None):
+        """Store a result; returns False if it holds values that cannot be stored."""
+        try:
+            summary, blob = _pack(result)
+        except TypeError:
+            return False
+        # numpy integer seeds (from the batch runner and sweeps) are stored as ints too
+        seed = int(seed) if isinstance(seed, numbers.Integral) else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key_digest(key), module, ENGINE_VERSION, seed,
+                 json.dumps(_jsonable(params)), summary, blob, len(blob), time.time()))
+        return True
+
+    def record_run(self, key, module, params, start_day=None):
+        """Log a request for a stored result; returns the run ID or ``None`` if not stored.
+
+        ``start_day`` is the first forecast day in days since 1970-01-01
+        (default: today). The item comes from the first of ``ITEM_PARAMS``
+        present in ``params``.
+        """
+        item = next((str(params[name]) for name in ITEM_PARAMS if params.get(name) is not None),
+                    None)
+        digest = key_digest(key)
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM results WHERE key = ?", (digest,)).fetchone() is None:
+                return None
+            cursor = self._conn.execute(
+                "INSERT INTO runs (key, module, item, start_day, created) VALUES (?, ?, ?, ?, ?)",
+                (digest, module, item, _today() if start_day is None else int(start_day),
+                 time.time()))
+            return cursor.lastrowid
+
+    def runs(self, module=None, item=None, start_from=None, start_to=None, limit=100):
+        """Recorded runs, newest first, filtered by module, item and first forecast day.
+
+        Each run is a dict with ``id``, ``module``, ``item``, ``start_day``
+        (days since 1970-01-01), ``created`` (Unix time), ``seed``,
+        ``engine_version`` and ``params``.
+        """
+        clauses, args = [], []
+        for column, op, value in (('runs.module', '=', module), ('runs.item', '=', item),
+                                  ('runs.start_day', '>=', start_from),
+                                  ('runs.start_day', '<=', start_to)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                args.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT runs.id, runs.module, runs.item, runs.start_day, runs.created, "
+                "results.seed, results.engine_version, results.params "
+                f"FROM runs JOIN results ON results.key = runs.key {where} "
+                "ORDER BY runs.created DESC, runs.id DESC LIMIT ?", (*args, limit)).fetchall()
+        names = ('id', 'module', 'item', 'start_day', 'created', 'seed', 'engine_version', 'params')
+        return [dict(zip(names, row[:-1] + (json.loads(row[-1]),))) for row in rows]
+
+    def load_run(self, run_id):
+        """The result of a recorded run."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results.summary, results.arrays FROM runs "
+                "JOIN results ON results.key = runs.key WHERE runs.id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"no run {run_id}")
+        return _unpack(*row)
+
+    def stats(self):
+        """Number of stored results and runs, and bytes of result blobs."""
+        with self._lock:
+            results, nbytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results").fetchone()
+            runs, = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()
+        return {'results': results, 'runs': runs, 'nbytes': nbytes}
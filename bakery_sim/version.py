@@ -0,0 +1,11 @@
+"""Version of the simulation kernels.
+
+Bump ``ENGINE_VERSION`` whenever a kernel change alters results for the same
+parameters and seed, so cached and stored results from older engines are not
+reused.
+"""
+
+ENGINE_VERSION = "1.2"
+
+# Seconds allowed for a cold ``import bakery_sim`` (numpy included)
+IMPORT_TIME_BUDGET = 0.25
@@ -0,0 +1,57 @@
+"""The original loop-based simulation code, kept as a benchmark baseline.
+
+These are the kernels as they were written inline in bakery_app.py before
+the vectorised engines, generalised only to a path/day count so they can be
+timed against bakery_sim at the same sizes. They reseed the global NumPy
+generator exactly like the app did.
+"""
+
+import numpy as np
+
+
+def demand_paths(avg_demand, demand_var, sim_days, n_paths):
+    """One single-path demand simulation per path, stacked."""
+    np.random.seed(42)
+    paths = []
+    for _ in range(n_paths):
+        base_demand = np.random.normal(avg_demand, avg_demand * demand_var, sim_days)
+        day_effects = 1 + 0.3 * np.sin(np.arange(sim_days) * 2 * np.pi / 7)
+        seasonal_trend = 1 + 0.1 * np.sin(np.arange(sim_days) * 2 * np.pi / 30)
+        paths.append(np.maximum(0, base_demand * day_effects * seasonal_trend))
+    return np.array(paths)
+
+
+def price_paths(current_price, price_volatility, forecast_steps, n_scenarios, dt=1/12):
+    """The Cost Analysis double loop."""
+    np.random.seed(42)
+    drift = 0.03
+    price_paths = []
+
+    for _ in range(n_scenarios):
+        prices = [current_price]
+        for _ in range(forecast_steps):
+            shock = np.random.normal(0, price_volatility)
+            new_price = prices[-1] * np.exp((drift - 0.5 * price_volatility**2) * dt +
+                                           price_volatility * np.sqrt(dt) * shock)
+            prices.append(max(new_price, current_price * 0.5))
+        price_paths.append(prices)
+
+    return np.array(price_paths)
+
+
+def customer_patterns(avg_customers, customer_var, n_days):
+    """The Staff Planning day loop."""
+    base_pattern = np.array([0.4, 0.6, 0.8, 1.0, 1.4, 1.8, 1.6, 1.2, 0.9, 0.7, 0.8, 1.1])
+    hourly_customers = avg_customers * base_pattern / np.sum(base_pattern)
+
+    np.random.seed(42)
+    daily_patterns = []
+
+    for day in range(n_days):
+        day_multiplier = 1.3 if day % 7 in [5, 6] else 1.0
+        adjusted_customers = hourly_customers * day_multiplier
+        actual_customers = np.maximum(0, np.random.normal(adjusted_customers,
+                                                         adjusted_customers * customer_var))
+        daily_patterns.append(actual_customers)
+
+    return np.array(daily_patterns)
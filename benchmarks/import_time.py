@@ -0,0 +1,60 @@
+"""Measure the cold-start import time of the headless simulation package.
+
+Each measurement runs ``import bakery_sim`` in a fresh interpreter, so numpy
+is imported from scratch every time. The script exits non-zero if the
+median exceeds ``bakery_sim.IMPORT_TIME_BUDGET`` or if the import pulls in
+any UI or plotting library.
+
+    python benchmarks/import_time.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ("streamlit", "matplotlib", "seaborn", "plotly", "pandas")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import bakery_sim
+elapsed = time.perf_counter() - start
+loaded = sorted({name.split('.')[0] for name in sys.modules} & set(%r))
+print(json.dumps({'seconds': elapsed, 'budget': bakery_sim.IMPORT_TIME_BUDGET, 'loaded': loaded}))
+""" % (FORBIDDEN,)
+
+
+def measure_once():
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    median = statistics.median(run['seconds'] for run in runs)
+    budget = runs[0]['budget']
+    loaded = runs[0]['loaded']
+    print(f"import bakery_sim: median {median * 1000:.1f} ms over {args.repeat} runs "
+          f"(budget {budget * 1000:.0f} ms)")
+
+    ok = True
+    if loaded:
+        print(f"FAIL: importing bakery_sim loaded {', '.join(loaded)}")
+        ok = False
+    if median > budget:
+        print("FAIL: import time over budget")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""Throughput and memory benchmarks for the demand, cost and staffing kernels.
+
+Every case runs in a fresh interpreter so its peak RSS is its own. For each
+kernel, scenario count and horizon the suite records:
+
+* ``paths_per_sec``: simulated paths (staffing: simulated days) per second,
+  excluding the statistics step
+* ``percentile_seconds``: time spent reducing paths to mean/P10/P50/P90
+* ``peak_rss_mb``: peak resident memory of the case's process
+
+The vectorised engines stream paths in chunks, as the app and the batch
+runner do. The ``baseline`` implementation runs the original loop code from
+``benchmarks/baseline.py`` for comparison; it is only run up to
+``--baseline-max-cells`` because it is orders of magnitude slower.
+
+    python benchmarks/kernels.py -o results.json
+    python benchmarks/kernels.py -o new.json --compare benchmarks/results/reference.json
+
+Cases above ``--max-cells`` simulated values (scenarios x horizon, times 12
+hourly slots for staffing) are skipped; the
+full 10M-scenario x 2-year grid needs ``--max-cells 1e10`` and a lot of time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+KERNELS = ("demand", "cost", "staffing")
+SCENARIOS = (500, 10_000, 100_000, 1_000_000, 10_000_000)
+HORIZONS = (7, 30, 365, 730)
+PERCENTILES = (10, 50, 90)
+CHUNK_CELLS = 4_000_000
+HOURS_PER_DAY = 12
+METRICS = {'paths_per_sec': 'higher', 'percentile_seconds': 'lower', 'peak_rss_mb': 'lower'}
+
+
+def _peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_vectorized(kernel, scenarios, horizon):
+    import numpy as np
+    from bakery_sim import StreamingQuantiles, iter_demand_paths, iter_price_paths
+    from bakery_sim.staffing import HOURS, simulate_customer_patterns, staff_required
+
+    chunk_size = max(1, CHUNK_CELLS // horizon)
+    if kernel == "demand":
+        acc = StreamingQuantiles(horizon, 0.0, 150 * (1 + 8 * 0.3) * 1.5)
+        chunks = iter_demand_paths(150, 0.3, horizon, scenarios, chunk_size, seed=42)
+    elif kernel == "cost":
+        acc = StreamingQuantiles(horizon + 1, 75.0, 600.0)
+        chunks = iter_price_paths(150, 0.15, horizon, scenarios, chunk_size, dt=1 / 365, seed=42)
+    else:
+        # Staffing has no separate paths: scenarios x horizon simulated days
+        acc = StreamingQuantiles(len(HOURS), 0.0, 20.0, bins=64)
+        rs = np.random.RandomState(42)
+        chunk_days = max(7, CHUNK_CELLS // len(HOURS) // 7 * 7)
+        total_days = scenarios * horizon
+
+        def staffing_chunks():
+            done = 0
+            while done < total_days:
+                days = min(chunk_days, total_days - done)
+                yield staff_required(simulate_customer_patterns(120, 0.25, days, seed=rs), 8)
+                done += days
+        chunks = staffing_chunks()
+
+    simulate = percentile = 0.0
+    start = time.perf_counter()
+    for chunk in chunks:
+        mid = time.perf_counter()
+        simulate += mid - start
+        acc.update(chunk)
+        start = time.perf_counter()
+        percentile += start - mid
+    mid = time.perf_counter()
+    acc.mean, acc.quantiles(PERCENTILES)
+    percentile += time.perf_counter() - mid
+    return simulate, percentile
+
+
+def _run_baseline(kernel, scenarios, horizon):
+    import numpy as np
+    import baseline
+
+    start = time.perf_counter()
+    if kernel == "demand":
+        paths = baseline.demand_paths(150, 0.3, horizon, scenarios)
+    elif kernel == "cost":
+        paths = baseline.price_paths(150, 0.15, horizon, scenarios, dt=1 / 365)
+    else:
+        paths = np.ceil(baseline.customer_patterns(120, 0.25, scenarios * horizon) / 8)
+    mid = time.perf_counter()
+    np.mean(paths, axis=0), np.percentile(paths, PERCENTILES, axis=0)
+    return mid - start, time.perf_counter() - mid
+
+
+def run_case(kernel, impl, scenarios, horizon):
+    """Run one case in this process and return its result record."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    runner = _run_vectorized if impl == "vectorized" else _run_baseline
+    simulate, percentile = runner(kernel, scenarios, horizon)
+    units = scenarios * horizon if kernel == "staffing" else scenarios
+    return {
+        'kernel': kernel,
+        'impl': impl,
+        'scenarios': scenarios,
+        'horizon': horizon,
+        'simulate_seconds': simulate,
+        'paths_per_sec': units / simulate if simulate > 0 else float('inf'),
+        'percentile_seconds': percentile,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def _spawn_case(kernel, impl, scenarios, horizon):
+    cmd = [sys.executable, os.path.abspath(__file__), "--case", kernel, impl,
+           str(scenarios), str(horizon)]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def metadata():
+    import numpy as np
+    from bakery_sim import ENGINE_VERSION
+    return {
+        'engine_version': ENGINE_VERSION,
+        'numpy': np.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, reference, tolerance):
+    """Return human-readable regressions of ``results`` against ``reference``."""
+    def key(r):
+        return r['kernel'], r['impl'], r['scenarios'], r['horizon']
+
+    previous = {key(r): r for r in reference['results']}
+    regressions = []
+    for r in results:
+        old = previous.get(key(r))
+        if old is None:
+            continue
+        for metric, better in METRICS.items():
+            new_value, old_value = r[metric], old[metric]
+            if old_value <= 0:
+                continue
+            change = new_value / old_value - 1
+            worse = change < -tolerance if better == 'higher' else change > tolerance
+            # Sub-10ms percentile timings are too noisy to judge
+            if metric == 'percentile_seconds' and max(new_value, old_value) < 0.01:
+                worse = False
+            if worse:
+                regressions.append(f"{'/'.join(map(str, key(r)))}: {metric} "
+                                   f"{old_value:.4g} -> {new_value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="write results JSON here")
+    parser.add_argument("--kernels", nargs="+", choices=KERNELS, default=list(KERNELS))
+    parser.add_argument("--scenarios", nargs="+", type=int, default=list(SCENARIOS))
+    parser.add_argument("--horizons", nargs="+", type=int, default=list(HORIZONS),
+                        help="horizons in days")
+    parser.add_argument("--max-cells", type=float, default=1e8,
+                        help="skip cases with more scenarios x horizon values")
+    parser.add_argument("--baseline-max-cells", type=float, default=2e5,
+                        help="largest case to run with the loop-based baseline (0 to skip)")
+    parser.add_argument("--compare", help="reference results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative change counted as a regression (default 0.25)")
+    parser.add_argument("--case", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        kernel, impl, scenarios, horizon = args.case
+        print(json.dumps(run_case(kernel, impl, int(scenarios), int(horizon))))
+        return 0
+
+    results = []
+    print(f"{'kernel':<9} {'impl':<10} {'scenarios':>10} {'horizon':>7} {'paths/s':>12} "
+          f"{'pct s':>8} {'RSS MB':>8}")
+    for kernel in args.kernels:
+        for horizon in args.horizons:
+            for scenarios in args.scenarios:
+                cells = scenarios * horizon * (HOURS_PER_DAY if kernel == "staffing" else 1)
+                for impl, limit in (("vectorized", args.max_cells),
+                                    ("baseline", args.baseline_max_cells)):
+                    if cells > limit:
+                        continue
+                    r = _spawn_case(kernel, impl, scenarios, horizon)
+                    results.append(r)
+                    print(f"{kernel:<9} {impl:<10} {scenarios:>10} {horizon:>7} "
+                          f"{r['paths_per_sec']:>12.4g} {r['percentile_seconds']:>8.3f} "
+                          f"{r['peak_rss_mb']:>8.1f}", flush=True)
+
+    report = {'meta': metadata(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
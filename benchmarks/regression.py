@@ -0,0 +1,124 @@
+"""Check that the vectorised engines still reproduce the original app.
+
+The seeded kernels promise the exact values of the original loop code in
+``benchmarks/baseline.py``: demand and price paths, the hourly customer
+patterns and the Staff tab's simple staffing statistics must be
+bit-identical. ``ErlangTable`` must also agree with Erlang C computed
+directly from its closed form. Every mismatch is printed and the script
+exits non-zero, so it can gate an engine change next to the ``--compare``
+benchmark check.
+
+    python benchmarks/regression.py
+"""
+
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import baseline  # noqa: E402
+from bakery_sim import analyze_staffing, simulate_demand_paths, simulate_price_paths  # noqa: E402
+from bakery_sim.staffing import (ErlangTable, simulate_customer_patterns,  # noqa: E402
+                                 staff_required)
+
+DEMAND_CASES = ((150, 0.3, 30), (50, 0.8, 90), (300, 0.1, 7))
+PRICE_CASES = ((2.5, 0.15, 12), (12.0, 0.5, 24))
+CUSTOMER_CASES = ((120, 0.25, 30), (50, 0.5, 1), (300, 0.1, 365), (80, 0.3, 100))
+ERLANG_LOADS = (0.01, 0.5, 1.0, 3.7, 10.0, 25.5, 60.0, 99.99)
+ERLANG_RTOL = 1e-9
+
+
+def erlang_c(staff, load):
+    """Probability of waiting in M/M/c, from the closed form in log space."""
+    if staff <= load:
+        return 1.0
+    log_terms = [k * math.log(load) - math.lgamma(k + 1) for k in range(staff)]
+    log_wait = (staff * math.log(load) - math.lgamma(staff + 1)
+                + math.log(staff / (staff - load)))
+    top = max(log_terms + [log_wait])
+    total = sum(math.exp(t - top) for t in log_terms) + math.exp(log_wait - top)
+    return math.exp(log_wait - top) / total
+
+
+def check_baseline():
+    """Seeded kernels against the original loops; returns the failures."""
+    failures = []
+    for avg_demand, demand_var, sim_days in DEMAND_CASES:
+        n_paths = 5
+        if not np.array_equal(simulate_demand_paths(avg_demand, demand_var, sim_days, n_paths,
+                                                    seed=42),
+                              baseline.demand_paths(avg_demand, demand_var, sim_days, n_paths)):
+            failures.append(f"demand paths differ for {(avg_demand, demand_var, sim_days)}")
+    for current_price, volatility, n_steps in PRICE_CASES:
+        n_scenarios = 50
+        if not np.array_equal(simulate_price_paths(current_price, volatility, n_steps,
+                                                   n_scenarios, seed=42),
+                              baseline.price_paths(current_price, volatility, n_steps,
+                                                   n_scenarios)):
+            failures.append(f"price paths differ for {(current_price, volatility, n_steps)}")
+    for avg_customers, customer_var, n_days in CUSTOMER_CASES:
+        case = (avg_customers, customer_var, n_days)
+        expected = baseline.customer_patterns(avg_customers, customer_var, n_days)
+        if not np.array_equal(simulate_customer_patterns(avg_customers, customer_var, n_days,
+                                                         seed=42), expected):
+            failures.append(f"customer patterns differ for {case}")
+        # The Staff tab as it was: customers / service rate, rounded up
+        staff = np.ceil(expected / 8)
+        result = analyze_staffing(avg_customers, customer_var, 8, n_days, model='simple',
+                                  seed=42)
+        for key, value in (('avg_staff', np.mean(staff, axis=0)),
+                           ('p90_staff', np.percentile(staff, 90, axis=0)),
+                           ('hourly_customers', np.mean(expected, axis=0))):
+            if not np.array_equal(result[key], value):
+                failures.append(f"analyze_staffing {key} differs for {case}")
+    return failures
+
+
+def check_erlang(step=0.01):
+    """``ErlangTable`` against the closed form; returns the failures."""
+    failures = []
+    table = ErlangTable(100.0, step)
+    for load in ERLANG_LOADS:
+        i = int(round(load / step))
+        for staff in range(1, table.max_staff + 1):
+            expected = erlang_c(staff, table.loads[i])
+            got = table.wait_prob[staff - 1, i]
+            if not math.isclose(got, expected, rel_tol=ERLANG_RTOL, abs_tol=1e-300):
+                failures.append(f"Erlang C for {staff} staff at load {load}: "
+                                f"table {got:.17g}, closed form {expected:.17g}")
+                break
+
+    # Staff requirements: the smallest c meeting the service level, found directly
+    service_rate, service_level, target_wait = 8.0, 0.8, 5.0
+    product = service_rate * target_wait / 60
+    customers = np.array(ERLANG_LOADS) * service_rate
+    required = staff_required(customers, service_rate, 'erlang', service_level, target_wait)
+    for load, got in zip(ERLANG_LOADS, required):
+        staff = math.floor(load) + 1
+        while 1 - erlang_c(staff, load) * math.exp(-(staff - load) * product) < service_level:
+            staff += 1
+        if got != staff:
+            failures.append(f"staff_required at load {load}: {got}, closed form {staff}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args(argv)
+    failures = check_baseline() + check_erlang()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+    print("Seeded kernels match the original code; Erlang table matches the closed form")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())